@@ -0,0 +1,289 @@
+"""
+Columnar store of every task completion (robot, type, task, start, end, nominal eta) with aggregate queries.
+
+Each column is its own flat binary file that is only ever appended to, and queries read the columns through NumPy
+memory maps, so hundreds of millions of completions are answered with vectorized NumPy calls (bincount,
+searchsorted, ...) instead of Python loops and without loading the history into memory. Completions are recorded
+in the order they finish, which keeps the end column sorted and turns time windows into two binary searches (record
+refuses any that would end before the latest one, see there).
+
+Robot names, types and tasks are stored as small integer ids, the id of a value is its line number in
+robots.jsonl, types.jsonl or tasks.jsonl (append-only as well).
+
+NumPy is required for this module, the factory only records analytics when it is installed.
+
+Example:
+    python3 src/analytics.py robot_save.analytics --since 3600
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy
+
+
+# Column name -> dtype, one file per column named after it
+COLUMNS = OrderedDict([
+    ('robot', numpy.uint32),
+    ('type', numpy.uint8),
+    ('task', numpy.uint16),
+    ('start', numpy.float64), # <- Seconds since the epoch (or simulated seconds)
+    ('end', numpy.float64),
+    ('eta', numpy.uint32), # <- Nominal duration in seconds, see Robot.task_eta
+])
+
+DICTIONARIES = ('robots', 'types', 'tasks')
+
+
+class AnalyticsStore(object):
+    """ Append-only columnar log of task completions in a directory, with NumPy aggregate queries over it. """
+
+    def __init__(self, path, flush_every=65536, flush_interval=1.0):
+        self.path = path
+        self.flush_every = flush_every # <- Buffered completions that trigger a flush
+        self.flush_interval = flush_interval # <- Seconds after which buffered completions are flushed anyway
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        self._lock = threading.Lock()
+        self._buffer = [] # <- (robot id, type id, task id, start, end, eta) tuples not written yet
+        self._last_flush = time.time()
+        self._maps = {} # <- Column name -> memmap, reopened whenever the columns have grown
+
+        # Value -> id and id -> value for every dictionary, loaded from disk and appended to as new values show up
+        self._ids = {}
+        self._values = {}
+        for name in DICTIONARIES:
+            values = self._read_dictionary(name)
+            self._values[name] = values
+            self._ids[name] = dict((value, n) for n, value in enumerate(values))
+
+        self._length = self._stored_length()
+        for column, dtype in COLUMNS.items():
+            fn = self._column_fn(column)
+            if os.path.exists(fn):
+                os.truncate(fn, self._length * numpy.dtype(dtype).itemsize) # <- Drop whatever a crash left half written
+
+        self._last_end = 0.0 # <- Latest end recorded, nothing may end before it
+        if self._length:
+            self._last_end = float(numpy.fromfile(self._column_fn('end'), dtype=COLUMNS['end'], count=1,
+                                                  offset=(self._length - 1) * numpy.dtype(COLUMNS['end']).itemsize)[0])
+
+    def __len__(self):
+        return self._length + len(self._buffer)
+
+    @property
+    def last_end(self):
+        """ End of the latest completion recorded (0.0 for an empty store), nothing may end before it. """
+        return self._last_end
+
+    ### Recording
+
+    def record(self, robot, task, start, end=None, eta=None):
+        """ Records a finished task, start and end are timestamps in seconds and eta the seconds it was queued with
+        (defaults to the robot type's current eta for the task). Without end the task ends now (time.time(), read
+        under the lock so completions recorded from several threads at once still come in order).
+
+        Ends must never go back in time, the end column has to stay sorted for window. Times are stored as given, a
+        completion that ends before the latest one already recorded (a simulation starting over at 0 in a store of
+        wall clock times, or a clock that was set back) raises ValueError instead. """
+
+        with self._lock:
+            if end is None:
+                end = time.time()
+            if end < self._last_end:
+                raise ValueError('Completion ending at {0} is older than the latest one in {1} ({2}), record sessions '
+                                 'on another clock in a store of their own'.format(end, self.path, self._last_end))
+            self._last_end = end
+
+            self._buffer.append((
+                self._id('robots', robot.name),
+                self._id('types', robot.robot_type),
+                self._id('tasks', task),
+                start,
+                end,
+                robot.task_eta(task) if eta is None else eta,
+            ))
+            due = len(self._buffer) >= self.flush_every or time.time() - self._last_flush >= self.flush_interval
+
+        if due:
+            self.flush()
+
+    def _id(self, name, value):
+        """ Id of a dictionary value, new values are given the next id and appended to the dictionary file. """
+
+        ids = self._ids[name]
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(self._values[name])
+            self._values[name].append(value)
+            with open(self._dictionary_fn(name), 'a') as dictionary_file:
+                dictionary_file.write(json.dumps(value) + '\n')
+        return value_id
+
+    def flush(self):
+        """ Appends buffered completions to the column files. """
+
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+            self._last_flush = time.time()
+            if not buffer:
+                return
+
+            for n, (column, dtype) in enumerate(COLUMNS.items()):
+                values = numpy.fromiter((row[n] for row in buffer), dtype=dtype, count=len(buffer))
+                with open(self._column_fn(column), 'ab') as column_file:
+                    column_file.write(values.tobytes())
+            self._length += len(buffer)
+
+    def close(self):
+        self.flush()
+        self._maps = {}
+
+    ### Files
+
+    def _column_fn(self, column):
+        return os.path.join(self.path, column + '.bin')
+
+    def _dictionary_fn(self, name):
+        return os.path.join(self.path, name + '.jsonl')
+
+    def _read_dictionary(self, name):
+        fn = self._dictionary_fn(name)
+        if not os.path.exists(fn):
+            return []
+        with open(fn) as dictionary_file:
+            return [json.loads(line) for line in dictionary_file if line.strip()]
+
+    def _stored_length(self):
+        """ Completions fully written to every column, a crash mid flush can leave some columns a little longer. """
+
+        lengths = []
+        for column, dtype in COLUMNS.items():
+            fn = self._column_fn(column)
+            lengths.append(os.path.getsize(fn) // numpy.dtype(dtype).itemsize if os.path.exists(fn) else 0)
+        return min(lengths)
+
+    def column(self, name):
+        """ Read-only memory map of a whole column (buffered completions are flushed first). """
+
+        self.flush()
+        column = self._maps.get(name)
+        if column is None or len(column) != self._length:
+            if not self._length:
+                return numpy.zeros(0, dtype=COLUMNS[name])
+            column = self._maps[name] = numpy.memmap(self._column_fn(name), dtype=COLUMNS[name], mode='r', shape=(self._length,))
+        return column
+
+    ### Queries, since and until are timestamps (None means no limit) and select completions by their end time
+
+    def window(self, since=None, until=None):
+        """ slice of the completions that ended in [since, until), found by binary search on the end column. """
+
+        end = self.column('end')
+        start_index = 0 if since is None else int(numpy.searchsorted(end, since, side='left'))
+        end_index = len(end) if until is None else int(numpy.searchsorted(end, until, side='left'))
+        return slice(start_index, max(start_index, end_index))
+
+    def _counts(self, column, dictionary, since, until):
+        ids = self.column(column)[self.window(since, until)]
+        counts = numpy.bincount(ids, minlength=len(self._values[dictionary]))
+        return OrderedDict((self._values[dictionary][n], int(counts[n])) for n in numpy.flatnonzero(counts))
+
+    def completions_by_type(self, since=None, until=None):
+        """ OrderedDict of robot type -> completed tasks. """
+        return self._counts('type', 'types', since, until)
+
+    def completions_by_task(self, since=None, until=None):
+        """ OrderedDict of task -> number of times it was completed. """
+        return self._counts('task', 'tasks', since, until)
+
+    def completions_over_time(self, bucket_seconds=3600, since=None, until=None):
+        """ List of (bucket start, completions) for every time bucket with at least one completion. """
+
+        end = self.column('end')[self.window(since, until)]
+        buckets, counts = numpy.unique(numpy.floor_divide(end, bucket_seconds), return_counts=True)
+        return [(float(bucket * bucket_seconds), int(count)) for bucket, count in zip(buckets, counts)]
+
+    def busiest_robots(self, k=10, since=None, until=None):
+        """ List of (robot name, completions) for the k robots that completed the most tasks, by default in the last hour. """
+
+        if since is None and until is None and len(self):
+            since = self.column('end')[-1] - 3600 # <- The hour leading up to the latest completion
+
+        ids = self.column('robot')[self.window(since, until)]
+        if not len(ids):
+            return []
+
+        counts = numpy.bincount(ids)
+        k = min(k, numpy.count_nonzero(counts))
+        top = numpy.argpartition(counts, -k)[-k:] # <- The k largest in any order, then only those k are sorted
+        top = top[numpy.argsort(-counts[top], kind='stable')]
+        return [(self._values['robots'][n], int(counts[n])) for n in top]
+
+    def duration_vs_eta(self, since=None, until=None):
+        """ OrderedDict of task -> {'completions', 'mean_seconds', 'eta_seconds', 'ratio'}, how long tasks actually
+        took (end - start) compared to their nominal eta. """
+
+        window = self.window(since, until)
+        tasks = self.column('task')[window]
+        durations = self.column('end')[window] - self.column('start')[window]
+        etas = self.column('eta')[window]
+
+        size = len(self._values['tasks'])
+        counts = numpy.bincount(tasks, minlength=size)
+        total_durations = numpy.bincount(tasks, weights=durations, minlength=size)
+        total_etas = numpy.bincount(tasks, weights=etas, minlength=size)
+
+        result = OrderedDict()
+        for n in numpy.flatnonzero(counts):
+            mean, eta = total_durations[n] / counts[n], total_etas[n] / counts[n]
+            result[self._values['tasks'][n]] = {
+                'completions': int(counts[n]),
+                'mean_seconds': float(mean),
+                'eta_seconds': float(eta),
+                'ratio': float(mean / eta) if eta else None,
+            }
+        return result
+
+
+def print_report(store, since=None, until=None, top=10):
+    print("*** {0} completions recorded in {1} ***\n".format(len(store), store.path))
+
+    print("Completions by type:")
+    for robot_type, count in sorted(store.completions_by_type(since, until).items(), key=lambda x: -x[1]):
+        print("{0:>10} | {1}".format(count, robot_type))
+
+    print("\nBusiest robots:")
+    for robot_name, count in store.busiest_robots(top, since, until):
+        print("{0:>10} | {1}".format(count, robot_name))
+
+    print("\nTask durations compared to their eta:")
+    print("{0:>10} | {1:>8} | {2:>8} | {3}".format('Completed', 'Mean s', 'Eta s', 'Task'))
+    for task, stats in sorted(store.duration_vs_eta(since, until).items(), key=lambda x: -x[1]['completions']):
+        print("{0:>10} | {1:>8.2f} | {2:>8.2f} | {3}".format(stats['completions'], stats['mean_seconds'], stats['eta_seconds'], task))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Aggregate the task completions recorded by the robot factory.')
+    parser.add_argument('path', nargs='?', default='robot_save.analytics', help='analytics directory (default: %(default)s)')
+    parser.add_argument('--since', type=float, help='only completions of the last SINCE seconds')
+    parser.add_argument('--top', type=int, default=10, help='number of busiest robots to show (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = AnalyticsStore(args.path)
+    print_report(store, time.time() - args.since if args.since else None, top=args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Benchmarks for the robot factory hot paths, run headlessly (input, clear_console and sleep are stubbed out).
+
+Examples:
+    python3 src/benchmark.py --sizes 1000,100000 --output bench.json
+    python3 src/benchmark.py --sizes 1000 --compare bench.json
+    python3 src/benchmark.py --startup # <- Exits with an error when quick commands start slower than STARTUP_TARGET_MS
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import robot_factory
+from leaderboard import Leaderboard
+from registry import RobotRegistry
+from robot_factory import RobotFactory
+from robots import ROBOT_TYPES
+from utils import save_to_pickle, load_from_pickle
+
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_TARGET_MS = 50 # <- Most `main.py status` may spend importing modules, on top of what the interpreter imports itself
+
+
+class _NullOutput(object):
+    """ Swallows everything printed while the interactive views are benchmarked. """
+
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+@contextmanager
+def headless():
+    """ Stubs out the console (input, clear_console, press_enter_to_continue) and sleeping for the duration. """
+
+    patched = {
+        'input': lambda *args: '',
+        'clear_console': lambda: None,
+        'press_enter_to_continue': lambda: None,
+    }
+    originals = dict((name, getattr(robot_factory, name)) for name in patched)
+    time_scale = RobotFactory.executor.time_scale
+
+    for name, stub in patched.items():
+        setattr(robot_factory, name, stub)
+    RobotFactory.executor.time_scale = 0 # <- Tasks finish without sleeping
+    try:
+        yield
+    finally:
+        for name, original in originals.items():
+            setattr(robot_factory, name, original)
+        RobotFactory.executor.time_scale = time_scale
+
+
+def fresh_factory(save_path):
+    """ Factory with robots and a leaderboard of its own, leaving the ones every RobotFactory shares alone. """
+
+    factory = RobotFactory(save_path)
+    factory.robots = RobotRegistry()
+    factory.leaderboard = Leaderboard()
+    return factory
+
+
+class Benchmark(object):
+    """ Times each phase of a factory's life for a given number of robots, optionally tracking peak memory. """
+
+    def __init__(self, size, track_memory=True, workdir=None):
+        self.size = size
+        self.track_memory = track_memory
+        self.workdir = workdir or tempfile.mkdtemp(prefix='robot_bench_')
+        self.results = OrderedDict()
+
+    @contextmanager
+    def phase(self, name, operations=None):
+        """ Times the body of the with block and records seconds, operations per second and peak memory. """
+
+        gc.collect()
+        if self.track_memory:
+            tracemalloc.start()
+
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+
+        result = OrderedDict([('seconds', round(elapsed, 6))])
+        if operations:
+            result['ops_per_second'] = round(operations / elapsed, 1) if elapsed else None
+        if self.track_memory:
+            result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.results[name] = result
+
+    def run(self):
+        save_path = os.path.join(self.workdir, 'robot_save')
+        robot_types = sorted(ROBOT_TYPES)
+        names = ['robot-{0}'.format(n) for n in range(self.size)]
+
+        factory = fresh_factory(save_path).open(autosave=False) # <- Saves are timed explicitly below
+
+        with self.phase('create', self.size):
+            for n, name in enumerate(names):
+                factory.add_robot(name, robot_types[n % len(robot_types)], num_tasks=0)
+        factory.executor.wait_idle()
+
+        with self.phase('assign_tasks', self.size):
+            for name in names:
+                factory.robots[name].populate_todo_list(5)
+
+        # Drain every queue directly, this is the bookkeeping a finished task costs without any of the waiting
+        completed = sum(len(factory.robots[name].tasks_to_perform) for name in names)
+        with self.phase('complete_tasks', completed):
+            for name in names:
+                robot = factory.robots[name]
+                while robot.tasks_to_perform:
+                    robot.save_finished_task(robot.tasks_to_perform.pop())
+
+        with self.phase('leaderboard_top10', 1000):
+            for _ in range(1000):
+                factory.top_robots(10)
+
+        with self.phase('leaderboard_view', 1):
+            stdout, sys.stdout = sys.stdout, _NullOutput()
+            try:
+                factory.view_robot_leaderboard()
+            finally:
+                sys.stdout = stdout
+
+        # Only the log is written here (store.save would also compact past compact_after events), see save_snapshot
+        with self.phase('save_incremental', completed):
+            factory.store.flush()
+
+        with self.phase('save_snapshot', self.size):
+            factory.store.compact(factory.robots)
+
+        factory.close()
+        self.results['snapshot_bytes'] = os.path.getsize(factory.store.snapshot_fn)
+
+        with self.phase('load', self.size):
+            factory = fresh_factory(save_path).open(autosave=False) # <- Saves are timed explicitly below
+
+        with self.phase('load_all_robots', self.size):
+            for name in names:
+                factory.robots[name]
+        robots = [factory.robots[name] for name in names]
+        factory.close()
+
+        # The original whole-file pickle, for comparison
+        pickle_fn = os.path.join(self.workdir, 'robot_save.pkl')
+        with self.phase('save_to_pickle', self.size):
+            save_to_pickle(robots, pickle_fn)
+        self.results['pickle_bytes'] = os.path.getsize(pickle_fn)
+
+        del robots
+        with self.phase('load_from_pickle', self.size):
+            load_from_pickle(pickle_fn)
+
+        return self.results
+
+
+def run_benchmarks(sizes, track_memory=True):
+    report = OrderedDict([
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('results', OrderedDict()),
+    ])
+
+    with headless():
+        for size in sizes:
+            workdir = tempfile.mkdtemp(prefix='robot_bench_')
+            try:
+                report['results'][str(size)] = Benchmark(size, track_memory, workdir).run()
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    return report
+
+
+def import_times(args, leave_out=(), nested=False):
+    """ Dict of module -> cumulative milliseconds spent importing it, for every top level import (every import with
+    nested) of a fresh `python -X importtime args` (run from src/), modules in leave_out aside. """
+
+    process = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=SRC_DIR,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = OrderedDict()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        # Top level imports are indented by a single space, the modules they import in turn by more
+        if cumulative.strip().isdigit() and (nested or not module.startswith('  ')) and module.strip() not in leave_out:
+            times[module.strip()] = int(cumulative) / 1000.0
+    return times
+
+
+def run_startup(size=1000, runs=5):
+    """ Times quick commands in a fresh interpreter on a save of size robots: how long they spend importing
+    (python -X importtime, leaving out what a bare interpreter imports) and their median wall clock time. """
+
+    workdir = tempfile.mkdtemp(prefix='robot_bench_')
+    try:
+        save_path = os.path.join(workdir, 'robot_save')
+        factory = fresh_factory(save_path).open(autosave=False, analytics=False)
+        for robot_type in ROBOT_TYPES:
+            factory.create_robots(robot_type, size // len(ROBOT_TYPES), start=False)
+        factory.close()
+
+        commands = OrderedDict([
+            ('interpreter', ['-c', 'pass']),
+            ('status', [os.path.join(SRC_DIR, 'main.py'), 'status', '--save', save_path]),
+            ('import_factory', ['-c', 'import robot_factory']),
+        ])
+        interpreter_modules = import_times(commands['interpreter'])
+
+        results = OrderedDict()
+        for name, args in commands.items():
+            imports = import_times(args, interpreter_modules)
+            walls = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                subprocess.run([sys.executable] + args, cwd=SRC_DIR, stdout=subprocess.DEVNULL, check=True)
+                walls.append(time.perf_counter() - started)
+
+            results[name] = OrderedDict([
+                ('import_ms', round(sum(imports.values()), 1)),
+                ('wall_ms', round(sorted(walls)[len(walls) // 2] * 1000, 1)),
+                ('slowest_imports', sorted(imports.items(), key=lambda item: -item[1])[:3]),
+            ])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return OrderedDict([
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('saved_robots', size),
+        ('target_import_ms', STARTUP_TARGET_MS),
+        ('startup', results),
+    ])
+
+
+def print_startup_report(report, baseline=None):
+    """ Prints the import and wall clock milliseconds of every command, returns False if status missed its target. """
+
+    print("\n*** Startup, fresh interpreter with {0} saved robots ***\n".format(report['saved_robots']))
+    print("{0:<16} | {1:>10} | {2:>10} | {3}".format('Command', 'Import ms', 'Wall ms', 'Slowest imports (ms)'))
+    print("{0}|{1}|{2}|{3}".format('-' * 17, '-' * 12, '-' * 12, '-' * 30))
+
+    for name, result in report['startup'].items():
+        slowest = ', '.join('{0} {1:.1f}'.format(module, ms) for module, ms in result['slowest_imports'])
+        old = (baseline or {}).get('startup', {}).get(name)
+        if old and old['wall_ms']:
+            slowest += ' ({0:.2f}x baseline wall time)'.format(result['wall_ms'] / old['wall_ms'])
+        print("{0:<16} | {1:>10.1f} | {2:>10.1f} | {3}".format(name, result['import_ms'], result['wall_ms'], slowest))
+
+    status_ms = report['startup']['status']['import_ms']
+    passed = status_ms <= report['target_import_ms']
+    print("\nstatus spends {0:.1f} ms importing, the target is {1} ms: {2}".format(
+        status_ms, report['target_import_ms'], 'OK' if passed else 'TOO SLOW'))
+    return passed
+
+
+def print_report(report, baseline=None):
+    """ Prints timings per size and phase, with the ratio to a baseline report when one is given. """
+
+    for size, results in report['results'].items():
+        print("\n*** {0} robots ***\n".format(size))
+        print("{0:<20} | {1:>12} | {2:>14} | {3:>12}{4}".format('Phase', 'Seconds', 'Ops/second', 'Peak MB', ' | vs baseline' if baseline else ''))
+        print("{0}|{1}|{2}|{3}{4}".format('-' * 21, '-' * 14, '-' * 16, '-' * 13, '|' + '-' * 14 if baseline else ''))
+
+        for phase, result in results.items():
+            if not isinstance(result, dict):
+                continue
+
+            memory = result.get('peak_memory_bytes')
+            line = "{0:<20} | {1:>12.4f} | {2:>14} | {3:>12}".format(
+                phase, result['seconds'], result.get('ops_per_second') or '', '{0:.1f}'.format(memory / 1e6) if memory is not None else '')
+
+            old = (baseline or {}).get('results', {}).get(size, {}).get(phase)
+            if old and old['seconds']:
+                line += " | {0:>11.2f}x".format(result['seconds'] / old['seconds'])
+            print(line)
+
+        print("\nSnapshot: {0:.1f} MB, whole-file pickle: {1:.1f} MB".format(results['snapshot_bytes'] / 1e6, results['pickle_bytes'] / 1e6))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the robot factory hot paths.')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma separated numbers of robots (default: %(default)s)')
+    parser.add_argument('--no-memory', action='store_true', help='skip peak memory tracking, which slows everything down')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--startup', action='store_true',
+                        help='time startup of quick commands instead (fails if status imports take over {0} ms)'.format(STARTUP_TARGET_MS))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    if args.startup:
+        report = run_startup()
+        passed = print_startup_report(report, baseline)
+    else:
+        report = run_benchmarks(sizes, track_memory=not args.no_memory)
+        print_report(report, baseline)
+        passed = True
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
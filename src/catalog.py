@@ -0,0 +1,142 @@
+from array import array
+
+import tasks
+
+
+class TaskCatalog(object):
+    """ Gives every task description a small integer id so robots can store ids instead of strings.
+    Ids are only ever added, never reused or reassigned, for as long as the process runs. """
+
+    def __init__(self, descriptions=()):
+        self._descriptions = [] # <- Task id mapped to its description (list index)
+        self._ids = {} # <- Task description mapped to its id
+
+        for description in descriptions:
+            self.intern(description)
+
+    def __len__(self):
+        return len(self._descriptions)
+
+    def __contains__(self, description):
+        return description in self._ids
+
+    def intern(self, description):
+        """ Id of a task description, new descriptions are given the next free id. """
+
+        try:
+            return self._ids[description]
+        except KeyError:
+            task_id = self._ids[description] = len(self._descriptions)
+            self._descriptions.append(description)
+            return task_id
+
+    def description(self, task_id):
+        return self._descriptions[task_id]
+
+
+def _all_task_descriptions():
+    """ Every task description of every robot type in tasks.py, sorted so ids are the same from one run to the next. """
+
+    descriptions = set()
+    for table in (tasks.base_tasks, tasks.unipedal_tasks, tasks.bipedal_tasks, tasks.quadrupedal_tasks,
+                  tasks.arachnid_tasks, tasks.radial_tasks, tasks.aeronautical_tasks):
+        descriptions.update(table.keys())
+    return sorted(descriptions)
+
+
+# Catalog shared by all robots
+CATALOG = TaskCatalog(_all_task_descriptions())
+
+
+class CompletedTasks(object):
+    """ Compact, append-only record of the tasks a robot completed.
+
+    Behaves like the list of task descriptions it replaces (append, len, iteration) but stores a 2 byte task id per
+    completion in an array('H') log plus a counter per task, so millions of completions cost megabytes instead of
+    a list of string references. """
+
+    __slots__ = ('catalog', '_log', '_counts')
+
+    def __init__(self, descriptions=(), catalog=CATALOG):
+        self.catalog = catalog
+        self._log = array('H') # <- Task id of every completion, in the order they were completed
+        self._counts = array('L') # <- Number of completions per task id (array index)
+
+        if descriptions:
+            self.extend(descriptions)
+
+    def __len__(self):
+        return len(self._log)
+
+    def __iter__(self):
+        description = self.catalog.description
+        for task_id in self._log:
+            yield description(task_id)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.catalog.description(task_id) for task_id in self._log[index]]
+        return self.catalog.description(self._log[index])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'CompletedTasks({0} tasks)'.format(len(self))
+
+    def append(self, description):
+        task_id = self.catalog.intern(description)
+        self._log.append(task_id)
+
+        if task_id >= len(self._counts):
+            self._counts.extend([0] * (task_id + 1 - len(self._counts)))
+        self._counts[task_id] += 1
+
+    def extend(self, descriptions):
+        for description in descriptions:
+            self.append(description)
+
+    def copy(self):
+        """ Independent copy, only the two arrays are copied. """
+
+        other = CompletedTasks.__new__(CompletedTasks)
+        other.catalog = self.catalog
+        other._log = array('H', self._log)
+        other._counts = array('L', self._counts)
+        return other
+
+    def count(self, description):
+        """ Number of times a task was completed. """
+
+        if description not in self.catalog:
+            return 0
+        task_id = self.catalog.intern(description)
+        return self._counts[task_id] if task_id < len(self._counts) else 0
+
+    def counts(self):
+        """ Dict of task description -> number of times it was completed, for every task completed at least once. """
+        return dict((self.catalog.description(task_id), n) for task_id, n in enumerate(self._counts) if n)
+
+    def __getstate__(self):
+        """ Ids are only meaningful within a single run, so the descriptions of the ids used are pickled alongside the log. """
+
+        # Tasks this robot never completed are left out (None), most robots only ever do a few of them
+        descriptions = [self.catalog.description(task_id) if n else None for task_id, n in enumerate(self._counts)]
+        return {'descriptions': descriptions, 'log': self._log.tobytes(), 'counts': self._counts.tolist()}
+
+    def __setstate__(self, state):
+        self.catalog = CATALOG
+        ids = [task_id if description is None else self.catalog.intern(description) for task_id, description in enumerate(state['descriptions'])]
+
+        self._log = array('H')
+        self._log.frombytes(state['log'])
+        self._counts = array('L', [0] * (max(ids) + 1 if ids else 0))
+        for old_id, n in enumerate(state['counts']):
+            self._counts[ids[old_id]] += n
+
+        # Only translate the log when the catalog handed out different ids than the run that saved it
+        if ids != list(range(len(ids))):
+            self._log = array('H', [ids[task_id] for task_id in self._log])
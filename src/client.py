@@ -0,0 +1,187 @@
+"""
+Client and load generator for the robot factory server (see server.py).
+
+Examples:
+    python3 src/client.py call add_robot Bender bipedal
+    python3 src/client.py call top_robots 5
+    python3 src/client.py load --robots 10000 --clients 1000 --requests 20
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import json
+import socket
+import time
+from collections import OrderedDict
+from itertools import count as counter
+
+from handlers import PoolFull
+from robots import ROBOT_TYPES
+from server import DEFAULT_HOST, DEFAULT_PORT
+
+
+# Errors raised by the server that the client raises again as the same type, anything else is a FactoryError
+KNOWN_ERRORS = dict((cls.__name__, cls) for cls in (ValueError, KeyError, TypeError, AttributeError, IndexError, PoolFull))
+
+
+class FactoryError(Exception):
+    """ Any server side error that is not one of KNOWN_ERRORS. """
+
+
+def raise_error(error):
+    raise KNOWN_ERRORS.get(error['type'], FactoryError)(error['message'])
+
+
+class FactoryClient(object):
+    """ Blocking client, every RobotFactory method the server exposes can be called as a method of the client,
+    e.g. client.add_robot('Bender', 'bipedal') or client.add_robots([['Bender', 'bipedal'], ['Rosie', 'radial']]). """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=None):
+        self._sock = socket.create_connection((host, port), timeout)
+        self._file = self._sock.makefile('rwb')
+        self._ids = counter(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def call(self, method, *args, **kwargs):
+        """ Sends one request and waits for its reply, server side errors are raised here. """
+
+        request = {'id': next(self._ids), 'method': method, 'args': list(args)}
+        if kwargs:
+            request['kwargs'] = kwargs
+        self._file.write(json.dumps(request).encode('utf-8') + b'\n')
+        self._file.flush()
+
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('The server closed the connection')
+
+        reply = json.loads(line)
+        if 'error' in reply:
+            raise_error(reply['error'])
+        return reply['result']
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.call(method, *args, **kwargs)
+
+
+### Load generator
+
+async def _client_session(host, port, requests, robot_tasks, latencies, errors):
+    """ One connection sending requests (a mix of status, robot info, leaderboard and queue_task) one after another. """
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for n in range(requests):
+            name, task = robot_tasks[n % len(robot_tasks)] if robot_tasks else (None, None)
+            kind = n % 4
+            if kind == 0 or name is None:
+                request = {'id': n, 'method': 'status'}
+            elif kind == 1:
+                request = {'id': n, 'method': 'robot_info', 'args': [name]}
+            elif kind == 2:
+                request = {'id': n, 'method': 'top_robots', 'args': [10]}
+            else:
+                request = {'id': n, 'method': 'queue_task', 'args': [name, task]}
+
+            started = time.perf_counter()
+            writer.write(json.dumps(request).encode('utf-8') + b'\n')
+            await writer.drain()
+            reply = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - started)
+            if 'error' in reply:
+                errors.append(reply['error'])
+    finally:
+        writer.close()
+
+
+def load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, robots=1000, clients=100, requests=10):
+    """ Creates robots in a single batch request, then has many concurrent clients hammer the server.
+    Returns an OrderedDict of timings, throughput and latency percentiles.
+
+    submit is left out of the mix on purpose, it looks at every capable robot so its cost grows with the factory. """
+
+    robot_types = sorted(ROBOT_TYPES)
+    prefix = 'load-{0}-'.format(int(time.time()))
+    specs = [[prefix + str(n), robot_types[n % len(robot_types)], 0] for n in range(robots)]
+
+    report = OrderedDict()
+    with FactoryClient(host, port) as client:
+        started = time.perf_counter()
+        created = client.add_robots(specs)
+        report['create_seconds'] = time.perf_counter() - started
+        report['robots_created'] = len(specs) - len(created['errors'])
+
+    # Every robot gets a task of its own type queued now and then
+    robot_tasks = [(name, sorted(ROBOT_TYPES[robot_type].all_tasks)[n % 2]) for n, (name, robot_type, _) in enumerate(specs)]
+    latencies, errors = [], []
+
+    async def run_clients():
+        await asyncio.gather(*[_client_session(host, port, requests, robot_tasks, latencies, errors) for _ in range(clients)])
+
+    started = time.perf_counter()
+    asyncio.run(run_clients())
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    report['clients'] = clients
+    report['requests'] = len(latencies)
+    report['errors'] = len(errors)
+    report['seconds'] = elapsed
+    report['requests_per_second'] = len(latencies) / elapsed if elapsed else None
+    for percentile in (50, 90, 99):
+        report['latency_p{0}_ms'.format(percentile)] = latencies[min(len(latencies) * percentile // 100, len(latencies) - 1)] * 1000 if latencies else None
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Talk to (or load test) a robot factory server.')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='server address (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='server port (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command')
+
+    call = commands.add_parser('call', help='call a single method, arguments are parsed as JSON when possible')
+    call.add_argument('method')
+    call.add_argument('args', nargs='*')
+
+    load = commands.add_parser('load', help='generate load with many concurrent clients')
+    load.add_argument('--robots', type=int, default=1000, help='robots created in one batch request first (default: %(default)s)')
+    load.add_argument('--clients', type=int, default=100, help='concurrent connections (default: %(default)s)')
+    load.add_argument('--requests', type=int, default=10, help='requests sent by each client (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text # <- Plain strings (like robot names) do not need quoting
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == 'call':
+        with FactoryClient(args.host, args.port) as client:
+            print(json.dumps(client.call(args.method, *[parse_value(arg) for arg in args.args]), indent=2))
+    elif args.command == 'load':
+        for key, value in load_test(args.host, args.port, args.robots, args.clients, args.requests).items():
+            print('{0:<22} {1}'.format(key, round(value, 4) if isinstance(value, float) else value))
+    else:
+        parse_args(['--help'])
+
+
+if __name__ == "__main__":
+    main()
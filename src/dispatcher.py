@@ -0,0 +1,64 @@
+import heapq
+
+
+def build_task_index(robot_types):
+    """ Inverted index of task description -> ROBOT_TYPES keys of every robot type that can perform it,
+    built from each robot class's all_tasks. """
+
+    index = {}
+    for robot_type, robot_class in sorted(robot_types.items()):
+        for task in robot_class.all_tasks:
+            index.setdefault(task, []).append(robot_type)
+    return dict((task, tuple(types)) for task, types in index.items())
+
+
+class Dispatcher(object):
+    """ Routes factory-wide work to robots, each task goes to the capable robot with the least queued work. """
+
+    def __init__(self, robot_types):
+        self.robot_types = robot_types
+        self.task_index = build_task_index(robot_types)
+
+    def rebuild(self):
+        """ Rebuilds the task index after the robot types' tasks changed (see RobotFactory.reload_tasks). """
+        self.task_index = build_task_index(self.robot_types)
+
+    @property
+    def all_tasks(self):
+        """ Sorted list of every task at least one robot type can perform. """
+        return sorted(self.task_index)
+
+    def capable_types(self, task):
+        """ ROBOT_TYPES keys of the robot types that can perform a task, raises ValueError if there are none. """
+
+        try:
+            return self.task_index[task]
+        except KeyError:
+            raise ValueError('No robot type can {0}'.format(task))
+
+    def plan(self, task, count, loads):
+        """ Splits count runs of a task across robots given as (queued eta, robot name) pairs.
+
+        Greedy least-loaded first: every run goes to the robot that would be free the soonest, which keeps the
+        makespan (the time until the last robot is done) as low as possible for identical tasks.
+        Returns a dict of robot name -> number of runs assigned to it. """
+
+        if not loads:
+            raise ValueError('There are no robots that can {0}'.format(task))
+
+        eta = self._task_eta(task)
+        heap = list(loads)
+        heapq.heapify(heap)
+
+        assigned = {}
+        for _ in range(count):
+            load, name = heap[0]
+            assigned[name] = assigned.get(name, 0) + 1
+            heapq.heapreplace(heap, (load + eta, name))
+        return assigned
+
+    def _task_eta(self, task):
+        """ Eta of a task in seconds, taken from the first robot type that can perform it. """
+
+        robot_class = self.robot_types[self.capable_types(task)[0]]
+        return int(robot_class.all_tasks[task]/1000)
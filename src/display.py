@@ -0,0 +1,140 @@
+"""
+Terminal rendering without forking a shell, frames are drawn with ANSI cursor control in a single write.
+
+The Renderer only rewrites lines that changed since the previous frame and the Dashboard redraws at a fixed frame
+rate showing at most a screenful of robots, so the cost of watching robots work is bounded by the frame rate and the
+terminal size, not by how many robots there are or how many tasks they have done.
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import threading
+from builtins import input
+
+
+CLEAR_SCREEN = '\x1b[2J\x1b[H' # <- Erase everything and move the cursor to the top left
+CLEAR_LINE = '\x1b[K' # <- Erase from the cursor to the end of the line
+CLEAR_BELOW = '\x1b[J' # <- Erase from the cursor to the end of the screen
+HIDE_CURSOR = '\x1b[?25l'
+SHOW_CURSOR = '\x1b[?25h'
+
+
+def move_to(row):
+    """ ANSI sequence moving the cursor to the start of a (0 based) row. """
+    return '\x1b[{0};1H'.format(row + 1)
+
+
+if os.name == 'nt':
+    os.system('') # <- Switches the Windows console into processing ANSI sequences
+
+
+def clear_screen(stream=None):
+    """ Clears the terminal with a single write instead of running clear/cls in a shell. """
+
+    stream = stream or sys.stdout
+    stream.write(CLEAR_SCREEN)
+    stream.flush()
+
+
+class Renderer(object):
+    """ Draws whole frames (lists of lines) at the top of the terminal, only rewriting the lines that changed. """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._previous = None # <- Lines of the last frame drawn, None until the screen was cleared for the first one
+
+    def draw(self, lines):
+        width = shutil.get_terminal_size().columns
+        lines = [line[:width] for line in lines] # <- Wrapped lines would shift every line below them
+
+        if self._previous is None:
+            parts = [HIDE_CURSOR, CLEAR_SCREEN]
+            parts.extend(line + '\n' for line in lines)
+        else:
+            parts = []
+            for row, line in enumerate(lines):
+                if row >= len(self._previous) or self._previous[row] != line:
+                    parts.append(move_to(row) + line + CLEAR_LINE)
+            if len(lines) < len(self._previous):
+                parts.append(move_to(len(lines)) + CLEAR_BELOW)
+
+        if parts:
+            self.stream.write(''.join(parts))
+            self.stream.flush()
+        self._previous = lines
+
+    def close(self):
+        """ Leaves the cursor below the last frame, visible again. """
+
+        if self._previous is not None:
+            self.stream.write(move_to(len(self._previous)) + SHOW_CURSOR)
+            self.stream.flush()
+        self._previous = None
+
+
+def progress_bar(done, total, width=20):
+    filled = int(width * done / total) if total else width
+    return '[' + '#' * filled + '.' * (width - filled) + ']'
+
+
+class Dashboard(object):
+    """ Live view of the robots currently at work, redrawn fps times a second until enter is pressed. """
+
+    def __init__(self, factory, fps=4, renderer=None):
+        self.factory = factory
+        self.fps = fps
+        self.renderer = renderer or Renderer()
+
+    def frame(self):
+        """ Lines of a single frame, at most one per terminal row. """
+
+        rows = shutil.get_terminal_size().lines
+        executor = self.factory.executor
+        robots = self.factory.robots
+        busy_count = executor.busy_count
+
+        lines = [
+            '*** Robots at work: {0} busy out of {1} *** (press enter to leave)'.format(busy_count, len(robots)),
+            '',
+            '{0:<20} | {1:<12} | {2:<22} | {3:>7} | {4}'.format('Robot', 'Type', 'Progress', 'Queued', 'Task'),
+        ]
+        # Only as many robots as fit on screen are looked at, however many are working
+        for name in executor.first_busy_robots(max(rows - len(lines) - 2, 0)):
+            try:
+                robot = robots.peek(name) # <- Only looked at, so not saved again at the next snapshot
+            except KeyError:
+                continue # <- Destroyed in the meantime
+            progress = robot.progress
+            if progress is None:
+                bar, task = progress_bar(0, 0, 20).replace('#', ' '), 'waiting'
+            else:
+                task, done, eta = progress
+                bar = progress_bar(done, eta)
+            lines.append('{0:<20} | {1:<12} | {2} | {3:>7} | {4}'.format(name[:20], robot.robot_type, bar, len(robot.tasks_to_perform), task))
+
+        hidden = busy_count - (len(lines) - 3)
+        if hidden > 0:
+            lines.append('... and {0} more'.format(hidden))
+        return lines
+
+    def run(self):
+        """ Redraws until the user presses enter, input is read on its own thread so drawing never waits for it. """
+
+        stopped = threading.Event()
+
+        def wait_for_enter():
+            input()
+            stopped.set()
+
+        threading.Thread(target=wait_for_enter, name='dashboard-input', daemon=True).start()
+
+        try:
+            while True:
+                self.renderer.draw(self.frame())
+                if stopped.wait(1.0 / self.fps):
+                    break
+        finally:
+            self.renderer.close()
@@ -0,0 +1,266 @@
+import threading
+import time
+from itertools import islice
+
+from handlers import HandlerPool
+
+asyncio = None # <- Imported when an event loop is first started (see TaskExecutor.start), importing it takes longer than the whole factory
+
+
+class TaskExecutor(object):
+    """ Runs every robot's task queue as its own coroutine on a single asyncio event loop.
+
+    The loop lives in a background (daemon) thread so the interactive console stays responsive
+    while any number of robots work at the same time. """
+
+    def __init__(self, time_scale=1.0, handler_pool=None):
+        self.time_scale = time_scale # <- Multiplier on task durations, 0 makes every task finish instantly
+        self.handler_pool = handler_pool or HandlerPool() # <- Runs the tasks that have a handler, see handlers.py
+
+        self._loop = None
+        self._thread = None
+        self._workers = {} # <- Robot name mapped to the asyncio.Task draining that robot's queue
+        self._cancelled = set() # <- Workers cancelled (their robot was destroyed) that have not finished yet
+        self._idle_since = {} # <- Robot name mapped to when it ran out of work, in the order robots went idle
+
+    @property
+    def running(self):
+        """ True while the event loop thread is alive. """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def busy_robots(self):
+        """ Names of the robots that currently have a worker coroutine. """
+        return list(self._workers.keys())
+
+    @property
+    def busy_count(self):
+        """ Number of robots that currently have a worker coroutine. """
+        return len(self._workers)
+
+    def first_busy_robots(self, limit):
+        """ Names of at most limit busy robots, without copying every name (taken on the loop's thread). """
+        return self.call_sync(lambda: list(islice(self._workers, limit)))
+
+    def start(self):
+        """ Starts the event loop in a background thread (does nothing if it is already running). """
+
+        if self.running:
+            return self
+
+        global asyncio
+        import asyncio
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self._loop)
+            self._loop.call_soon(ready.set)
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, name='robot-executor', daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """ Cancels any unfinished work and shuts the event loop down, robots put the task they were in the middle of
+        back in their queue (see Robot.checkpoint_task) so it can be resumed. """
+
+        if not self.running:
+            return
+
+        async def shutdown():
+            workers = list(self._workers.values())
+            for worker in workers:
+                worker.cancel()
+            workers.extend(self._cancelled)
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self.handler_pool.shutdown()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = self._thread = None
+
+    async def sleep(self, seconds):
+        """ Sleep used by robots while they work, scaled by time_scale. """
+        await asyncio.sleep(seconds * self.time_scale)
+
+    def schedule(self, robot):
+        """ Makes sure a worker coroutine is draining the robot's tasks_to_perform queue. Safe to call from any thread. """
+
+        self.start()
+        self._loop.call_soon_threadsafe(self._ensure_worker, robot)
+
+    def schedule_many(self, robots):
+        """ Same as schedule for every robot in a batch, in a single hop to the loop thread. """
+
+        robots = list(robots)
+
+        def ensure_workers():
+            for robot in robots:
+                self._ensure_worker(robot)
+
+        self.start()
+        self._loop.call_soon_threadsafe(ensure_workers)
+
+    def _ensure_worker(self, robot):
+        """ Runs on the loop thread only, so checking and creating a worker can not race with a worker exiting. """
+
+        worker = self._workers.get(robot.name)
+        if worker is not None and not worker.done():
+            return # <- A worker that already returned (its done callback has not run yet) would never see new tasks
+
+        worker = self._loop.create_task(robot.perform_all_tasks_async(self))
+        self._workers[robot.name] = worker
+        self._idle_since.pop(robot.name, None)
+        worker.add_done_callback(lambda _: self._worker_done(robot.name, worker))
+
+    def _worker_done(self, robot_name, worker):
+        self._cancelled.discard(worker)
+        # A cancelled worker was already replaced (or forgotten) when its robot was destroyed, a new robot of the same
+        # name may have its own worker by now
+        if self._workers.get(robot_name) is worker:
+            del self._workers[robot_name]
+            if not worker.cancelled(): # <- Cancelled by a shutdown
+                self._idle_since[robot_name] = time.time()
+
+    def call(self, fn, *args):
+        """ Runs fn(*args) on the loop thread, where robots work through their queues, so it can never race with them. """
+
+        if self.running:
+            self._loop.call_soon_threadsafe(fn, *args)
+        else:
+            fn(*args)
+
+    def call_sync(self, fn, *args):
+        """ Runs fn(*args) on the loop thread and blocks until it returns its result. """
+
+        if not self.running or threading.current_thread() is self._thread:
+            return fn(*args)
+
+        async def call():
+            return fn(*args)
+
+        return asyncio.run_coroutine_threadsafe(call(), self._loop).result()
+
+    def enqueue(self, robot, task, count=1, priority=0, deadline=None):
+        """ Queues a task (count times) for a robot and makes sure it is working on its queue. Safe to call from any thread. """
+
+        def queue_and_schedule():
+            robot.queue_task(task, count, priority, deadline)
+            self._ensure_worker(robot)
+
+        self.start()
+        if threading.current_thread() is self._thread:
+            queue_and_schedule()
+        else:
+            self._loop.call_soon_threadsafe(queue_and_schedule)
+
+    def cancel(self, robot_name, robot=None):
+        """ Stops the worker for the named robot, if there is one. Safe to call from any thread. The robot itself, when
+        given, has its handler tasks taken off the handler pool's backlog in the same step (see HandlerPool.forget). """
+
+        self.cancel_many([robot_name], [] if robot is None else [robot])
+
+    def cancel_many(self, robot_names, robots=()):
+        """ Same as cancel for every named robot (robots being the ones given), in a single hop to the loop thread. """
+
+        robot_names, robots = list(robot_names), list(robots)
+
+        def cancel_workers():
+            self.handler_pool.forget(robots) # <- Before a cancelled worker could finish (or drop) another handler task
+            for robot_name in robot_names:
+                self._cancel_worker(robot_name)
+
+        self.call(cancel_workers)
+
+    def cancel_all(self):
+        """ Stops every worker and forgets every idle robot, e.g. when all robots are destroyed. """
+
+        def cancel_workers():
+            self.handler_pool.recount([])
+            for worker in self._workers.values():
+                worker.cancel()
+            self._cancelled.update(self._workers.values())
+            self._workers = {}
+            self._idle_since = {}
+
+        self.call(cancel_workers)
+
+    def _cancel_worker(self, robot_name):
+        """ Forgets the robot's worker right away so a new robot of the same name gets a worker of its own. """
+
+        self._idle_since.pop(robot_name, None)
+        worker = self._workers.pop(robot_name, None)
+        if worker is not None:
+            worker.cancel()
+            self._cancelled.add(worker)
+
+    ### Idle robots
+
+    def mark_idle(self, robot_names):
+        """ Counts robots that have no work (e.g. loaded without queued tasks or created without starting) as idle from now on. """
+
+        robot_names = list(robot_names)
+
+        def mark():
+            marked = dict.fromkeys(robot_names, time.time())
+            for robot_name in [name for name in marked if name in self._workers or name in self._idle_since]:
+                del marked[robot_name] # <- Busy, or idle since earlier already
+            self._idle_since.update(marked)
+
+        self.call(mark)
+
+    def idle_robots(self, idle_for=0):
+        """ Names of the robots that have been out of work for at least idle_for seconds (wall clock), longest idle first.
+        Robots are kept in the order they went idle, so only the robots returned (plus one) are looked at. """
+
+        def oldest_idle():
+            cutoff = time.time() - idle_for
+            names = []
+            for robot_name, since in self._idle_since.items():
+                if since > cutoff:
+                    break
+                names.append(robot_name)
+            return names
+
+        return self.call_sync(oldest_idle)
+
+    def idle_since(self, robot_name):
+        """ When a robot ran out of work, None while it is working (or if it was never seen idle). """
+        return self._idle_since.get(robot_name)
+
+    def run(self, coro):
+        """ Runs a coroutine on the executor loop and blocks until it returns. """
+
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def wait_idle(self, timeout=None):
+        """ Blocks until every scheduled robot has finished its queue. """
+
+        async def wait_for_workers():
+            while self._workers:
+                await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+        if self.running:
+            asyncio.run_coroutine_threadsafe(wait_for_workers(), self._loop).result(timeout)
+
+    def run_all(self, robots):
+        """ Drains the queues of all given robots concurrently and blocks until the longest queue finishes. """
+
+        async def run_robots():
+            # Reuse the regular workers so a robot that is already busy is never drained twice
+            for robot in robots:
+                self._ensure_worker(robot)
+            workers = [self._workers[robot.name] for robot in robots if robot.name in self._workers]
+            await asyncio.gather(*workers)
+
+        self.run(run_robots())
+
+
+# Executor shared by the factory and by the blocking Robot.perform_* methods
+default_executor = TaskExecutor()
@@ -0,0 +1,208 @@
+"""
+Task handlers, callables that actually perform a task instead of the robot simply waiting out its eta.
+
+Handlers are registered per task description (see tasks.json) and run on a HandlerPool, a bounded thread (or process)
+pool, so blocking work such as real I/O never holds up the event loop every robot shares. Example:
+
+    import handlers
+
+    @handlers.register('do the dishes')
+    def do_the_dishes(robot_name, task, seconds):
+        dishwasher.run(timeout=seconds) # <- Blocking is fine in here
+
+A handler is called with the robot's name, the task and the seconds the robot would otherwise take for it. A handler
+that raises drops the task (reason 'failed'), it is not counted as completed.
+"""
+
+import threading
+
+import tasks
+
+
+HANDLERS = {} # <- Task description mapped to the callable that performs it
+
+
+class PoolFull(RuntimeError):
+    """ Raised instead of taking on more handler work while too many robots are already waiting for the pool, or too
+    much of that work is already queued. """
+
+
+def register(task, handler=None):
+    """ Has handler perform a task from now on, as a decorator when handler is left out. Raises KeyError for a task
+    no robot type can perform. """
+
+    if task not in tasks.TABLE:
+        raise KeyError('Unknown task: {0}'.format(task))
+    if handler is None:
+        return lambda handler: register(task, handler)
+
+    HANDLERS[task] = handler
+    return handler
+
+
+def unregister(task):
+    """ Goes back to robots waiting out the task's eta. """
+    HANDLERS.pop(task, None)
+
+
+class HandlerPool(object):
+    """ Runs task handlers on at most max_workers threads (or processes with processes=True, handlers then have to be
+    module level functions so they can be pickled).
+
+    A robot first waits, on the event loop and without holding a thread, for one of max_workers + max_queued
+    submission slots, so the pool never has more than max_queued handlers lined up. type_limits (ROBOT_TYPES key ->
+    number of robots) also caps how many robots of a type run handlers at once. Once max_waiting robots are waiting
+    for a slot the pool is full and new handler work is turned away (PoolFull, see admit) instead of being queued, as
+    is any work that would take the backlog (handler tasks robots have queued or are in the middle of) past max_backlog. """
+
+    def __init__(self, max_workers=8, max_queued=None, max_waiting=1000, max_backlog=10000, type_limits=None, processes=False):
+        self.max_workers = max_workers
+        self.max_queued = max_workers if max_queued is None else max_queued
+        self.max_waiting = max_waiting
+        self.max_backlog = max_backlog
+        self.type_limits = dict((robot_type.upper(), limit) for robot_type, limit in (type_limits or {}).items())
+        self.processes = processes
+
+        self.running = 0 # <- Handlers handed to the pool that have not finished yet (lined up or running)
+        self.waiting = 0 # <- Robots waiting for a submission slot
+        self.backlog = 0 # <- Handler tasks queued by robots (or in progress), admitted or not
+
+        self._backlog_lock = threading.Lock() # <- Work is admitted from the console's (or server's) thread
+        self._pool = None # <- Started on first use
+        self._futures = set() # <- Handlers handed to the pool that have not finished yet
+        self._loop = None # <- Event loop the slots below belong to
+        self._slots = None # <- asyncio.Semaphore of the max_workers + max_queued submission slots
+        self._type_slots = {} # <- Robot type mapped to the asyncio.Semaphore of its type_limits
+
+    @property
+    def full(self):
+        return self.waiting >= self.max_waiting
+
+    def handles(self, task):
+        return task in HANDLERS
+
+    def stats(self):
+        return {'running': self.running, 'waiting': self.waiting, 'backlog': self.backlog, 'max_workers': self.max_workers}
+
+    def admit(self, task, count=1):
+        """ Admission control, takes count runs of a task onto the backlog if it has a handler. Raises PoolFull
+        instead while the pool is full or if they would not fit in the backlog. """
+
+        if not self.handles(task):
+            return
+        with self._backlog_lock:
+            if self.full:
+                raise PoolFull('{0} robots are already waiting to {1}, try again later'.format(self.waiting, task))
+            if self.backlog + count > self.max_backlog:
+                raise PoolFull('{0} handler tasks are already queued, {1} more to {2} would be over the limit of {3}, '
+                               'try again later'.format(self.backlog, count, task, self.max_backlog))
+            self.backlog += count
+
+    def release(self, count=1):
+        """ Takes count handler tasks off the backlog, once they are done or dropped. """
+
+        with self._backlog_lock:
+            self.backlog = max(self.backlog - count, 0) # <- Never below 0 should a handler be unregistered meanwhile
+
+    def track(self, robots):
+        """ Counts the handler tasks robots were given without admission (e.g. the starting tasks of new robots, they are
+        never turned away) on the backlog. """
+
+        if HANDLERS:
+            count = sum(self.handler_tasks(robot) for robot in robots)
+            with self._backlog_lock:
+                self.backlog += count
+
+    def forget(self, robots):
+        """ Takes the handler tasks of robots that are about to be destroyed off the backlog. """
+
+        if HANDLERS and self.backlog:
+            self.release(sum(self.handler_tasks(robot) for robot in robots))
+
+    def recount(self, robots):
+        """ Starts the backlog over with the handler tasks of robots, every robot with tasks queued (e.g. after a load). """
+
+        count = sum(self.handler_tasks(robot) for robot in robots) if HANDLERS else 0
+        with self._backlog_lock:
+            self.backlog = count
+
+    def handler_tasks(self, robot):
+        """ Number of handler tasks a robot has queued, plus the one it is working on if that is one. """
+        return robot.tasks_to_perform.count(HANDLERS) + (robot.current_task in HANDLERS)
+
+    async def run(self, robot, task, seconds):
+        """ Performs a task with its handler on the pool once there is room, returns what the handler returned or
+        raises what it raised. Handlers that already started can not be interrupted, cancelling this only gives up
+        on the result (a handler that was still lined up is taken off the pool). """
+
+        import asyncio # <- Already imported by the executor running this, see TaskExecutor.start
+
+        handler = HANDLERS[task]
+        slots = self._slots_for(robot.robot_type.upper())
+        acquired = []
+
+        self.waiting += 1
+        try:
+            for slot in slots:
+                await slot.acquire()
+                acquired.append(slot)
+            future = self._get_pool().submit(handler, robot.name, task, seconds)
+            self._futures.add(future)
+        except BaseException:
+            for slot in acquired:
+                slot.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+        # Slots are only given back once the handler is really done, not when a robot stops waiting for it
+        self.running += 1
+        loop = self._loop
+
+        def done(_):
+            self._futures.discard(future)
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._finished, acquired)
+
+        future.add_done_callback(done)
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, acquired):
+        self.running -= 1
+        for slot in acquired:
+            slot.release()
+
+    def _slots_for(self, robot_type):
+        """ Semaphores a robot of a type needs, its type's limit first so throttled types do not sit on pool slots. """
+
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # The executor started a new event loop, asyncio primitives can not be carried over from the old one
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queued)
+            self._type_slots = dict((name, asyncio.Semaphore(limit)) for name, limit in self.type_limits.items())
+            self.running = self.waiting = 0
+
+        type_slot = self._type_slots.get(robot_type)
+        return [self._slots] if type_slot is None else [type_slot, self._slots]
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.processes:
+                from concurrent.futures import ProcessPoolExecutor # <- Pulls in multiprocessing, only when asked for
+                self._pool = ProcessPoolExecutor(self.max_workers)
+            else:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix='robot-handler')
+        return self._pool
+
+    def shutdown(self, wait=False):
+        """ Stops the pool, handlers still lined up are dropped (running ones finish in the background). It starts
+        again the next time it is used. """
+
+        if self._pool is not None:
+            for future in list(self._futures):
+                future.cancel() # <- Only handlers still lined up can be, shutdown's cancel_futures needs Python 3.9
+            self._pool.shutdown(wait=wait)
+            self._pool = None
@@ -0,0 +1,212 @@
+import threading
+
+
+class Leaderboard(object):
+    """ Robots ranked by number of completed tasks, kept in order as tasks are completed instead of sorted on every view.
+
+    Robot names are kept in a list ordered by completed count (most first), robots with the same count form a contiguous
+    block and the start/end of every block is tracked. Finishing a task swaps the robot with the first robot of its block
+    and moves the block boundary by one, so the common case is O(1). Adding or removing a robot moves it across the blocks
+    between its old and new place, i.e. O(number of distinct counts in between). Ranks, top-k and pages are direct lookups
+    and slices of the ordered list. """
+
+    def __init__(self):
+        self._names = [] # <- Robot names, most tasks completed first
+        self._positions = {} # <- Robot name mapped to its index in self._names
+        self._counts = {} # <- Robot name mapped to its number of completed tasks
+        self._blocks = {} # <- Completed count mapped to the [start, end) slice of self._names with that count
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    ### Updates
+
+    def rebuild(self, counts):
+        """ Replaces the whole leaderboard with a sort of (robot name, completed count) pairs, used after loading. """
+
+        with self._lock:
+            self._rebuild_blocks(sorted(counts, key=lambda item: -item[1]))
+
+    def add(self, name, count=0):
+        with self._lock:
+            if name in self._positions:
+                return
+            self._names.append(name)
+            self._positions[name] = len(self._names) - 1
+            self._settle_up(name, len(self._names) - 1, count)
+
+    def add_many(self, names):
+        """ Adds many robots without any completed tasks, they all join the end of the list (0 is the lowest count). """
+
+        with self._lock:
+            start = len(self._names)
+            for name in names:
+                if name not in self._positions:
+                    self._positions[name] = len(self._names)
+                    self._counts[name] = 0
+                    self._names.append(name)
+
+            if len(self._names) > start:
+                self._blocks.setdefault(0, [start, start])[1] = len(self._names)
+
+    def increment(self, name):
+        """ Records one more completed task for a robot, unknown names are ignored (e.g. a robot destroyed mid-task). """
+
+        with self._lock:
+            if name in self._positions:
+                self._settle_up(name, self._detach_up(name), self._counts[name] + 1)
+
+    def remove(self, name):
+        with self._lock:
+            if name in self._positions:
+                self._sink(name)
+
+    def remove_many(self, names):
+        """ Removes many robots at once, past a few of them the survivors (who keep their order) are rebuilt into the
+        list in a single pass instead of sinking every robot to the end one by one. """
+
+        with self._lock:
+            positions = self._positions
+            gone = set(names) & positions.keys()
+            keep = len(self._names) - len(gone)
+
+            if all(positions[name] >= keep for name in gone):
+                self._truncate(keep) # <- The robots with the fewest tasks, e.g. from names_at_most
+            elif len(gone) * len(self._blocks) * 4 < len(self._names):
+                for name in gone: # <- Few enough that sinking them one by one is cheaper than a rebuild
+                    self._sink(name)
+            else:
+                counts = self._counts
+                self._rebuild_blocks([(name, counts[name]) for name in self._names if name not in gone])
+
+    def clear(self):
+        with self._lock:
+            self._names, self._positions, self._counts, self._blocks = [], {}, {}, {}
+
+    ### Queries
+
+    def count(self, name):
+        return self._counts[name]
+
+    def rank(self, name):
+        """ 1 based rank of a robot, robots with the same number of completed tasks share a rank. """
+
+        with self._lock:
+            return self._blocks[self._counts[name]][0] + 1
+
+    def top(self, k=10):
+        """ List of (robot name, completed count) for the k robots with the most completed tasks. """
+        return self.page(0, k)
+
+    def page(self, page, per_page=20):
+        """ List of (robot name, completed count) on a 0 based page of the leaderboard. """
+
+        with self._lock:
+            names = self._names[page * per_page:(page + 1) * per_page]
+            return [(name, self._counts[name]) for name in names]
+
+    def num_pages(self, per_page=20):
+        return max(1, (len(self._names) + per_page - 1) // per_page)
+
+    def names_at_most(self, max_count):
+        """ Names of every robot with at most max_count completed tasks, a slice off the end of the list (the blocks
+        tell where it starts), fewest completed tasks last. """
+
+        with self._lock:
+            starts = [block[0] for count, block in self._blocks.items() if count <= max_count]
+            return self._names[min(starts):] if starts else []
+
+    ### Internals, all called with the lock held
+
+    def _rebuild_blocks(self, ranked):
+        """ Replaces everything with (robot name, completed count) pairs that are already ordered, most tasks first. """
+
+        self._names = [name for name, _ in ranked]
+        self._positions = {name: n for n, name in enumerate(self._names)}
+        self._counts = dict(ranked)
+        self._blocks = {}
+        for n, (_, count) in enumerate(ranked):
+            block = self._blocks.setdefault(count, [n, n])
+            block[1] = n + 1
+
+    def _truncate(self, keep):
+        """ Drops every robot past the first keep, the blocks they were in are cut short. """
+
+        names, counts, blocks = self._names, self._counts, self._blocks
+        for name in names[keep:]:
+            del self._positions[name]
+            count = counts.pop(name)
+            block = blocks.get(count)
+            if block is None:
+                continue # <- Already dropped along with an earlier robot
+            if block[0] >= keep:
+                del blocks[count]
+            else:
+                block[1] = keep
+        del names[keep:]
+
+    def _swap(self, i, j):
+        names = self._names
+        names[i], names[j] = names[j], names[i]
+        self._positions[names[i]] = i
+        self._positions[names[j]] = j
+
+    def _detach_up(self, name):
+        """ Moves a robot to the first slot of its block and takes it out of the block, returns the slot. """
+
+        block = self._blocks[self._counts[name]]
+        slot = block[0]
+        self._swap(self._positions[name], slot)
+        block[0] += 1
+        if block[0] == block[1]:
+            del self._blocks[self._counts[name]]
+        return slot
+
+    def _settle_up(self, name, slot, count):
+        """ Moves a robot sitting outside any block at slot up past every block with a lower count. """
+
+        names, counts, blocks = self._names, self._counts, self._blocks
+
+        while slot > 0 and counts[names[slot - 1]] < count:
+            # Jump over the block right above by swapping with its first robot, the block shifts down by one
+            block = blocks[counts[names[slot - 1]]]
+            top = block[0]
+            self._swap(slot, top)
+            block[0] += 1
+            block[1] += 1
+            slot = top
+
+        counts[name] = count
+        if slot > 0 and counts[names[slot - 1]] == count:
+            blocks[count][1] += 1
+        else:
+            blocks[count] = [slot, slot + 1]
+
+    def _sink(self, name):
+        """ Moves a robot down past every block below it to the very end of the list and drops it. """
+
+        names, counts, blocks = self._names, self._counts, self._blocks
+
+        block = blocks[counts[name]]
+        slot = block[1] - 1
+        self._swap(self._positions[name], slot)
+        block[1] -= 1
+        if block[0] == block[1]:
+            del blocks[counts[name]]
+
+        while slot < len(names) - 1:
+            # Jump over the block right below by swapping with its last robot, the block shifts up by one
+            block = blocks[counts[names[slot + 1]]]
+            bottom = block[1] - 1
+            self._swap(slot, bottom)
+            block[0] -= 1
+            block[1] -= 1
+            slot = bottom
+
+        names.pop()
+        del self._positions[name]
+        del counts[name]
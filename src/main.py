@@ -8,10 +8,11 @@ Created: 7/23/2019
 from __future__ import print_function
 from builtins import input
 
-from collections import OrderedDict
-
-from robot_factory import RobotFactory
-from utils import clear_console, press_enter_to_continue, get_user_choice
+import argparse
+import heapq
+import json
+import os
+from collections import Counter, OrderedDict
 
 
 # ACTION_CHOICES are the primary actions that will be presented to a user at the start
@@ -23,15 +24,40 @@ ACTION_CHOICES = OrderedDict([
             ('3', 'Destroy a robot'),
             ('4', 'Destroy all robots'),
             ('5', 'View robot task leaderboard'),
+            ('6', 'Submit work to the factory'),
+            ('7', 'Watch robots work'),
+            ('8', 'Upgrade robots'),
             ('0', 'Exit'),
     ])
 
 
-def run_session():
+def run_session(save_path='robot_save', seed=None, record=None):
+    # Imported only now so quick commands (see print_status) never pay for the factory, robots and their event loop
+    import metrics
+    from robot_factory import RobotFactory
+    from robots import seed_tasks
+    from utils import clear_console, get_user_choice
+
     clear_console() # <- clears the console, makes following prompts and information easier
 
+    # With a seed every robot is given the same random tasks as it was the last time with that seed (see robots.seed_tasks)
+    if seed is not None:
+        seed_tasks(seed)
+    # Every task assigned and completed is logged when asked for, replay.py can run the session again later
+    event_log = None
+    if record:
+        from replay import EventLog # <- Along with the simulation it replays sessions on, only when recording
+        event_log = EventLog(record, RobotFactory.executor.time_scale, save=save_path).start()
+
+    # Metrics are only collected (and written in Prometheus format) when a file to write them to is given
+    metrics_file = os.environ.get('ROBOT_METRICS_FILE')
+    if metrics_file:
+        metrics.enable()
+        exporter = metrics.Exporter(metrics_file)
+        exporter.start()
+
     # Factory used as a context manager to ensure load and save methods are run
-    with RobotFactory() as rf:
+    with RobotFactory(save_path) as rf:
 
         # Choices from ACTION_CHOICES above mapped to actual methods
         actions_map = {
@@ -40,37 +66,95 @@ def run_session():
                 'Destroy a robot':              rf.destroy_a_robot,
                 'Destroy all robots':            rf.destroy_all_robots,
                 'View robot task leaderboard':  rf.view_robot_leaderboard,
+                'Submit work to the factory':   rf.submit_work,
+                'Watch robots work':            rf.watch_robots,
+                'Upgrade robots':               rf.upgrade_robots,
                 # Exit' is not mapped so that it passes choice validation and still exits
         }
 
         # Primary user interaction loop runs until a user chooses to exit
-        while True:
-            # Below function gets user input based on dict of choices
-            _, choice = get_user_choice(ACTION_CHOICES, 'What would you like to do?')
-
-            try:
-                actions_map[choice]() # <- Call the method on the fly
-            except KeyError:
-                clear_console()
-                pass # Only hits KeyError if '0' : Exit is chosen
-
-            if choice == 'Exit':
-                # Have user confirm exit with case insensitve typed input
-                if input('Type EXIT to quit if you are sure you want to leave.\n').upper() == 'EXIT':
+        try:
+            while True:
+                # Below function gets user input based on dict of choices
+                _, choice = get_user_choice(ACTION_CHOICES, 'What would you like to do?')
+
+                try:
+                    actions_map[choice]() # <- Call the method on the fly
+                except KeyError:
                     clear_console()
-                    break
+                    pass # Only hits KeyError if '0' : Exit is chosen
+
+                if choice == 'Exit':
+                    # Have user confirm exit with case insensitve typed input
+                    if input('Type EXIT to quit if you are sure you want to leave.\n').upper() == 'EXIT':
+                        clear_console()
+                        break
+        except KeyboardInterrupt:
+            clear_console() # <- Ctrl+C leaves just like exiting does, robots (and their half done tasks) are still saved
 
         print('\n*** You are now leaving the robot factory! ***\n')
     print('\n*** Your robots have been saved, goodbye! ***\n')
 
+    if event_log is not None:
+        event_log.stop()
+    if metrics_file:
+        exporter.stop()
+
+
+def print_status(save_path='robot_save', top=5, as_json=False):
+    """ Prints how many robots are saved (per type) and which completed the most tasks straight from the save files,
+    without starting the factory: no robot is loaded and nothing starts working, so scripts can check in quickly. """
+
+    from storage import RobotStore
+
+    robots = RobotStore(save_path).summary()
+    per_type = Counter(robot_type for robot_type, _ in robots.values())
+    leaders = heapq.nlargest(top, robots.items(), key=lambda item: item[1][1])
+
+    status = OrderedDict([
+        ('robots', len(robots)),
+        ('tasks_completed', sum(completed for _, completed in robots.values())),
+        ('robots_per_type', OrderedDict(sorted(per_type.items()))),
+        ('leaderboard', [(name, completed) for name, (_, completed) in leaders]),
+    ])
+    if as_json:
+        print(json.dumps(status, indent=2))
+        return
+
+    print("*** {0} robots saved, {1} tasks completed ***\n".format(status['robots'], status['tasks_completed']))
+    for robot_type, count in status['robots_per_type'].items():
+        print("{0:>12}: {1}".format(robot_type, count))
+
+    print("\n*** Top {0} robots ***\n".format(top))
+    print("   Tasks | Robot")
+    print("---------|----------")
+    for name, completed in status['leaderboard']:
+        print("{0:>8} | {1}".format(completed, name))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='The robot factory, an interactive game by default.')
+    parser.add_argument('command', nargs='?', default='play', choices=('play', 'status'),
+                        help='play (the default) or status to summarize the saved robots without starting the factory')
+    parser.add_argument('--save', default='robot_save', help='base name of the save files')
+    parser.add_argument('--top', type=int, default=5, help='number of robots status shows from the leaderboard')
+    parser.add_argument('--json', action='store_true', help='print the status as JSON')
+    parser.add_argument('--seed', type=int, help='random seed for the tasks robots are given, the same seed gives the same tasks')
+    parser.add_argument('--record', metavar='PATH', help='write every task assigned and completed to an event log (see replay.py)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'status':
+        print_status(args.save, args.top, args.json)
+    else:
+        run_session(args.save, args.seed, args.record)
+
 
 if __name__ == "__main__":
-    run_session()
+    main()
 
     ### Potential enchancements:
     # could leverage object.__class__.__name__ and/or object.__doc__ for choice mappings? this would negate the need for 2 dictionaries to map abstract (number) choices to objects/methods
-    # add a manual save option and maybe an chance to save on KeyboardInterrupt?
-    # allow users to queue up tasks for a robot to complete (instead of one at a time)
-    # leverage async so mutliple robots could run multiple tasks at once
-    # let a user upgrade bots so they can perform tasks more quickly! (could earn upgrade points through completing more tasks)
 
@@ -0,0 +1,225 @@
+"""
+Counters and histograms for the robot factory hot paths, exported as Prometheus text or an in-process snapshot.
+
+Instrumentation is off by default, every hook checks metrics.ENABLED first so a disabled hook costs a single
+attribute lookup. Turn it on with enable(), or by setting ROBOT_METRICS_FILE when running main.py.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+ENABLED = False
+
+# Seconds, from quick tasks to the longest robot tasks and slow saves
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 15, 20, 25, 30, 60)
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 50, 100, 500, 1000, 10000)
+
+
+class Metric(object):
+    """ Base for all metrics, values are kept per tuple of label values. """
+
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _label_text(self, labels, extra=()):
+        pairs = list(zip(self.labelnames, labels)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def total(self):
+        return sum(self._values.values())
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def prometheus_lines(self):
+        with self._lock:
+            return ['{0}{1} {2}'.format(self.name, self._label_text(labels), value) for labels, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DURATION_BUCKETS):
+        super(Histogram, self).__init__(name, description, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per bucket counts (the last one is +Inf), then sum and count
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """ Dict of labels -> {'count', 'sum', 'mean', 'buckets'} where buckets are cumulative like Prometheus'. """
+
+        with self._lock:
+            result = {}
+            for labels, (counts, total, count) in self._values.items():
+                cumulative, running = OrderedDict(), 0
+                for bound, n in zip(self.buckets + (float('inf'),), counts):
+                    running += n
+                    cumulative[bound] = running
+                result[labels] = {'count': count, 'sum': total, 'mean': total / count if count else 0.0, 'buckets': cumulative}
+            return result
+
+    def prometheus_lines(self):
+        lines = []
+        for labels, series in sorted(self.snapshot().items()):
+            for bound, n in series['buckets'].items():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{0}_bucket{1} {2}'.format(self.name, self._label_text(labels, [('le', le)]), n))
+            lines.append('{0}_sum{1} {2}'.format(self.name, self._label_text(labels), series['sum']))
+            lines.append('{0}_count{1} {2}'.format(self.name, self._label_text(labels), series['count']))
+        return lines
+
+
+class MetricsRegistry(object):
+    """ Holds every metric, renders them all as Prometheus text or as a plain dict snapshot. """
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.started = time.time()
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, description, labelnames=()):
+        return self._add(Counter(name, description, labelnames))
+
+    def gauge(self, name, description, labelnames=()):
+        return self._add(Gauge(name, description, labelnames))
+
+    def histogram(self, name, description, labelnames=(), buckets=DURATION_BUCKETS):
+        return self._add(Histogram(name, description, labelnames, buckets))
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.clear()
+        self.started = time.time()
+
+    def snapshot(self):
+        """ Every metric's current values, plus overall task throughput since the metrics were (re)started. """
+
+        uptime = time.time() - self.started
+        result = OrderedDict((name, metric.snapshot()) for name, metric in self.metrics.items())
+        result['uptime_seconds'] = uptime
+        result['tasks_per_second'] = TASKS_COMPLETED.total() / uptime if uptime else 0.0
+        return result
+
+    def to_prometheus(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append('# HELP {0} {1}'.format(metric.name, metric.description))
+            lines.append('# TYPE {0} {1}'.format(metric.name, metric.kind))
+            lines.extend(metric.prometheus_lines())
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """ Writes the Prometheus text format atomically, e.g. for the node exporter's textfile collector. """
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as prom_file:
+            prom_file.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+METRICS = MetricsRegistry()
+
+TASK_DURATION = METRICS.histogram('robot_task_duration_seconds', 'Wall time spent performing a task.', ('task', 'robot_type'))
+TASKS_COMPLETED = METRICS.counter('robot_tasks_completed_total', 'Tasks completed.', ('robot_type',))
+QUEUE_DEPTH = METRICS.histogram('robot_queue_depth', 'Tasks still queued when a robot finishes a task.', ('robot_type',), DEPTH_BUCKETS)
+SAVE_DURATION = METRICS.histogram('factory_save_duration_seconds', 'Time taken by RobotFactory._save.')
+LOAD_DURATION = METRICS.histogram('factory_load_duration_seconds', 'Time taken by RobotFactory._load.')
+SAVE_SIZE = METRICS.gauge('factory_save_size_bytes', 'Size of the save files after the last save.', ('file',))
+LEADERBOARD_LATENCY = METRICS.histogram('leaderboard_query_duration_seconds', 'Leaderboard query latency.', ('query',), LATENCY_BUCKETS)
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+### Hooks, only called when ENABLED
+
+def task_performed(robot, task, duration):
+    TASK_DURATION.observe(duration, (task, robot.robot_type))
+
+
+def task_finished(robot, task):
+    robot_type = robot.robot_type
+    TASKS_COMPLETED.inc((robot_type,))
+    QUEUE_DEPTH.observe(len(robot.tasks_to_perform), (robot_type,))
+
+
+def saved(duration, files):
+    SAVE_DURATION.observe(duration)
+    for fn in files:
+        if os.path.exists(fn):
+            SAVE_SIZE.set(os.path.getsize(fn), (os.path.basename(fn),))
+
+
+class Exporter(threading.Thread):
+    """ Background thread rewriting a Prometheus text file every interval seconds (and once more when stopped). """
+
+    def __init__(self, path, interval=10.0, registry=METRICS):
+        super(Exporter, self).__init__(name='metrics-exporter', daemon=True)
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.registry.write_prometheus(self.path)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.registry.write_prometheus(self.path)
@@ -0,0 +1,246 @@
+import threading
+from bisect import bisect_left
+from itertools import chain, islice
+
+
+LAST_CHAR = u'\U0010ffff' # <- Sorts after every character, prefix + LAST_CHAR is past every name starting with prefix
+
+
+class SortedNames(object):
+    """ Names kept in sorted order, for O(log n) prefix lookups, pages, additions and removals.
+
+    The names are split into sorted blocks of LOAD to 2 * LOAD names, the last name of every block is kept alongside
+    to find a name's block with a binary search and a Fenwick tree of the block lengths finds the block holding a
+    position, so adding or removing a name only ever copies its own block. Blocks are replaced rather than changed,
+    which lets iter and islice walk a snapshot of the blocks that later changes do not disturb.
+
+    Added names are buffered and merged in right before the next lookup, all at once with a single sort when there
+    are many of them, so creating robots one by one (or a million at once) never pays for a million inserts. """
+
+    LOAD = 1000 # <- Names per block when the blocks are rebuilt, a block is split in two once it has twice as many
+
+    __slots__ = ('_blocks', '_maxes', '_tree', '_len', '_pending')
+
+    def __init__(self, names=()):
+        self._pending = [] # <- Added since the last lookup, not merged in yet
+        self._rebuild(sorted(names))
+
+    def __len__(self):
+        return self._len + len(self._pending)
+
+    def __iter__(self):
+        self._merge()
+        return chain.from_iterable(list(self._blocks))
+
+    def add(self, name):
+        self._pending.append(name)
+
+    def add_many(self, names):
+        self._pending.extend(names)
+
+    def remove(self, name):
+        self._merge()
+        index = bisect_left(self._maxes, name)
+        if index == len(self._blocks):
+            return
+        block = self._blocks[index]
+        position = bisect_left(block, name)
+        if block[position] != name:
+            return
+
+        self._len -= 1
+        if len(block) == 1:
+            del self._blocks[index], self._maxes[index]
+            self._build_tree()
+        else:
+            block = self._blocks[index] = block[:position] + block[position + 1:]
+            self._maxes[index] = block[-1]
+            self._update_tree(index, -1)
+
+    def remove_many(self, names):
+        """ Removes a set of names, one at a time while that copies fewer names than filtering every block once. """
+
+        if len(names) * self.LOAD < len(self):
+            for name in names:
+                self.remove(name)
+        else:
+            self._rebuild([name for name in self if name not in names])
+
+    def islice(self, start, stop):
+        """ Iterator over the names from position start up to (not including) stop. """
+
+        self._merge()
+        stop = min(stop, self._len)
+        if start >= stop:
+            return iter(())
+        index, offset = self._locate(start)
+        return islice(chain(islice(self._blocks[index], offset, None), chain.from_iterable(self._blocks[index + 1:])),
+                      stop - start)
+
+    def prefix_range(self, prefix):
+        """ (start, end) positions of the names starting with prefix. """
+
+        self._merge()
+        if not prefix:
+            return 0, self._len
+        return self._position(prefix), self._position(prefix + LAST_CHAR)
+
+    def _merge(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        if len(pending) * self.LOAD > self._len:
+            # The old names are sorted runs, so this costs little more than sorting the additions
+            self._rebuild(sorted(chain(chain.from_iterable(self._blocks), pending)))
+        else:
+            for name in pending:
+                self._insert(name)
+
+    def _insert(self, name):
+        if not self._blocks:
+            self._rebuild([name])
+            return
+
+        index = min(bisect_left(self._maxes, name), len(self._blocks) - 1) # <- Past every name goes to the last block
+        block = self._blocks[index]
+        position = bisect_left(block, name)
+        block = block[:position] + [name] + block[position:]
+        self._len += 1
+
+        if len(block) > 2 * self.LOAD:
+            self._blocks[index:index + 1] = [block[:self.LOAD], block[self.LOAD:]]
+            self._maxes[index:index + 1] = [block[self.LOAD - 1], block[-1]]
+            self._build_tree()
+        else:
+            self._blocks[index] = block
+            self._maxes[index] = block[-1]
+            self._update_tree(index, 1)
+
+    def _rebuild(self, names):
+        """ Splits a sorted list of names into fresh blocks. """
+
+        self._blocks = [names[start:start + self.LOAD] for start in range(0, len(names), self.LOAD)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(names)
+        self._build_tree()
+
+    ### Fenwick tree of the block lengths, tree[i] sums the lengths of the blocks i - (i & -i) to i - 1
+
+    def _build_tree(self):
+        tree = [0] + [len(block) for block in self._blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update_tree(self, index, delta):
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _position(self, name):
+        """ Position name has (or would have) in the sorted names. """
+
+        index = bisect_left(self._maxes, name)
+        if index == len(self._blocks):
+            return self._len
+
+        position, i = 0, index # <- Sum of the lengths of the blocks before index
+        while i:
+            position += self._tree[i]
+            i -= i & -i
+        return position + bisect_left(self._blocks[index], name)
+
+    def _locate(self, position):
+        """ (block index, offset in the block) of a position below len. """
+
+        index, step = 0, 1 << len(self._tree).bit_length()
+        while step:
+            if index + step < len(self._tree) and self._tree[index + step] <= position:
+                index += step
+                position -= self._tree[index]
+            step >>= 1
+        return index, position
+
+
+class NameIndex(object):
+    """ Sorted index of robot names, overall and per robot type (upper case ROBOT_TYPES key), kept up to date as robots
+    are created and destroyed. Counting and paging through the names with a prefix is O(log n + page), searching for
+    names containing some text has to look at every name (of the type). """
+
+    def __init__(self):
+        self._all = SortedNames()
+        self._by_type = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._all)
+
+    def add(self, name, robot_type):
+        self.add_many([name], robot_type)
+
+    def add_many(self, names, robot_type):
+        """ Adds a batch of names of one type, taking the lock once (they are merged in with a single sort, see
+        SortedNames). """
+
+        key = robot_type.upper()
+        with self._lock:
+            self._all.add_many(names)
+            type_names = self._by_type.get(key)
+            if type_names is None:
+                type_names = self._by_type[key] = SortedNames()
+            type_names.add_many(names)
+
+    def remove(self, name, robot_type):
+        with self._lock:
+            self._all.remove(name)
+            self._by_type[robot_type.upper()].remove(name)
+
+    def remove_many(self, names):
+        """ Removes a set of names from every list of names (which is cheaper than looking up the type of each of
+        them), see SortedNames.remove_many. """
+
+        with self._lock:
+            for sorted_names in [self._all] + list(self._by_type.values()):
+                sorted_names.remove_many(names)
+
+    def clear(self):
+        with self._lock:
+            self._all = SortedNames()
+            self._by_type = {}
+
+    def _names(self, robot_type):
+        if robot_type is None:
+            return self._all
+        return self._by_type.get(robot_type.upper()) or SortedNames()
+
+    def names(self, robot_type=None):
+        """ Iterator over every name (of a type) in sorted order, names added or removed meanwhile do not affect it. """
+
+        with self._lock:
+            return iter(self._names(robot_type))
+
+    def count(self, robot_type=None, prefix=''):
+        """ Number of names (of a type) starting with prefix. """
+
+        with self._lock:
+            start, end = self._names(robot_type).prefix_range(prefix)
+            return end - start
+
+    def page(self, page=0, per_page=20, robot_type=None, prefix='', contains=None):
+        """ (names on the page, total number of matching names) of the names (of a type) starting with prefix, in
+        sorted order. With contains only names that also contain that text match, which takes a scan of the names
+        starting with prefix (there is no way around looking at every name for a substring). """
+
+        with self._lock:
+            sorted_names = self._names(robot_type)
+            start, end = sorted_names.prefix_range(prefix)
+
+            first = page * per_page
+            if contains is None:
+                return list(sorted_names.islice(start + first, min(start + first + per_page, end))), end - start
+
+            matches = [name for name in sorted_names.islice(start, end) if contains in name]
+            return matches[first:first + per_page], len(matches)
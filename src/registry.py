@@ -0,0 +1,284 @@
+import pickle
+import threading
+from collections import namedtuple
+
+from name_index import NameIndex
+
+try:
+    from collections.abc import MutableMapping
+except ImportError: # Python 2
+    from collections import MutableMapping
+
+
+# Where a robot that has not been loaded yet lives in the snapshot file, along with what can be shown without loading it
+SavedRobot = namedtuple('SavedRobot', ['robot_type', 'offset', 'length', 'completed_count', 'queued_count'])
+SavedRobot.__new__.__defaults__ = (0,) # <- Snapshots written before queued tasks were counted
+
+
+class RobotRegistry(MutableMapping):
+    """ Dict-like container of robots (robot name -> robot) that loads saved robots lazily.
+
+    Right after a load only the small snapshot index is in memory, a robot (with its whole task history) is
+    unpickled from the snapshot file the first time it is looked up. Names, types and completed task counts are
+    available for every robot without loading it. """
+
+    def __init__(self):
+        self._robots = {} # <- Robot name mapped to either the Robot itself or its SavedRobot entry
+        self.names = NameIndex() # <- Sorted robot names, overall and per type, for searches and pages
+        self._pending_tasks = {} # <- Tasks finished (according to the log) by robots that are not loaded yet
+        self._snapshot_index = {} # <- Where every robot in the current snapshot lives in it, loaded or not
+        self._dirty = set() # <- Names of robots that changed since the snapshot was written
+        self._snapshot_fn = None
+        self._snapshot_file = None
+        self._lock = threading.RLock()
+
+    ### Mapping interface
+
+    def __getitem__(self, name):
+        robot = self.peek(name)
+        self.mark_dirty(name) # <- Whoever looked it up may change its queue
+        return robot
+
+    def __setitem__(self, name, robot):
+        # All in one go, a capture in between would list the robot without a copy of it (or an entry in the snapshot)
+        with self._lock:
+            if name in self._robots:
+                self._unindex(name)
+            self._robots[name] = robot
+            self._pending_tasks.pop(name, None)
+            self._index(name, robot.robot_type)
+            self._dirty.add(name)
+
+    def add_many(self, robots):
+        """ Adds a batch of robots (replacing any of the same name) in one go, under a single lock and with a single
+        name index update per robot type. """
+
+        robots = dict((robot.name, robot) for robot in robots) # <- The last one wins when a name comes up twice
+        with self._lock:
+            by_type = {}
+            for name, robot in robots.items():
+                if name in self._robots:
+                    self._unindex(name)
+                self._robots[name] = robot
+                by_type.setdefault(robot.robot_type, []).append(name)
+
+            for robot_type, names in by_type.items():
+                self.names.add_many(names, robot_type)
+                self._dirty.update(names)
+                if self._pending_tasks:
+                    for name in names:
+                        self._pending_tasks.pop(name, None)
+
+    def __delitem__(self, name):
+        with self._lock:
+            self._unindex(name)
+            del self._robots[name]
+            self._pending_tasks.pop(name, None)
+            self._snapshot_index.pop(name, None)
+            self._dirty.discard(name)
+
+    def peek(self, name):
+        """ Looks a robot up (loading it if needed) without flagging it as changed, for lookups that only read it, so
+        the next snapshot copies its saved bytes instead of pickling it again. Raises KeyError for an unknown robot. """
+
+        robot = self._robots[name]
+        if isinstance(robot, SavedRobot):
+            robot = self._materialize(name, robot)
+        return robot
+
+    def __iter__(self):
+        return iter(self._robots)
+
+    def __len__(self):
+        return len(self._robots)
+
+    def __contains__(self, name):
+        return name in self._robots
+
+    def remove_many(self, names):
+        """ Deletes many robots at once, unknown names are skipped. Returns the names that were deleted. """
+
+        with self._lock:
+            robots = self._robots
+            gone = [name for name in dict.fromkeys(names) if name in robots] # <- In the order given, without repeats
+            if not gone:
+                return []
+
+            self.names.remove_many(set(gone))
+            for name in gone:
+                del robots[name]
+                self._pending_tasks.pop(name, None)
+                self._snapshot_index.pop(name, None)
+                self._dirty.discard(name)
+
+            if len(gone) > len(robots):
+                # Dicts never shrink on their own, copying the survivors gives the memory of the gone robots' slots back
+                self._robots = dict(robots)
+                self._snapshot_index = dict(self._snapshot_index)
+            return gone
+
+    def clear(self):
+        """ Drops every robot at once instead of deleting them one by one. """
+
+        with self._lock:
+            self._close_snapshot()
+            self._robots = {}
+            self.names.clear()
+            self._pending_tasks = {}
+            self._snapshot_index = {}
+            self._dirty = set()
+
+    ### Type index
+
+    def names_of_type(self, robot_type):
+        """ Iterator over the sorted names of every robot of a type (ROBOT_TYPES key or class name), without loading
+        (or copying) any of them. """
+        return self.names.names(robot_type)
+
+    def count_of_type(self, robot_type):
+        return self.names.count(robot_type)
+
+    def _index(self, name, robot_type):
+        self.names.add(name, robot_type)
+
+    def _unindex(self, name):
+        self.names.remove(name, self._robots[name].robot_type)
+
+    ### Lazy loading
+
+    def is_loaded(self, name):
+        return not isinstance(self._robots[name], SavedRobot)
+
+    @property
+    def loaded_count(self):
+        """ Number of robots currently deserialized into memory. """
+        return sum(1 for robot in self._robots.values() if not isinstance(robot, SavedRobot))
+
+    def loaded_robots(self):
+        """ List of every robot currently in memory, looked up without flagging them as changed. """
+        return [robot for robot in list(self._robots.values()) if not isinstance(robot, SavedRobot)]
+
+    def robot_type(self, name):
+        """ Type (class name) of a robot, without loading it. """
+
+        return self._robots[name].robot_type # <- Both Robot and SavedRobot have a robot_type
+
+    def completed_count(self, name):
+        """ Number of tasks completed by a robot, without loading it. """
+
+        robot = self._robots[name]
+        if isinstance(robot, SavedRobot):
+            return robot.completed_count
+        return len(robot.tasks_completed)
+
+    def describe(self, name):
+        """ Same text as str(robot), without loading it. """
+        return '{0} the {1} robot'.format(name, self.robot_type(name))
+
+    def attach_snapshot(self, snapshot_fn, index):
+        """ Registers every robot in a snapshot index (robot name -> SavedRobot) without loading any of them. """
+
+        with self._lock:
+            self._close_snapshot()
+            self._snapshot_fn = snapshot_fn
+            for name, entry in index.items():
+                if name in self._robots:
+                    self._unindex(name)
+                self._robots[name] = self._snapshot_index[name] = SavedRobot(*entry)
+                self._index(name, entry[0])
+
+    def add_finished_task(self, name, task):
+        """ Records a task finished by a robot, unloaded robots keep it aside until they are loaded. """
+
+        with self._lock:
+            robot = self._robots[name]
+            if isinstance(robot, SavedRobot):
+                self._robots[name] = robot._replace(completed_count=robot.completed_count + 1)
+                self._pending_tasks.setdefault(name, []).append(task)
+            else:
+                robot.tasks_completed.append(task)
+            self._dirty.add(name)
+
+    ### Queued work
+
+    def names_with_queued_work(self):
+        """ Names of every robot with tasks waiting in its queue, loaded or not (see SavedRobot.queued_count). """
+
+        with self._lock:
+            return [name for name, robot in self._robots.items()
+                    if (robot.queued_count if isinstance(robot, SavedRobot) else robot.tasks_to_perform)]
+
+    def changed_queues(self):
+        """ List of (name, copy of its queue) for every changed robot whose queue may differ from the snapshot, i.e. it
+        has tasks queued or had some when the snapshot was written. Robots must not be working while this runs. """
+
+        with self._lock:
+            changed = []
+            for name in self._dirty:
+                robot = self._robots.get(name)
+                if robot is None or isinstance(robot, SavedRobot):
+                    continue
+                saved = self._snapshot_index.get(name)
+                if robot.tasks_to_perform or (saved is not None and saved.queued_count):
+                    changed.append((name, robot.tasks_to_perform.copy()))
+            return changed
+
+    ### Snapshots
+
+    def mark_dirty(self, name):
+        """ Flags a robot as changed, so the next snapshot pickles it again instead of copying its saved bytes.
+        Robots are flagged whenever they are looked up (see peek), this is for changes made through other references. """
+
+        with self._lock: # <- capture swaps the set out from under other threads otherwise
+            self._dirty.add(name)
+
+    def capture(self):
+        """ What a new snapshot needs, taken in one go: (names, name -> copy of every robot that changed since the
+        last snapshot, snapshot index of every other robot). Robots must not be working while this runs. """
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            copies = {}
+            for name in dirty:
+                robot = self._robots.get(name)
+                if isinstance(robot, SavedRobot):
+                    robot = self._materialize(name, robot) # <- Finished tasks were kept aside for it
+                if robot is not None:
+                    copies[name] = robot.snapshot_copy()
+            return list(self._robots), copies, dict(self._snapshot_index)
+
+    def moved_snapshot(self, snapshot_fn, index):
+        """ Points robots at their entries in a freshly written snapshot, robots that are still unloaded included. """
+
+        with self._lock:
+            self._close_snapshot()
+            self._snapshot_fn = snapshot_fn
+            self._snapshot_index = {}
+            for name, entry in index.items():
+                if name not in self._robots:
+                    continue # <- Destroyed while the snapshot was written
+                self._snapshot_index[name] = entry = SavedRobot(*entry)
+                if isinstance(self._robots[name], SavedRobot):
+                    self._robots[name] = entry
+
+    def _materialize(self, name, entry):
+        with self._lock:
+            entry = self._robots[name]
+            if not isinstance(entry, SavedRobot):
+                return entry # <- Another thread loaded it in the meantime
+
+            robot = pickle.loads(self._read(entry))
+            robot.tasks_completed.extend(self._pending_tasks.pop(name, []))
+            self._robots[name] = robot
+            return robot
+
+    def _read(self, entry):
+        if self._snapshot_file is None:
+            self._snapshot_file = open(self._snapshot_fn, 'rb')
+        self._snapshot_file.seek(entry.offset)
+        return self._snapshot_file.read(entry.length)
+
+    def _close_snapshot(self):
+        if self._snapshot_file is not None:
+            self._snapshot_file.close()
+            self._snapshot_file = None
@@ -0,0 +1,299 @@
+"""
+Recorded sessions and their replay: an EventLog writes every task assigned to a robot and every task completed (in a
+simulation or the interactive factory) and a Replay runs the recorded assignments again on the simulation's virtual
+clock, as fast as it can, so scheduling or storage changes can be compared on the exact same workload.
+
+Example (record a seeded simulation, then replay it):
+    python3 src/simulation.py --all 100 --duration 3600 --seed 7 --record session.log
+    python3 src/replay.py session.log
+"""
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import heapq
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import robots
+from robots import Robot, ROBOT_TYPES
+from simulation import Simulation, print_report
+
+LOG_FORMAT = 1 # <- Version of the event log, written in its header line
+
+
+class EventLog(object):
+    """ Appends the workload of a session to a JSON lines file: a header (seed, clock and whatever else is passed as
+    info) followed by an event per line, either ["assign", time, robot, TYPE, tasks, priority] or
+    ["complete", time, robot, task]. Times are seconds since the log was started, on the clock it was started with,
+    divided by time_scale so a factory whose executor runs at a time_scale is logged in task seconds. """
+
+    def __init__(self, path, time_scale=1.0, **info):
+        self.path = path
+        self.time_scale = time_scale or 1.0 # <- Tasks that finish instantly (time_scale 0) are logged as they happen
+        self.info = info
+        self.events = 0
+
+        self._file = None
+        self._clock = None
+        self._start = 0.0
+        self._lock = threading.Lock() # <- The factory's robots log from the executor's thread, the console from its own
+
+    def start(self, clock=time.time):
+        """ Starts logging every assignment and completion of any robot, timed by clock. """
+
+        streams = robots.task_streams
+        header = OrderedDict([('event_log', LOG_FORMAT), ('seed', streams.seed if streams is not None else None),
+                              ('clock', 'wall' if clock is time.time else 'simulated'), ('time_scale', self.time_scale)])
+        header.update(self.info)
+
+        self._file = open(self.path, 'w')
+        self._file.write(json.dumps(header) + '\n')
+        self._clock = clock
+        self._start = clock()
+        Robot.assign_listeners.append(self.assigned)
+        Robot.task_listeners.append(self.completed)
+        return self
+
+    def stop(self):
+        """ Stops logging and closes the file. """
+
+        if self._file is None:
+            return
+        Robot.assign_listeners.remove(self.assigned)
+        Robot.task_listeners.remove(self.completed)
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.start() if self._file is None else self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    def assigned(self, robot, tasks, priority):
+        self._write(['assign', self._now(), robot.name, robot.robot_type.upper(), tasks, priority])
+
+    def completed(self, robot, task):
+        self._write(['complete', self._now(), robot.name, task])
+
+    def _now(self):
+        elapsed = self._clock() - self._start
+        return elapsed if self.time_scale == 1.0 else elapsed / self.time_scale
+
+    def _write(self, event):
+        line = json.dumps(event) + '\n'
+        with self._lock:
+            if self._file is not None: # <- Stopped meanwhile by another thread
+                self._file.write(line)
+                self.events += 1
+
+
+class SessionLog(object):
+    """ A recorded session read back from an EventLog file: its header, every assignment in order and a digest of its
+    completions (see completion_line) to check a replay against. """
+
+    def __init__(self, header, assignments, completed, digest, duration):
+        self.header = header
+        self.assignments = assignments # <- (time, robot name, TYPE, tasks, priority) in the order they happened
+        self.completed = completed
+        self.digest = digest
+        self.duration = duration # <- Seconds from the start of the log to its last event
+
+    @classmethod
+    def read(cls, path):
+        with open(path) as log_file:
+            header = json.loads(next(log_file))
+            if header.get('event_log') != LOG_FORMAT:
+                raise ValueError('Not an event log (or written by another version): {0}'.format(path))
+
+            assignments = []
+            digest = hashlib.sha1()
+            completed = 0
+            last = 0.0
+            for line in log_file:
+                event = json.loads(line)
+                last = max(last, event[1])
+                if event[0] == 'assign':
+                    assignments.append(tuple(event[1:]))
+                else:
+                    digest.update(completion_line(event[1], event[2], event[3]))
+                    completed += 1
+
+        # Robots of the factory log from two threads, a completion can land slightly ahead of an earlier assignment
+        assignments.sort(key=lambda assignment: assignment[0])
+        return cls(header, assignments, completed, digest.hexdigest(), header.get('duration') or last)
+
+    def scenario(self):
+        """ Number of robots of each type that were given work, in the order they first were. """
+
+        types = OrderedDict()
+        for _, name, robot_type, _, _ in self.assignments:
+            types.setdefault(name, robot_type)
+
+        scenario = OrderedDict()
+        for robot_type in types.values():
+            scenario[robot_type] = scenario.get(robot_type, 0) + 1
+        return scenario
+
+
+def completion_line(when, name, task):
+    """ A completion as it goes into a digest, repr keeps times exact so identical runs give identical digests. """
+    return '{0!r}\t{1}\t{2}\n'.format(float(when), name, task).encode()
+
+
+class Replay(Simulation):
+    """ Runs a recorded session again on a virtual clock: every robot is given exactly the tasks it was given in the
+    recording, at the (relative) time it was given them, and works through them with today's scheduling. No random
+    tasks are drawn, robots sit idle until their next recorded assignment.
+
+    Upgrades and the duration default to the ones recorded, kwargs override them (and are passed on to Simulation).
+    Replaying a simulation with the code it was recorded with completes the very same tasks at the very same times
+    (see the 'matches_recording' of the report). """
+
+    def __init__(self, path, **kwargs):
+        self.log = SessionLog.read(path)
+        header = self.log.header
+
+        options = dict(duration=self.log.duration, refill=header.get('refill', True),
+                       upgrade_every=header.get('upgrade_every'), upgrade_bays=header.get('upgrade_bays'))
+        options.update(kwargs)
+        super(Replay, self).__init__(self.log.scenario(), **options)
+
+    def populate(self):
+        """ Creates every robot of the recording, without any tasks until they are assigned. """
+
+        for _, name, robot_type, _, _ in self.log.assignments:
+            if name not in self.robots:
+                self.robots[name] = ROBOT_TYPES[robot_type](name, num_tasks=0)
+        return self.robots
+
+    def _next_task(self, robot):
+        """ Pops the next queue entry of a robot, recorded assignments are the only way its queue is refilled. """
+        return robot.tasks_to_perform.pop_entry() if robot.tasks_to_perform else None
+
+    def run(self, top=10):
+        """ Replays the recorded assignments until the duration is reached (or every robot is done) and returns a
+        report, along with how it compares to the recording. """
+
+        if not self.robots:
+            self.populate()
+
+        started = time.time()
+        start_time = self.clock.now
+        end_time = start_time + self.duration
+        assignments = self.log.assignments
+        digest = hashlib.sha1()
+
+        seqs = dict((name, seq) for seq, name in enumerate(self.robots))
+        working = set() # <- Names of the robots with a task in progress (in events)
+        events = [] # <- Heap of (finish time, tie breaker, robot, queue entry), as in Simulation.run
+        next_assignment = 0
+        next_upgrade = start_time + self.upgrade_every if self.upgrade_every else None
+
+        while True:
+            assign_time = start_time + assignments[next_assignment][0] if next_assignment < len(assignments) else None
+            finish_time = events[0][0] if events else None
+            # Completions go before assignments made at the same time, robots finish a task before they are given more
+            finishing = finish_time is not None and (assign_time is None or finish_time <= assign_time)
+            if finishing:
+                when = finish_time
+            elif assign_time is not None:
+                when = assign_time
+            else:
+                break
+            if when > end_time:
+                break
+
+            if next_upgrade is not None and when >= next_upgrade:
+                self.clock.advance_to(next_upgrade)
+                self._upgrade_robots()
+                next_upgrade += self.upgrade_every
+            self.clock.advance_to(when)
+
+            if finishing:
+                _, seq, robot, (task, eta, _, _, _) = events[0]
+                robot.save_finished_task(task)
+                self.completed += 1
+                digest.update(completion_line(when - start_time, robot.name, task))
+                if self.analytics is not None:
+                    self.analytics.record(robot, task, when - robot.task_duration(eta), when, eta)
+
+                entry = self._next_task(robot)
+                if entry is None:
+                    heapq.heappop(events)
+                    working.discard(robot.name)
+                else:
+                    heapq.heapreplace(events, (self._finish_time(robot, when, entry[1]), seq, robot, entry))
+                continue
+
+            _, name, _, tasks, priority = assignments[next_assignment]
+            next_assignment += 1
+            robot = self.robots[name]
+            robot.tasks_to_perform.extend([(task, robot.task_eta(task)) for task in tasks], priority, robot.task_version)
+            if name not in working:
+                working.add(name)
+                entry = self._next_task(robot)
+                heapq.heappush(events, (self._finish_time(robot, when, entry[1]), seqs[name], robot, entry))
+
+        # Whatever is still in progress at the end goes back to the front of its robot's queue
+        for _, _, robot, (task, eta, version, priority, deadline) in events:
+            robot.tasks_to_perform.requeue(task, eta, priority, version, deadline)
+
+        if events or next_assignment < len(assignments):
+            self.clock.advance_to(end_time)
+
+        report = self.report(time.time() - started, top)
+        report['recorded_seed'] = self.log.header.get('seed')
+        report['recorded_tasks_completed'] = self.log.completed
+        report['matches_recording'] = digest.hexdigest() == self.log.digest
+        return report
+
+
+def print_replay_report(report):
+    """ Prints a replay report like a simulation report, followed by how it compares to the recording. """
+
+    print_report(report)
+    print("\n*** Compared to the recording (seed {0}) ***\n".format(report['recorded_seed']))
+    print("Tasks completed:           {0} (recorded {1})".format(report['tasks_completed'], report['recorded_tasks_completed']))
+    print("Same completions:          {0}".format('yes' if report['matches_recording'] else 'no'))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a recorded session (see EventLog) on a virtual clock.')
+    parser.add_argument('log', help='event log written by simulation.py --record or main.py --record')
+    parser.add_argument('--duration', type=float, help='simulated seconds to run for (default: as recorded)')
+    parser.add_argument('--upgrade-every', type=float, help='simulated seconds between rounds of upgrades (default: as recorded)')
+    parser.add_argument('--bays', type=int, help='most robots upgraded in one round (default: as recorded)')
+    parser.add_argument('--no-upgrades', action='store_true', help='replay without upgrading any robot')
+    parser.add_argument('--top', type=int, default=10, help='number of robots to show on the leaderboard')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    options = {}
+    if args.duration is not None:
+        options['duration'] = args.duration
+    if args.upgrade_every is not None:
+        options['upgrade_every'] = args.upgrade_every
+    if args.bays is not None:
+        options['upgrade_bays'] = args.bays
+    if args.no_upgrades:
+        options['upgrade_every'] = None
+
+    report = Replay(args.log, **options).run(top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_replay_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,22 @@ from __future__ import print_function
 from builtins import input
 
 from collections import OrderedDict
-from robots import ROBOT_TYPES, ROBOT_TYPE_CHOICES
+from time import perf_counter, time
+
+import metrics
+import tasks
+import upgrades
+from handlers import PoolFull
+from dispatcher import Dispatcher
+from executor import default_executor
+from leaderboard import Leaderboard
+from registry import RobotRegistry
+from robots import Robot, ROBOT_TYPES, ROBOT_TYPE_CHOICES, use_task_table
+from storage import Autosaver, RobotStore
 from utils import (
-    save_to_pickle,
-    load_from_pickle,
     get_user_choice,
+    get_paged_choice,
+    gc_paused,
     clear_console,
     press_enter_to_continue
 )
@@ -15,80 +26,553 @@ from utils import (
 class RobotFactory(object):
     """ Functions as a factory, container, and context manager within which the user can create, destroy, and interact with robots. """
 
-    robots = {} # <- Primary container for all created robots
+    robots = RobotRegistry() # <- Primary container for all created robots, saved robots are loaded on first access
+    leaderboard = Leaderboard() # <- Robots ranked by tasks completed, updated as tasks finish
+    executor = default_executor # <- Runs every robot's tasks concurrently on one event loop
+    dispatcher = Dispatcher(ROBOT_TYPES) # <- Knows which robot types can do which tasks
 
-    @property
-    def robot_name_choices(self):
-        """ Generates a quick enumerated 'map' of the existing robots, easier for user to make choices with number selection. """
+    def __init__(self, save_path='robot_save'):
+        """ save_path is the base name of the save files (robot_save.snapshot and robot_save.wal). """
 
-        # Enumeration starts at 1 and the 0: Leave option is tacked on at the end
-        robot_choices = OrderedDict([(str(n+1), bot) for n, bot in enumerate(self.robots.keys())] + [('0', 'Leave')])
-        return robot_choices
+        self.store = RobotStore(save_path)
+        self.autosaver = None
+        self.analytics = None # <- AnalyticsStore of every task completion, see open
+        self.analytics_path = save_path + '.analytics'
+        self.tasks_dropped = {'cancelled': 0, 'expired': 0, 'failed': 0} # <- Tasks given up on since the factory was opened
+
+    def choose_robot(self, message):
+        """ Lets the user pick a robot a page at a time, searching by name and type (see parse_robot_search).
+        Returns the chosen robot's name or None. """
+
+        def find(search, page, per_page):
+            robot_type, prefix, contains = parse_robot_search(search)
+            return self.find_robots(prefix, robot_type, contains, page, per_page)
+
+        print('Robots are listed by name, search with /Ro for names starting with Ro, /*bot for names containing bot')
+        print('and /bipedal: for bipedal robots only (or combined, /bipedal:Ro)\n')
+        return get_paged_choice(find, message)
 
     def __enter__(self):
         """ Load previous bots and run intro text when starting. """
 
-        self._load()
+        self.open()
 
         print("Welcome to the robot factory! You can create a robot to perform various tasks! And if one robot is not enough, you can create more!")
-        print("Once created, robots are automatically assigned 5 random tasks which they will complete right away.")
-        print("After they have finished their tasks you can decide to either create a new robot, destroy a robot (or all of them), or assign new tasks to existing robots.")
+        print("Once created, robots are automatically assigned 5 random tasks which they will start working on right away.")
+        print("Robots work in the background so you can create more robots, destroy a robot (or all of them), or assign new tasks to existing robots while they are busy.")
         press_enter_to_continue()
         clear_console()
         return self
 
     def __exit__(self, type, value, traceback):
-        """ Makes sure to save when exiting! """
+        """ Makes sure to stop working robots and save when exiting! """
+
+        self.close()
+
+    def open(self, autosave=True, analytics=True, resume=True):
+        """ Loads the previous robots without any console interaction, for scripted (headless) use of the factory.
+        With autosave the log is flushed every second and compacted in the background while robots work.
+        With analytics (and NumPy installed) every completion is also recorded in robot_save.analytics.
+        With resume robots that were saved with tasks left (including the ones they were in the middle of) carry on. """
+
+        if analytics:
+            self.analytics = open_analytics(self.analytics_path)
+        self._load()
+        queued = self.robots.names_with_queued_work()
+        # Handler tasks already queued (loaded or left over) are counted against the handler pool's backlog from now on
+        self.executor.handler_pool.recount(self.robots.peek(name) for name in queued)
+        if resume:
+            self.executor.schedule_many(self.robots[name] for name in queued)
+        self.executor.mark_idle(self.robots.keys()) # <- Robots that were not just scheduled are idle from now on (see retire_robots)
+        if autosave:
+            # Copies of changed robots are taken on the executor's thread, between the steps of working robots
+            self.autosaver = Autosaver(self.store, self.robots, self.executor.call_sync)
+            self.autosaver.start()
+        return self
 
+    def close(self):
+        """ Stops working robots and saves, the headless counterpart of leaving the factory. Tasks robots were in the
+        middle of are put back in their queues and every queue that changed is logged, so work resumes on the next open. """
+
+        if self.autosaver is not None:
+            self.autosaver.stop()
+            self.autosaver = None
+        self.executor.stop()
+        self.store.record_queues(self.robots.changed_queues())
         self._save()
+        if self.analytics is not None:
+            self.analytics.close()
+            self.analytics = None
 
     def _load(self):
-        """ Load previous robot objects, currently using pickle. """
+        """ Load previous robot objects from the snapshot and log, then start logging every finished task. """
 
+        started = perf_counter()
         try:
-            robot_list = load_from_pickle()
+            # Fills the registry in place in case loading somehow happens after some bots are already created
+            self.store.load(self.robots, ROBOT_TYPES)
         except IOError:
             pass # Just pass, self.robots need not be modified
-        else:
-            # Update instead of assignmet in case loading somehow happens after some bots are already created
-            self.robots.update({bot.name: bot for bot in robot_list})
+
+        # Rank every robot once, from then on the leaderboard is kept up to date as robots work
+        self.leaderboard.rebuild([(name, self.robots.completed_count(name)) for name in self.robots.keys()])
+
+        if self._task_finished not in Robot.task_listeners:
+            Robot.task_listeners.append(self._task_finished)
+        if self._task_dropped not in Robot.drop_listeners:
+            Robot.drop_listeners.append(self._task_dropped)
+
+        if metrics.ENABLED:
+            metrics.LOAD_DURATION.observe(perf_counter() - started)
 
     def _save(self):
-        """ Save all robot objects, using pickle. """ ### XXX better just save the factory itself instead?
+        """ Save everything that happened since the last save, the store compacts its log into a snapshot when needed. """
+
+        started = perf_counter()
+        self.store.save(self.robots)
+        if metrics.ENABLED:
+            metrics.saved(perf_counter() - started, [self.store.snapshot_fn, self.store.wal_fn])
+
+        if self._task_finished in Robot.task_listeners:
+            Robot.task_listeners.remove(self._task_finished)
+        if self._task_dropped in Robot.drop_listeners:
+            Robot.drop_listeners.remove(self._task_dropped)
+
+    def _task_finished(self, robot, task):
+        """ Runs every time any robot finishes a task (see Robot.task_listeners). """
+
+        self.store.record_task(robot, task)
+        self.robots.mark_dirty(robot.name)
+        self.leaderboard.increment(robot.name)
+
+        if self.analytics is not None:
+            # Tasks finished without being performed (e.g. in benchmarks) get their nominal duration
+            eta = robot.current_eta if robot.current_eta is not None else robot.task_eta(task)
+            started = robot.task_started if robot.task_started is not None else time() - eta
+            try:
+                self.analytics.record(robot, task, started, eta=eta) # <- Ends now, stamped in the order they are recorded
+            except ValueError:
+                pass # <- The clock was set back past the latest completion, this one has no place in the history
+
+    def _task_dropped(self, robot, task, reason):
+        """ Runs every time a task is cancelled or misses its deadline (see Robot.drop_listeners). """
+
+        self.tasks_dropped[reason] += 1
+        self.robots.mark_dirty(robot.name)
+
+    def add_robot(self, robot_name, robot_type, num_tasks=5):
+        """ Creates a robot of a ROBOT_TYPES type, it starts working on num_tasks random tasks right away.
+        Raises ValueError if the name is empty or taken and KeyError for an unknown robot type. """
+
+        if not robot_name or robot_name in self.robots:
+            raise ValueError('The name "{0}" is not valid or is already taken'.format(robot_name))
+
+        robot = ROBOT_TYPES[robot_type.upper()](robot_name, num_tasks) # <- instantiate on the fly
+
+        # Store new robots in class-level dict and start working on their initial tasks in the background
+        self.robots[robot_name] = robot
+        self.leaderboard.add(robot_name)
+        self.store.record_create(robot)
+        self.executor.handler_pool.track([robot])
+        self.executor.schedule(robot)
+        return robot
+
+    def create_robots(self, robot_type, names_or_count, tasks_per_robot=5, start=True):
+        """ Creates many robots of a ROBOT_TYPES type at once and returns them. names_or_count is either a list of names
+        or a number of robots to name after their type (e.g. BIPEDAL-1). Initial tasks are sampled for the whole batch
+        in one go, robots only start working on them once they are all created (or not at all without start, they then
+        wait for their first queue_task). Raises ValueError if any name is empty, taken or repeated (no robot is
+        created then) and KeyError for an unknown robot type. """
+
+        robot_class = ROBOT_TYPES[robot_type.upper()]
+
+        if isinstance(names_or_count, int):
+            names = self._free_names(robot_type.upper(), names_or_count)
+        else:
+            names = list(names_or_count)
+            invalid = [name for name in names if not name or name in self.robots]
+            if invalid or len(set(names)) != len(names):
+                raise ValueError('The names {0} are not valid, already taken or repeated'.format(invalid or 'given'))
+
+        with gc_paused():
+            robots = robot_class.create_many(names, tasks_per_robot)
+            self.robots.add_many(robots)
+            self.store.record_create_many(robots)
+            self.leaderboard.add_many(names)
+        self.executor.handler_pool.track(robots)
+
+        if start:
+            self.executor.schedule_many(robots)
+        else:
+            self.executor.mark_idle(names)
+        return robots
+
+    def _free_names(self, prefix, count):
+        """ count names of the form PREFIX-N that are not taken yet, counting up from 1. """
+
+        if not self.robots.names.count(prefix=prefix + '-'):
+            return ['{0}-{1}'.format(prefix, n) for n in range(1, count + 1)] # <- None taken, no need to check each
+
+        names, n = [], 0
+        while len(names) < count:
+            n += 1
+            name = '{0}-{1}'.format(prefix, n)
+            if name not in self.robots:
+                names.append(name)
+        return names
+
+    def remove_robot(self, robot_name):
+        """ Destroys a robot, stopping whatever it was working on. Raises KeyError if there is no such robot. """
+
+        if robot_name not in self.robots:
+            raise KeyError(robot_name)
+
+        self.executor.cancel(robot_name, self.robots.peek(robot_name) if self.robots.is_loaded(robot_name) else None)
+        del self.robots[robot_name]
+        self.leaderboard.remove(robot_name)
+        self.store.record_destroy(robot_name)
+
+    def retire_robots(self, robot_type=None, max_completed=None, idle_for=None):
+        """ Destroys every robot of a ROBOT_TYPES type (None for any) with at most max_completed completed tasks that has
+        had no work for at least idle_for seconds, conditions left as None are not checked (at least one is needed,
+        see remove_all_robots). Returns the names of the destroyed robots. Raises KeyError for an unknown robot type.
+
+        Nothing is scanned or loaded: the candidates are whichever is shortest of the type's names, the tail of the
+        leaderboard and the executor's robots idle for long enough, the other conditions are dict lookups, and the
+        whole batch is logged as a single record. """
+
+        if robot_type is None and max_completed is None and idle_for is None:
+            raise ValueError('Give at least one condition, remove_all_robots destroys every robot')
+        if robot_type is not None and robot_type.upper() not in ROBOT_TYPES:
+            raise KeyError('Unknown robot type: {0}'.format(robot_type))
+
+        cutoff = None if idle_for is None else time() - idle_for
+        idle_since = self.executor.idle_since
+
+        # (number of candidates, candidate names, check of a single name) of every condition given
+        conditions = []
+        if robot_type is not None:
+            conditions.append((self.robots.count_of_type(robot_type), lambda: self.robots.names_of_type(robot_type),
+                               lambda name: self.robots.robot_type(name).upper() == robot_type.upper()))
+        if max_completed is not None:
+            candidates = self.leaderboard.names_at_most(max_completed)
+            conditions.append((len(candidates), lambda: candidates,
+                               lambda name: self.leaderboard.count(name) <= max_completed))
+        if idle_for is not None:
+            idle = self.executor.idle_robots(idle_for)
+            conditions.append((len(idle), lambda: idle,
+                               lambda name: idle_since(name) is not None and idle_since(name) <= cutoff))
+
+        conditions.sort(key=lambda condition: condition[0])
+        names = conditions[0][1]() # <- Only the shortest candidates are listed (the type's names are iterated, not copied)
+        for _, _, check in conditions[1:]:
+            names = [name for name in names if check(name)]
+
+        return self.remove_robots(names)
+
+    def remove_robots(self, robot_names):
+        """ Destroys many robots at once (unknown names are skipped), each index is updated in one pass and a single
+        record is logged. Returns the names of the destroyed robots. """
+
+        robot_names = [name for name in robot_names if name in self.robots]
+        self.executor.cancel_many(robot_names, [self.robots.peek(name) for name in robot_names if self.robots.is_loaded(name)])
+        robot_names = self.robots.remove_many(robot_names)
+        if robot_names:
+            self.leaderboard.remove_many(robot_names)
+            self.store.record_destroy_many(robot_names)
+        return robot_names
+
+    def remove_all_robots(self):
+        """ Destroys every robot. The registry, name index and leaderboard are swapped for empty ones instead of being
+        emptied robot by robot and a single record is logged, whatever the number of robots. Returns how many there were. """
+
+        count = len(self.robots)
+        self.executor.cancel_all()
+        self.robots.clear() # <- Clear the class-level registry in place, it is what gets saved
+        self.leaderboard.clear()
+        self.store.record_destroy_all()
+        return count
+
+    def queue_task(self, robot_name, task, count=1, priority=0, timeout=None):
+        """ Queues a task (count times) for a specific robot. Raises KeyError for an unknown robot or task.
+        Higher priority tasks interrupt the one in progress, tasks not done within timeout seconds are dropped. """
+
+        robot = self.robots[robot_name]
+        if task not in robot.all_tasks:
+            raise KeyError('{0} can not {1}'.format(robot, task))
+        self.executor.handler_pool.admit(task, count)
+        self.executor.enqueue(robot, task, count, priority, deadline(timeout))
+
+    def cancel_task(self, robot_name, clear_queue=False):
+        """ Stops the task a robot is working on (within a second, it is not counted as completed) and, with
+        clear_queue, everything it has queued. Returns the cancelled task, None if the robot was idle. """
+
+        robot = self.robots[robot_name]
+        return self.executor.call_sync(robot.cancel_task, clear_queue, self.executor)
+
+    def robot_info(self, robot_name):
+        """ Dict describing a robot: its type, status, queue length and completed task count. """
+
+        robot = self.robots.peek(robot_name)
+        return {
+            'name': robot.name,
+            'robot_type': robot.robot_type,
+            'status': robot.status,
+            'queued_tasks': len(robot.tasks_to_perform),
+            'queued_eta': robot.queued_eta,
+            'tasks_completed': len(robot.tasks_completed),
+            'rank': self.leaderboard.rank(robot_name),
+            'upgrade_level': upgrades.target_level(robot),
+            'upgrade_points': upgrades.points(robot),
+        }
+
+    def find_robots(self, prefix='', robot_type=None, contains=None, page=0, per_page=20):
+        """ (robot names on the page, total number of matching robots) of the robots whose name starts with prefix
+        (and contains contains) of a ROBOT_TYPES type (None for any), sorted by name. O(log n + page) without contains,
+        contains has to look at every robot matching the rest. """
+
+        if robot_type is not None and robot_type.upper() not in ROBOT_TYPES:
+            raise KeyError('Unknown robot type: {0}'.format(robot_type))
+        return self.robots.names.page(page, per_page, robot_type, prefix, contains or None)
+
+    def robot_names(self):
+        return list(self.robots.keys())
+
+    def robot_count(self):
+        return len(self.robots)
+
+    def capable_robot_count(self, task_description):
+        """ Number of robots whose type can perform a task (0 if no type can). """
+
+        robot_types = self.dispatcher.task_index.get(task_description, ())
+        return sum(self.robots.count_of_type(robot_type) for robot_type in robot_types)
+
+    def reload_tasks(self, fn=None):
+        """ Loads the task definitions again (tasks.json by default) without stopping any robot and returns the new
+        version. The file is read and checked first, a bad file raises ValueError and the current tasks stay in use.
+        Tasks queued before the reload keep their eta, only tasks queued afterwards use the new ones. """
+
+        table = tasks.load(fn or tasks.TASKS_FN)
+
+        def swap():
+            # On the executor's thread so no robot or request sees half of the old tables and half of the new ones
+            tasks.use(table)
+            use_task_table(table)
+            self.dispatcher.rebuild()
+
+        self.executor.call_sync(swap)
+        return table.version
+
+    def find_tasks(self, min_eta=0, max_eta=None, robot_type=None):
+        """ List of [eta in seconds, task, robot type] for every task taking min_eta to max_eta seconds, shortest first. """
+
+        max_eta = None if max_eta is None else max_eta * 1000 + 999 # <- Etas are listed in ms and rounded down to seconds
+        return [[int(eta/1000), task, task_type] for eta, task, task_type in tasks.TABLE.tasks_between(min_eta * 1000, max_eta, robot_type)]
+
+    def top_robots(self, k=10):
+        """ List of (robot name, tasks completed) for the k robots that completed the most tasks. """
+
+        if not metrics.ENABLED:
+            return self.leaderboard.top(k)
+
+        started = perf_counter()
+        top = self.leaderboard.top(k)
+        metrics.LEADERBOARD_LATENCY.observe(perf_counter() - started, ('top',))
+        return top
+
+    def robot_rank(self, robot_name):
+        """ 1 based leaderboard rank of a robot. """
+
+        if not metrics.ENABLED:
+            return self.leaderboard.rank(robot_name)
+
+        started = perf_counter()
+        rank = self.leaderboard.rank(robot_name)
+        metrics.LEADERBOARD_LATENCY.observe(perf_counter() - started, ('rank',))
+        return rank
+
+    def submit(self, task_description, count=1, priority=0, timeout=None):
+        """ Hands out count runs of a task across every robot whose type can perform it, each run going to the robot
+        with the least queued work. Returns a dict of robot name -> number of runs it was given. """
+
+        capable_types = self.dispatcher.capable_types(task_description)
+
+        def assign():
+            # Runs on the executor thread so queued etas can not change while the work is being split up
+            loads = []
+            for robot_type in capable_types:
+                for robot_name in self.robots.names_of_type(robot_type):
+                    # Robots that were never loaded are idle, no need to load them just to find that out
+                    if self.robots.is_loaded(robot_name):
+                        loads.append((self.robots.peek(robot_name).queued_eta, robot_name))
+                    else:
+                        loads.append((0, robot_name))
+
+            assigned = self.dispatcher.plan(task_description, count, loads)
+            self.executor.handler_pool.admit(task_description, sum(assigned.values()))
+            for robot_name, runs in assigned.items():
+                self.executor.enqueue(self.robots[robot_name], task_description, runs, priority, deadline(timeout))
+            return assigned
+
+        return self.executor.call_sync(assign)
+
+    def upgrade_robot(self, robot_name):
+        """ Upgrades a robot one level with its upgrade points, it is retooled before its next task. Returns the level
+        it is upgraded to, raises ValueError if it can not be upgraded (not enough points or fully upgraded). """
+
+        def upgrade():
+            robot = self.robots[robot_name]
+            if not upgrades.can_upgrade(robot):
+                raise ValueError('{0} can not be upgraded right now ({1} upgrade points)'.format(robot, upgrades.points(robot)))
+            robot.request_upgrade()
+            self.store.record_upgrade(robot_name, upgrades.target_level(robot))
+            self.executor.schedule(robot) # <- Idle robots get upgraded right away
+            return upgrades.target_level(robot)
 
-        # Send a list of objects to save
-        robot_list = [self.robots[k] for k in self.robots.keys()]
-        save_to_pickle(robot_list)
+        return self.executor.call_sync(upgrade)
 
-    def view_robot_leaderboard(self):
-        """ Sorts all robots by number of tasks completed and prints out the results. """
+    def plan_upgrades(self, horizon=3600, bays=None):
+        """ List of [robot name, level it would be upgraded to, extra tasks over the horizon] for the robots most worth
+        upgrading right now (see upgrades.plan_upgrades). Robots that were never loaded are idle and gain nothing. """
+
+        def plan():
+            return [[robot.name, upgrades.target_level(robot) + 1, round(gain, 2)]
+                    for gain, robot in upgrades.plan_upgrades(self.robots.loaded_robots(), horizon, bays)]
+
+        return self.executor.call_sync(plan)
+
+    def auto_upgrade(self, horizon=3600, bays=None):
+        """ Upgrades every robot plan_upgrades recommends, returns the plan that was carried out. """
+
+        plan = self.plan_upgrades(horizon, bays)
+        for robot_name, _, _ in plan:
+            self.upgrade_robot(robot_name)
+        return plan
+
+    def submit_work(self):
+        """ Lets the user hand out work to the whole factory instead of a single robot. """
 
         clear_console()
+        print('*** Entering work dispatch room ***\n')
 
         # Nothing to do if no robots have been created yet
         if not self.robots:
-            print("There are no robots! Please create one first")
+            print("No robots to give work to, please create one first!")
             press_enter_to_continue()
             clear_console()
             return
 
-        # Create a list tuples consisting of robots and the number of tasks completed by each
-        leaderboard_list = [(bot, len(bot.tasks_completed)) for bot in list(self.robots.values())]
+        task_choices = OrderedDict([(str(n+1), task) for n, task in enumerate(self.dispatcher.all_tasks)] + [('0', 'Leave')])
+        _, task = get_user_choice(task_choices, 'Which task needs doing?')
+
+        if task in self.dispatcher.task_index:
+            count = input('\nHow many times does it need doing? (press enter for once)\n')
+            count = int(count) if count.isdigit() and int(count) > 0 else 1
+
+            try:
+                assigned = self.submit(task, count)
+            except (ValueError, PoolFull) as e:
+                print('\n*** {0} ***\n'.format(e))
+            else:
+                print('\n*** The work was split between {0} robot(s) ***\n'.format(len(assigned)))
+                for robot_name, runs in sorted(assigned.items(), key=lambda x: -x[1])[:20]:
+                    print('{0:>6} x {1}'.format(runs, self.robots.describe(robot_name)))
+        else:
+            print('\n*** Leaving work dispatch room ***\n')
+
+        press_enter_to_continue()
+        clear_console()
+
+    def upgrade_robots(self, horizon=3600):
+        """ Shows which robots are most worth upgrading (the most extra tasks done within the horizon) and upgrades them. """
 
-        # Sort by most tasks completed
-        leaderboard_list = sorted(leaderboard_list, key=lambda x: -x[1])
+        clear_console()
+        print('*** Entering the upgrade bay ***\n')
+
+        plan = self.plan_upgrades(horizon)
+        if not plan:
+            print("No robot has earned an upgrade that would pay off right now, robots earn a point every {0} tasks and "
+                  "upgrades pay off best for robots with plenty of work queued!".format(upgrades.TASKS_PER_POINT))
+            press_enter_to_continue()
+            clear_console()
+            return
 
-        # Printed out in a table-like view
-        print("*** Leaderboard for tasks completed by each robot ***\n")
-        print("Tasks | Robot")
-        print("------|----------")
-        for robot, num_tasks_completed in leaderboard_list:
-            spaces = 4 - len(str(num_tasks_completed))
-            print("{0}{1}  | {2}".format(' ' * spaces, num_tasks_completed, robot))
+        print("Upgrading these robots gets about {0:.2f} more tasks done per minute:\n".format(
+            sum(gain for _, _, gain in plan) * 60.0 / horizon))
+        print("Extra tasks | Level | Robot")
+        print("------------|-------|----------")
+        for robot_name, level, gain in plan[:20]:
+            print("{0:>11} | {1:>5} | {2}".format(gain, level, self.robots.describe(robot_name)))
+
+        if input('\nType UPGRADE to upgrade {0} robot(s) (not case sensitive)\n'.format(len(plan))).upper() == 'UPGRADE':
+            for robot_name, _, _ in plan:
+                self.upgrade_robot(robot_name)
+            print('\n*** Robots are being upgraded, they will be back to work in {0} seconds! ***\n'.format(Robot.retool_seconds))
+        else:
+            print('\n*** Robots were NOT upgraded! ***\n')
 
         press_enter_to_continue()
         clear_console()
 
+    def view_robot_leaderboard(self, per_page=20):
+        """ Prints out the robots ranked by number of tasks completed, a page at a time. """
+
+        clear_console()
+
+        # Nothing to do if no robots have been created yet
+        if not self.robots:
+            print("There are no robots! Please create one first")
+            press_enter_to_continue()
+            clear_console()
+            return
+
+        page = 0
+        while True:
+            # The leaderboard is always kept in order so only the current page needs to be looked at
+            started = perf_counter()
+            leaderboard_page = self.leaderboard.page(page, per_page)
+            if metrics.ENABLED:
+                metrics.LEADERBOARD_LATENCY.observe(perf_counter() - started, ('page',))
+            num_pages = self.leaderboard.num_pages(per_page)
+
+            # Printed out in a table-like view
+            print("*** Leaderboard for tasks completed by each robot (page {0} of {1}) ***\n".format(page + 1, num_pages))
+            print("Rank | Tasks | Robot")
+            print("-----|-------|----------")
+            for robot_name, num_tasks_completed in leaderboard_page:
+                print("{0:>4} | {1:>5} | {2}".format(self.leaderboard.rank(robot_name), num_tasks_completed, self.robots.describe(robot_name)))
+
+            if num_pages == 1:
+                press_enter_to_continue()
+                break
+
+            # Let the user flip through the pages, anything else leaves the leaderboard
+            choice = input('\nType N for the next page, P for the previous page or just press enter to leave\n').upper()
+            if choice == 'N':
+                page = min(page + 1, num_pages - 1)
+            elif choice == 'P':
+                page = max(page - 1, 0)
+            else:
+                break
+            clear_console()
+
+        clear_console()
+
+    def watch_robots(self, fps=4):
+        """ Live dashboard of the robots at work, redrawn a few times a second until the user presses enter. """
+
+        clear_console()
+
+        if not self.executor.busy_count:
+            print("No robots are working right now, give them something to do first!")
+            press_enter_to_continue()
+            clear_console()
+            return
+
+        from display import Dashboard # <- Only needed once someone watches
+        Dashboard(self, fps).run()
+        clear_console()
+
     def create_robot(self):
         """ Create a new robot based on user input for name and robot type. """
 
@@ -107,12 +591,11 @@ class RobotFactory(object):
         _, robot_class = get_user_choice(ROBOT_TYPE_CHOICES, 'What type of robot is {0}'.format(robot_name))
 
         try:
-            robot = ROBOT_TYPES[robot_class](robot_name) # <- instantiate on the fly
+            robot = self.add_robot(robot_name, robot_class)
         except KeyError:
             print('\n*** Leaving Robot Creation room ***\n')
         else:
-            # Store new robots in class-level dict
-            self.robots[robot_name] = robot
+            print('\n*** {0} has started working on its tasks! ***\n'.format(robot))
         finally:
             press_enter_to_continue()
             clear_console()
@@ -131,7 +614,7 @@ class RobotFactory(object):
             return
 
         # Get user's robot-to-interact-with choice
-        _, robot_name = get_user_choice(self.robot_name_choices, 'Choose a robot to interact with.')
+        robot_name = self.choose_robot('Choose a robot to interact with.')
 
         try:
             bot = self.robots[robot_name]
@@ -158,10 +641,10 @@ class RobotFactory(object):
             return
 
         # Get user's robot-to-destroy choice
-        _, robot_name = get_user_choice(self.robot_name_choices, 'Choose a robot to destroy.')
+        robot_name = self.choose_robot('Choose a robot to destroy.')
 
         try:
-            robot = self.robots[robot_name]
+            robot = self.robots.peek(robot_name)
         except KeyError:
             # Only occurs when 0: exit is selected or no robots exist yet
             print("\n*** Leaving robot destruction room ***\n")
@@ -169,7 +652,7 @@ class RobotFactory(object):
             # Confirrm that the user actually wants to destroy the bot
             clear_console()
             if input('Type DESTROY if you are sre you want to destroy {0} (not case sensitive)\n'.format(robot)).upper() == 'DESTROY':
-                del self.robots[robot_name]
+                self.remove_robot(robot_name)
                 print('\n*** {0} has been destroyed! ***\n'.format(robot_name))
             else:
                 print('\n*** {0} was NOT destroyed! ***\n'.format(robot_name))
@@ -192,11 +675,40 @@ class RobotFactory(object):
 
         # Get user confirmation to actually destroy all robots
         if input('Type DESTORY if you are sure you want to destroy ALL robots (not case sensitive)\n').upper() == 'DESTROY':
-            self.robots = {}
+            self.remove_all_robots()
             print("\n*** All robots have been destroyed! ***\n")
         else:
             print("\n*** Robots were NOT destroyed! ***\n")
 
         print("\n*** Leaving robot destruction room ***\n")
         press_enter_to_continue()
-        clear_console()
\ No newline at end of file
+        clear_console()
+
+
+def parse_robot_search(search):
+    """ Splits a robot search typed in a menu into (robot type or None, name prefix, text the name contains or None):
+    'Ro' -> names starting with Ro, '*bot' -> names containing bot, 'bipedal:' or 'bipedal:Ro' -> bipedal robots only. """
+
+    robot_type = None
+    head, sep, rest = search.partition(':')
+    if sep and head.upper() in ROBOT_TYPES:
+        robot_type, search = head.upper(), rest
+    if search.startswith('*'):
+        return robot_type, '', search[1:]
+    return robot_type, search, None
+
+
+def open_analytics(path):
+    """ AnalyticsStore at path, None without NumPy (task completions are then simply not recorded for analytics).
+    Imported here rather than up top as NumPy alone takes longer to import than everything else. """
+
+    try:
+        from analytics import AnalyticsStore
+    except ImportError:
+        return None
+    return AnalyticsStore(path)
+
+
+def deadline(timeout):
+    """ time.time() timeout seconds from now, None for no timeout. """
+    return None if timeout is None else time() + timeout
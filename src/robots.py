@@ -1,59 +1,219 @@
-from time import sleep
-from random import choice
+from builtins import input
+
+import random
+import struct
+from random import sample
 from collections import OrderedDict
+from hashlib import blake2b
+from time import perf_counter, time
+from types import MappingProxyType
 
+import handlers
+import metrics
 import tasks
-from utils import clear_console, press_enter_to_continue, get_user_choice
+from catalog import CompletedTasks
+from executor import default_executor
+from handlers import PoolFull
+from utils import clear_console, press_enter_to_continue, get_user_choice, gc_paused
+from work_queue import WorkQueue
+
+SAMPLE_CHUNK = 100000 # <- Robots whose tasks are sampled in one NumPy step, caps the memory used by huge batches
+
+_numpy = None # <- NumPy once it was asked for (False when it is not installed), see load_numpy
+
+task_streams = None # <- TaskStreams every robot's random tasks are drawn from once seeded (see seed_tasks), else random
+
+
+def load_numpy():
+    """ NumPy, imported the first time bulk task assignment needs it (it takes longer to import than the whole factory)
+    or None when it is not installed, bulk task assignment then falls back to a pure python shuffle. """
+
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy as _numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+class TaskStreams(object):
+    """ Seeded random stream per robot name: the n-th todo list a robot is given only depends on the seed, its name and
+    n, not on how many other robots were created or given tasks before it, so a run can be reproduced even when robots
+    are scheduled differently. Every draw hashes (seed, name, n) with BLAKE2b, far cheaper than a random.Random per robot. """
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.draws = {} # <- Robot name mapped to the number of todo lists drawn for it so far
+
+    def sample(self, name, num_types, num_tasks):
+        """ num_tasks distinct indexes out of range(num_types) for the robot's next todo list (partial Fisher-Yates). """
+
+        draw = self.draws.get(name, 0)
+        self.draws[name] = draw + 1
+        key = '{0}:{1}:{2}'.format(self.seed, name, draw).encode()
+
+        pool = list(range(num_types))
+        for i in range(num_tasks):
+            if not i % 8: # <- A 64 byte digest is 8 draws
+                words = struct.unpack('<8Q', blake2b(key + struct.pack('<I', i), digest_size=64).digest())
+            j = i + words[i % 8] % (num_types - i)
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:num_tasks]
+
+
+def seed_tasks(seed):
+    """ Draws every robot's random tasks from its own stream of seed from now on (None goes back to random), so the
+    same seed and the same robot names give the same tasks. Seeding again starts every stream over. """
+
+    global task_streams
+    task_streams = None if seed is None else TaskStreams(seed)
+    return task_streams
 
 
 class Robot(object):
-    """ Base robot class, contains all base robot-related logic. """
+    """ Base robot class, contains all base robot-related logic.
+
+    Instances are slotted (no per-robot __dict__) and everything derived from a type's all_tasks is built once per
+    class (see _build_task_tables), so a robot costs little more than its queue and its task history. """
+
+    # Subclasses need an empty __slots__ of their own, otherwise their instances get a __dict__ again
+    __slots__ = ('name', 'tasks_to_perform', 'tasks_completed', 'upgrade_level',
+                 '_current_task', '_task_progress', '_task_started', '_task_entry', '_retooling', '_cancelled')
 
     all_tasks = {} # overwritten by specific types
+    task_version = tasks.TABLE.version # <- Version of the task table all_tasks came from, see use_task_table
+
+    # Speed upgrades (see upgrades.py), every level multiplies task durations by upgrade_speedup
+    upgrade_speedup = 0.8
+    max_upgrade_level = 5
+    retool_seconds = 30 # <- Seconds a robot stops working while it is being upgraded
+
+    # Callables run with (robot, task) every time any robot finishes a task, e.g. to persist the completion
+    task_listeners = []
+    # Callables run with (robot, task, reason) every time a task is given up on, reason is 'cancelled', 'expired' or
+    # 'failed' (its handler raised, see handlers.py)
+    drop_listeners = []
+    # Callables run with (robot, tasks, priority) every time tasks are queued on any robot, e.g. to log the workload
+    assign_listeners = []
 
     # Shared across all Robots and subclasses
     base_tasks = tasks.base_tasks
     interaction_choices = OrderedDict([
         ('1', 'View completed tasks'),
         ('2', 'Perform a new task'),
+        ('3', 'Change task order'),
+        ('4', 'Cancel current task'),
         ('0', 'Leave'),
     ])
 
-    def __init__(self, name):
-        """ Initialize a robot, each instance with a separate empty tasks_to_perform and tasks_completed lists.
-        Population and execution of tasks_to_perform list also happens within this init. """
+    def __init__(self, name, num_tasks=5, queue=None):
+        """ Initialize a robot, each instance with a separate empty tasks_to_perform queue and tasks_completed list.
+        Population of tasks_to_perform queue (with num_tasks tasks) also happens within this init, the tasks are executed
+        once the robot is handed to an executor (see RobotFactory.create_robot) or perform_all_tasks is called.
+        queue is an already filled WorkQueue to start with instead (see create_many). """
 
         self.name = name
-        self.msg = '' # Message that will be displayed as tasks are completed
 
-        self.tasks_to_perform = []
-        self.tasks_completed = []
+        self.tasks_to_perform = WorkQueue() if queue is None else queue # <- Priority queue, FIFO by default
+        self.tasks_completed = CompletedTasks() # <- Behaves like a list of task descriptions but stores compact task ids
+        self.upgrade_level = 0
 
         self._current_task = None
+        self._task_progress = 0 # <- Seconds of work done on the current task
+        self._task_started = None # <- Wall clock time the current (or last) task was started
+        self._task_entry = None # <- (eta, priority, version, deadline) of the current (or last) task, as it was queued
+        self._retooling = False # <- Upgrade requested, applied before the next task (see request_upgrade)
+        self._cancelled = False # <- The current task should be given up, see cancel_task
+
+        if num_tasks:
+            self.populate_todo_list(num_tasks)
+
+    def __init_subclass__(cls, **kwargs):
+        super(Robot, cls).__init_subclass__(**kwargs)
+        cls._build_task_tables()
 
-        self.populate_todo_list()
-        self.perform_all_tasks()
+    @classmethod
+    def _build_task_tables(cls):
+        """ Precomputes the read-only task tables shared by every robot of a type. """
+
+        cls.all_tasks_list = tuple(cls.all_tasks) # <- Every task a robot of this type can perform
+        cls.task_etas = MappingProxyType(dict((task, int(eta/1000)) for task, eta in cls.all_tasks.items())) # <- Seconds
+        cls.task_entries = tuple((task, cls.task_etas[task]) for task in cls.all_tasks_list) # <- As queued
+        cls.all_task_choices = MappingProxyType(OrderedDict(
+            [(str(e+1), task) for e, task in enumerate(cls.all_tasks_list)] + [('0', 'Leave')]))
+
+    @property
+    def msg(self):
+        """ Message describing the task being performed, derived from the current task so no robot stores one. """
+
+        task = self._current_task
+        if task is None:
+            return ''
+        return 'Performing task: {0}, it will take approximately {1} seconds'.format(task, self.task_duration(self._task_entry[0]))
+
+    @property
+    def task_started(self):
+        """ Time (time.time()) the current task, or the task that was just finished, was started. """
+        return self._task_started
+
+    @property
+    def current_eta(self):
+        """ Seconds the current task, or the task that was just finished, takes (the eta it was queued with). """
+        return self._task_entry[0] if self._task_entry is not None else None
 
     @property
     def current_task(self):
-        """ Current task the robot is working on, may be helpful to have if async is leveraged. """
+        """ Current task the robot is working on, updated live while the executor runs the robot's queue. """
         return self._current_task
 
     @property
-    def robot_type(self):
-        """ Simple way to get the robot types as the type and class names are the same. """
-        return self.__class__.__name__
+    def progress(self):
+        """ Tuple of (current task, seconds done, total seconds) or None if the robot is idle. """
+
+        task = self._current_task
+        if task is None:
+            return None
+        return task, self._task_progress, self.task_duration(self._task_entry[0])
+
+    @property
+    def speed_factor(self):
+        """ Multiplier on the duration of every task, 1.0 until the robot is upgraded. """
+        return self.upgrade_speedup ** self.upgrade_level
+
+    @property
+    def retooling(self):
+        """ True while an upgrade was requested but not applied yet. """
+        return self._retooling
+
+    @property
+    def status(self):
+        """ Short human readable description of what the robot is doing right now. """
+
+        progress = self.progress
+        if progress is None and self._retooling:
+            return 'being upgraded to level {0} ({1} tasks queued)'.format(self.upgrade_level + 1, len(self.tasks_to_perform))
+        if progress is None:
+            return 'idle ({0} tasks queued)'.format(len(self.tasks_to_perform))
+
+        task, done, eta = progress
+        return 'performing "{0}" ({1}/{2} seconds, {3} more tasks queued)'.format(task, done, eta, len(self.tasks_to_perform))
 
     @property
-    def all_tasks_list(self):
-        """ List of all tasks that a specific robot can perform. This list varies based on robot type. """
-        return list(self.all_tasks.keys())
+    def queued_eta(self):
+        """ Seconds until the robot is done with everything queued, including what is left of its current task. """
+
+        queued = self.task_duration(self.tasks_to_perform.total_eta)
+        progress = self.progress
+        if progress is not None:
+            _, done, eta = progress
+            queued += eta - done
+        return queued
 
     @property
-    def all_task_choices(self):
-        """ An OrderedDict of all tasks with enumeration for choosing specific tasks to perform. """
-        task_choices = OrderedDict([(str(e+1), i) for e, i in enumerate(self.all_tasks_list)] + [('0', 'Leave')])
-        return task_choices
+    def robot_type(self):
+        """ Simple way to get the robot types as the type and class names are the same. """
+        return self.__class__.__name__
 
     @property
     def interactions(self):
@@ -62,6 +222,8 @@ class Robot(object):
         return {
             'View completed tasks': self.view_completed_tasks,
             'Perform a new task': self.get_task_to_perform,
+            'Change task order': self.change_task_order,
+            'Cancel current task': self.get_task_to_cancel,
         }
 
     def view_completed_tasks(self):
@@ -72,6 +234,11 @@ class Robot(object):
 
         for i in self.tasks_completed: print('- ' + i)
 
+        # Quick summary of how often each task was done
+        print('\n{0} tasks completed in total:'.format(len(self.tasks_completed)))
+        for task, count in sorted(self.tasks_completed.counts().items(), key=lambda x: -x[1]):
+            print('{0:>8} x {1}'.format(count, task))
+
         press_enter_to_continue()
         clear_console()
 
@@ -81,6 +248,7 @@ class Robot(object):
         while True: # Break when users chooses to '0: Leave'
             clear_console()
             print("*** Interacting with {0} ***\n".format(self))
+            print("{0} is currently {1}\n".format(self.name, self.status))
 
             # Get the user's interaction choice
             _, action_choice = get_user_choice(self.interaction_choices, 'What would you like to do with {0}'.format(self))
@@ -94,73 +262,357 @@ class Robot(object):
                 break
 
     def get_task_to_perform(self):
-        """ Allows the user to choose a task to perform"""
+        """ Allows the user to choose a task to perform, the task is queued and worked on in the background. """
 
         clear_console()
         # Get the user's task choice
         _, task_choice = get_user_choice(self.all_task_choices, 'Which task would you like {0} to perform?'.format(self))
 
-        # Rest self.msg as it is very likely it was previously changed
-        self.msg = ''
+        if task_choice not in self.all_tasks:
+            clear_console()
+            return # Will only occur when '0: Leave' is chosen
+
+        # Tasks can be queued up many times at once, anything that is not a positive number means just once
+        count = input('\nHow many times should {0} {1}? (press enter for once)\n'.format(self.name, task_choice))
+        count = int(count) if count.isdigit() and int(count) > 0 else 1
 
-        # Actually perform the chosen task
-        self.perform_task(task_choice)
+        # Urgent tasks jump ahead of everything else in the queue
+        priority = 1 if input('Type URGENT if this task should skip the line (not case sensitive)\n').upper() == 'URGENT' else 0
 
-        print("\n*** Task finished! ***\n")
+        # Queue the chosen task, unless the handler pool can not take more of it, and make sure the robot is working
+        # through its queue
+        try:
+            default_executor.handler_pool.admit(task_choice, count)
+        except PoolFull as e:
+            print('\n*** {0} ***\n'.format(e))
+        else:
+            default_executor.enqueue(self, task_choice, count, priority)
+            print("\n*** {0} will {1} {2} time(s) as soon as it is free! ***\n".format(self, task_choice, count))
 
         press_enter_to_continue()
         clear_console()
 
-    def perform_task(self, task):
-        """ Performs a single given task, could leverage the self._current task here if we do not want to pass in the task as a param. """
+    def change_task_order(self):
+        """ Lets the user pick between working through queued tasks in order or shortest task first. """
+
+        clear_console()
+        print('{0} currently works through its tasks in {1} order\n'.format(self, self.tasks_to_perform.policy))
+
+        order_choices = OrderedDict([
+            ('1', WorkQueue.FIFO),
+            ('2', WorkQueue.SHORTEST_FIRST),
+            ('0', 'Leave'),
+        ])
+        _, policy = get_user_choice(order_choices, 'Which order should {0} use?'.format(self))
+
+        if policy in WorkQueue.POLICIES:
+            default_executor.call(self.tasks_to_perform.set_policy, policy)
+        clear_console()
 
-        try: # Attempt to get the task, then perform the task by sleeping for the listed eta duration
-            # Get the task eta/duration and convert to seconds for sleep()
-            eta = int(self.all_tasks[task]/1000)
-        except KeyError:
-            pass # Will only occur when '0: Leave' is chosen
+    def get_task_to_cancel(self):
+        """ Lets the user stop the task the robot is working on, and optionally everything it has queued. """
+
+        clear_console()
+        if self.current_task is None:
+            print('{0} is not working on anything right now\n'.format(self))
+        elif input('Type CANCEL if {0} should stop trying to {1} (not case sensitive)\n'.format(self.name, self.current_task)).upper() == 'CANCEL':
+            clear_queue = input('Type ALL to also drop the {0} queued task(s) (not case sensitive)\n'.format(len(self.tasks_to_perform))).upper() == 'ALL'
+            default_executor.call_sync(self.cancel_task, clear_queue)
+            print('\n*** {0} will stop what it is doing within a second! ***\n'.format(self))
         else:
-            self.msg += '\nPerforming task: {0}, it will take approximately {1} seconds'.format(task, eta)
-            self._current_task = task
+            print('\n*** {0} will keep going! ***\n'.format(self))
+
+        press_enter_to_continue()
+        clear_console()
+
+    def queue_task(self, task, count=1, priority=0, deadline=None):
+        """ Adds a task to the tasks_to_perform queue count times, higher priorities are performed first.
+        A deadline (time.time()) drops the tasks that can not be done by then instead of performing them late. """
 
-            # Clear the console and update the message each iteration to give the impression of ... loading
-            for _ in range(eta):
-                clear_console()
-                self.msg += '.'
-                print(self.msg)
-                sleep(1)
+        eta = self.task_eta(task)
+        self.tasks_to_perform.extend([(task, eta)] * count, priority, self.task_version, deadline)
 
-            # Save the task to completed_tasks list
-            self.save_finished_task(task)
+        for listener in self.assign_listeners:
+            listener(self, [task] * count, priority)
+
+    def cancel_task(self, clear_queue=False, executor=default_executor):
+        """ Gives up the task in progress (within a second, it is not counted as completed), clear_queue drops every
+        queued task as well. Returns the task that was cancelled, None if the robot was idle. Call on the executor's thread. """
+
+        if clear_queue:
+            executor.handler_pool.release(self.tasks_to_perform.count(handlers.HANDLERS))
+            self.tasks_to_perform.clear()
+        if self._current_task is not None:
+            self._cancelled = True
+        return self._current_task
+
+    def checkpoint_task(self):
+        """ Puts the task in progress back at the front of the queue with only what is left of it, to be resumed later. """
+
+        task = self._current_task
+        if task is None:
+            return
+
+        eta, priority, version, deadline = self._task_entry
+        done = int(self._task_progress / self.speed_factor) # <- Progress is counted in (upgraded) seconds of work
+        self.tasks_to_perform.requeue(task, max(eta - done, 1), priority, version, deadline)
+        self._current_task = None
+
+    async def perform_task_async(self, task, executor=default_executor, eta=None, priority=0, version=None, deadline=None):
+        """ Performs a single given task without blocking other robots, progress can be followed through self.progress.
+        Queued tasks are performed with the eta they were queued with, even if the task table was reloaded since.
+
+        Between every second of work the robot checks whether to stop: a cancelled task (see cancel_task) or one
+        that can not make its deadline is dropped, while a task interrupted by more urgent work (or by the executor
+        stopping) goes back in the queue with what is left of it. Returns True only if the task was completed. """
+
+        import asyncio # <- Already imported by the executor running this, see TaskExecutor.start
+
+        if eta is None:
+            try: # Attempt to get the task, then perform the task by sleeping for the listed eta duration
+                # Get the task eta/duration in seconds for sleep()
+                eta = self.task_eta(task)
+            except KeyError:
+                return False # Will only occur when '0: Leave' is chosen
+
+        duration = self.task_duration(eta)
+        if deadline is not None and time() + duration * executor.time_scale > deadline:
+            self._task_dropped(task, 'expired') # <- Would be late anyway, no point starting it
+            return False
+
+        self._task_progress = 0
+        self._current_task = task
+        self._task_entry = (eta, priority, version, deadline)
+        self._cancelled = False
+        self._task_started = time()
+        started = perf_counter()
+
+        # Update the progress each second, displays (see display.Dashboard) read it at their own pace
+        try:
+            if executor.handler_pool.handles(task):
+                # Real (blocking) work on the handler pool, it can not be interrupted part way so it is checked once done
+                try:
+                    await executor.handler_pool.run(self, task, duration)
+                except Exception:
+                    self._current_task = None
+                    self._task_dropped(task, 'failed')
+                    return False
+                self._task_progress = duration
+                if self._cancelled:
+                    self._current_task = None
+                    self._task_dropped(task, 'cancelled')
+                    return False
+
+            while self._task_progress < duration:
+                await executor.sleep(1)
+                self._task_progress += 1
+
+                if self._cancelled or (deadline is not None and time() > deadline):
+                    self._current_task = None
+                    self._task_dropped(task, 'cancelled' if self._cancelled else 'expired')
+                    return False
+
+                # Urgent work waits at most a second, the interrupted task is resumed right after it
+                next_priority = self.tasks_to_perform.peek_priority()
+                if next_priority is not None and next_priority > priority and self._task_progress < duration:
+                    self.checkpoint_task()
+                    return False
+        except asyncio.CancelledError:
+            self.checkpoint_task() # <- The executor is shutting down, keep what is left of the task for the next run
+            raise
+
+        self._current_task = None
+        if metrics.ENABLED:
+            metrics.task_performed(self, task, perf_counter() - started)
+
+        # Save the task to completed_tasks list
+        self.save_finished_task(task)
+        return True
+
+    def _task_dropped(self, task, reason):
+        self._cancelled = False
+        for listener in self.drop_listeners:
+            listener(self, task, reason)
+
+    async def perform_all_tasks_async(self, executor=default_executor):
+        """ Works through the tasks_to_perform list until it is empty, one coroutine per robot. """
+
+        # Utlize a while loop to safely pop from the queue while iterating, new tasks may be queued while working
+        while self.tasks_to_perform or self._retooling:
+            if self._retooling:
+                await self.retool_async(executor)
+                continue
+            task, eta, version, priority, deadline = self.tasks_to_perform.pop_entry()
+            await self.perform_task_async(task, executor, eta, priority, version, deadline)
+            # Done or dropped (handler tasks are never put back part way, only by a worker that is cancelled)
+            if executor.handler_pool.handles(task):
+                executor.handler_pool.release()
+
+    def request_upgrade(self):
+        """ Has the robot upgrade itself (one level) before its next task, see upgrades.py. Call on the executor's thread. """
+
+        if self.upgrade_level + self._retooling >= self.max_upgrade_level:
+            raise ValueError('{0} is already fully upgraded'.format(self))
+        self._retooling = True
+
+    async def retool_async(self, executor=default_executor):
+        """ Spends retool_seconds being upgraded, the robot does no work in the meantime. """
+
+        for _ in range(self.retool_seconds):
+            await executor.sleep(1)
+        self.finish_upgrade()
+
+    def finish_upgrade(self):
+        """ Applies a requested upgrade, every task from now on is performed faster. """
+
+        self.upgrade_level += 1
+        self._retooling = False
+
+    def perform_task(self, task):
+        """ Performs a single given task on the executor and blocks until it is finished. """
+
+        default_executor.run(self.perform_task_async(task, default_executor))
 
     def perform_all_tasks(self):
-        """ Starts execution of all tasks listed in tasks_to_perform list. """
+        """ Executes all tasks listed in tasks_to_perform list and blocks until they are finished. """
 
-        # Reset self.msg as it is starting a new process here
-        self.msg = '*** {0} is performing all required tasks, please standby. ***\n'.format(self)
+        default_executor.run_all([self])
 
-        # Utlize a while loop to safely pop from list while iterating
-        while self.tasks_to_perform:
-            task = self.tasks_to_perform.pop(0)
-            self.perform_task(task)
+    def task_eta(self, task):
+        """ Duration of a task in whole seconds, the listed etas are in milliseconds. """
+        return self.task_etas[task]
 
-        print("\n*** {0} has completed all inital tasks! ***\n".format(self))
+    def task_duration(self, eta):
+        """ Seconds this robot actually takes for eta seconds of work, upgraded robots are faster (never under a second). """
+
+        if not self.upgrade_level:
+            return eta
+        return max(1, int(round(eta * self.speed_factor)))
 
     def save_finished_task(self, task):
         """ Saves a task to tasks_completed list. """
 
         self.tasks_completed.append(task)
 
+        for listener in self.task_listeners:
+            listener(self, task)
+
+        if metrics.ENABLED:
+            metrics.task_finished(self, task)
+
     def populate_todo_list(self, num_tasks=5):
-        """ Randomly chooses (5) tasks from the list of all tasks and populates the robot's tasks_to_perform list. """
+        """ Randomly chooses (5) tasks from the list of all tasks and populates the robot's tasks_to_perform queue. """
 
-        t = set()
-        while len(t) < num_tasks:
-            task = choice(self.all_tasks_list)
-            if task not in t:
-                t.add(task)
+        # Tasks are unique so a robot can never be given more tasks than it knows how to do
+        num_tasks = min(num_tasks, len(self.all_tasks))
 
-        self.tasks_to_perform = list(t)
+        if task_streams is None:
+            todo = sample(self.all_tasks_list, num_tasks)
+        else:
+            todo = [self.all_tasks_list[i] for i in task_streams.sample(self.name, len(self.all_tasks_list), num_tasks)]
+
+        task_etas = self.task_etas
+        self.tasks_to_perform.clear()
+        self.tasks_to_perform.extend([(task, task_etas[task]) for task in todo], 0, self.task_version)
+
+        for listener in self.assign_listeners:
+            listener(self, todo, 0)
+
+    @classmethod
+    def sample_todo_lists(cls, num_robots, num_tasks, names=None):
+        """ Yields num_robots lists of num_tasks distinct indexes into all_tasks_list. With NumPy every chunk of robots
+        is sampled in one vectorized step (random keys per task, argsorted per robot), without it each robot gets a
+        partial Fisher-Yates shuffle (random.sample does the same but with far more overhead per call). Once seeded
+        (see seed_tasks) the lists are drawn from the stream of each of the robots' names instead. """
+
+        num_types = len(cls.all_tasks_list)
+        num_tasks = min(num_tasks, num_types)
+        if task_streams is not None and names is not None:
+            for name in names:
+                yield task_streams.sample(name, num_types, num_tasks)
+            return
+
+        numpy = load_numpy() if num_tasks else None
+        if numpy is None:
+            rand = random.random
+            indexes = list(range(num_types))
+            for _ in range(num_robots):
+                pool = indexes[:]
+                for i in range(num_tasks):
+                    j = i + int(rand() * (num_types - i))
+                    pool[i], pool[j] = pool[j], pool[i]
+                yield pool[:num_tasks]
+            return
+
+        rng = numpy.random.default_rng(random.getrandbits(64)) # <- Seeded from random so random.seed still applies
+        for start in range(0, num_robots, SAMPLE_CHUNK):
+            rows = min(SAMPLE_CHUNK, num_robots - start)
+            keys = rng.random((rows, num_types), dtype=numpy.float32)
+            for row in numpy.argsort(keys, axis=1)[:, :num_tasks].tolist():
+                yield row
+
+    @classmethod
+    def create_many(cls, names, num_tasks=5):
+        """ Creates a robot per name, each with its own num_tasks random tasks (sampled for the whole batch at once). """
+
+        entries, listeners = cls.task_entries, cls.assign_listeners
+
+        with gc_paused():
+            todos = ([entries[i] for i in row] for row in cls.sample_todo_lists(len(names), num_tasks, names))
+            robots = [cls(name, num_tasks=0, queue=queue) for name, queue in zip(names, WorkQueue.many(todos, 0, cls.task_version))]
+
+            if listeners:
+                for robot in robots:
+                    todo = list(robot.tasks_to_perform)
+                    for listener in listeners:
+                        listener(robot, todo, 0)
+        return robots
+
+    def snapshot_copy(self):
+        """ Copy of the robot that can be pickled on another thread while this one keeps working. """
+
+        robot = self.__class__.__new__(self.__class__)
+        robot.name = self.name
+        robot.tasks_to_perform = self.tasks_to_perform.copy()
+        robot.tasks_completed = self.tasks_completed.copy()
+        robot.upgrade_level = self.upgrade_level
+        robot._retooling = self._retooling
+        robot._current_task = self._current_task
+        robot._task_progress = self._task_progress
+        robot._task_started = self._task_started
+        robot._task_entry = self._task_entry
+        robot._cancelled = False
+        if not self._cancelled:
+            robot.checkpoint_task() # <- Whatever the robot is in the middle of is saved as queued, with what is left of it
+        return robot
+
+    def __getstate__(self):
+        """ Pickled as a plain dict, the same state robots had before they were slotted (plus their upgrade level). """
+
+        state = {'name': self.name, 'tasks_to_perform': self.tasks_to_perform, 'tasks_completed': self.tasks_completed}
+        if self.upgrade_level or self._retooling:
+            state['upgrade_level'] = self.upgrade_level + self._retooling # <- A requested upgrade is as good as done
+        return state
+
+    def __setstate__(self, state):
+        """ Restores a pickled robot, nothing is running right after a load so the current task is cleared. """
+
+        self.name = state['name']
+        self.tasks_to_perform = state['tasks_to_perform']
+        self.tasks_completed = state['tasks_completed']
+        self.upgrade_level = state.get('upgrade_level', 0)
+        if isinstance(self.tasks_completed, list): # <- Saved before tasks_completed was compacted
+            self.tasks_completed = CompletedTasks(self.tasks_completed)
+        if isinstance(self.tasks_to_perform, list): # <- Saved before tasks_to_perform was a WorkQueue
+            queue = WorkQueue()
+            queue.extend([(task, self.task_eta(task)) for task in self.tasks_to_perform])
+            self.tasks_to_perform = queue
+        self._current_task = None
+        self._task_progress = 0
+        self._task_started = None
+        self._task_entry = None
+        self._retooling = False
+        self._cancelled = False
 
     def __str__(self):
         return '{0} the {1} robot'.format(self.name, self.robot_type)
@@ -170,29 +622,37 @@ class Robot(object):
 
 
 class Unipedal(Robot):
+    __slots__ = ()
     all_tasks = tasks.unipedal_tasks
 
 
 class Bipedal(Robot):
+    __slots__ = ()
     all_tasks = tasks.bipedal_tasks
 
 
 class Quadrupedal(Robot):
+    __slots__ = ()
     all_tasks = tasks.quadrupedal_tasks
 
 
 class Arachnid(Robot):
+    __slots__ = ()
     all_tasks = tasks.arachnid_tasks
 
 
 class Radial(Robot):
+    __slots__ = ()
     all_tasks = tasks.radial_tasks
 
 
 class Aeronautical(Robot):
+    __slots__ = ()
     all_tasks = tasks.aeronautical_tasks
 
 
+Robot._build_task_tables() # <- Subclasses build theirs as they are defined
+
 # "Exportable" dicts
 ROBOT_TYPES = {
     'UNIPEDAL': Unipedal,
@@ -211,4 +671,17 @@ ROBOT_TYPE_CHOICES = OrderedDict([
     ('5', 'RADIAL'),
     ('6', 'AERONAUTICAL'),
     ('0', 'Leave')
-])
\ No newline at end of file
+])
+
+def use_task_table(table):
+    """ Switches every robot type over to a newly loaded tasks.TaskTable (see RobotFactory.reload_tasks).
+
+    Only tasks queued from now on use the new etas, tasks already queued keep the eta (and version) they were queued
+    with, so robots created before a reload stay consistent. """
+
+    Robot.base_tasks = table.base_tasks
+    Robot.task_version = table.version
+    for robot_type, robot_class in ROBOT_TYPES.items():
+        robot_class.all_tasks = table.tasks_of(robot_type)
+        robot_class.task_version = table.version
+        robot_class._build_task_tables()
@@ -0,0 +1,256 @@
+"""
+Network API for the robot factory, a JSON lines protocol served with asyncio.
+
+Every request is one line of JSON, {"id": 1, "method": "add_robot", "args": ["Bender", "bipedal"]}, answered by one
+line, {"id": 1, "result": ...} or {"id": 1, "error": {"type": "ValueError", "message": "..."}}. A client may send
+any number of requests without waiting for the replies, they are answered in order.
+
+The server runs on the factory's executor loop, next to the working robots, so requests never race with them and
+one thread serves thousands of connections. Batch methods (e.g. add_robots) take a list of argument lists and
+give the robots a turn between chunks, so even creating 10k robots in one request does not stall anyone.
+
+Example:
+    python3 src/server.py --port 8765
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import json
+import signal
+import threading
+
+from robot_factory import RobotFactory
+from robots import Robot
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# RobotFactory methods clients can call directly
+SERVER_METHODS = (
+    'add_robot',
+    'create_robots',
+    'remove_robot',
+    'retire_robots',
+    'queue_task',
+    'cancel_task',
+    'robot_info',
+    'submit',
+    'capable_robot_count',
+    'top_robots',
+    'robot_rank',
+    'robot_names',
+    'find_robots',
+    'robot_count',
+    'reload_tasks',
+    'find_tasks',
+    'upgrade_robot',
+    'plan_upgrades',
+    'auto_upgrade',
+)
+
+# Batch method -> RobotFactory method it runs once per list of arguments
+BATCH_METHODS = {
+    'add_robots': 'add_robot',
+    'remove_robots': 'remove_robot',
+    'queue_tasks': 'queue_task',
+    'robot_infos': 'robot_info',
+}
+
+BATCH_CHUNK = 500 # <- Items handled before robots get a turn on the loop again
+MAX_LINE = 64 * 1024 * 1024 # <- Longest request accepted, big enough for very large batches
+
+
+class FactoryServer(object):
+    """ Serves a RobotFactory over TCP on the factory's executor loop. """
+
+    def __init__(self, factory, host=DEFAULT_HOST, port=DEFAULT_PORT, backlog=4096):
+        self.factory = factory
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+
+        self.connections = 0 # <- Clients currently connected
+        self.requests = 0 # <- Requests answered since the server started
+
+        self._server = None
+
+    def start(self):
+        """ Starts listening, returns once the server accepts connections. port=0 picks a free port (see self.port). """
+
+        executor = self.factory.executor
+        executor.start()
+
+        async def listen():
+            return await asyncio.start_server(self._handle_client, self.host, self.port, limit=MAX_LINE, backlog=self.backlog)
+
+        self._server = executor.run(listen())
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        """ Stops accepting connections and closes the open ones, the factory itself is left running. """
+
+        if self._server is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            await self._server.wait_closed()
+
+        self.factory.executor.run(shutdown())
+        self._server = None
+
+    ### Connections
+
+    async def _handle_client(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    self._write(writer, {'id': None, 'error': {'type': 'ValueError', 'message': 'Request too long'}})
+                    break
+                if not line:
+                    break # <- Client disconnected
+
+                self._write(writer, await self.handle_line(line))
+                await writer.drain()
+        except ConnectionError:
+            pass # Client went away mid reply
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    @staticmethod
+    def _write(writer, reply):
+        writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+    async def handle_line(self, line):
+        """ Answers a single request line with a reply dict, never raises. """
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            result = await self.dispatch(request['method'], request.get('args', []), request.get('kwargs', {}))
+        except Exception as e:
+            reply = {'id': request_id, 'error': error_info(e)}
+        else:
+            reply = {'id': request_id, 'result': result}
+
+        self.requests += 1
+        return reply
+
+    ### Methods
+
+    async def dispatch(self, method, args, kwargs):
+        if method in SERVER_METHODS:
+            return plain(getattr(self.factory, method)(*args, **kwargs))
+        if method in BATCH_METHODS:
+            return await self.batch(BATCH_METHODS[method], *args, **kwargs)
+        if method == 'leaderboard_page':
+            return self.leaderboard_page(*args, **kwargs)
+        if method == 'status':
+            return self.status()
+        raise AttributeError('Unknown method: {0}'.format(method))
+
+    async def batch(self, method, items):
+        """ Runs a factory method once per argument list in items. Returns {'results': [...], 'errors': {index: error}}
+        where failed items have a None result, one bad item does not stop the rest of the batch. """
+
+        fn = getattr(self.factory, method)
+        results, errors = [], {}
+        for n, args in enumerate(items):
+            try:
+                results.append(plain(fn(*args)))
+            except Exception as e:
+                results.append(None)
+                errors[n] = error_info(e)
+
+            if n % BATCH_CHUNK == BATCH_CHUNK - 1:
+                await asyncio.sleep(0) # <- Let working robots (and other clients) have a turn
+
+        return {'results': results, 'errors': errors}
+
+    def leaderboard_page(self, page=0, per_page=20):
+        """ One page of the leaderboard as a list of [rank, robot name, tasks completed]. """
+
+        leaderboard = self.factory.leaderboard
+        return [[leaderboard.rank(name), name, count] for name, count in leaderboard.page(page, per_page)]
+
+    def status(self):
+        return {
+            'robots': self.factory.robot_count(),
+            'busy_robots': self.factory.executor.busy_count,
+            'tasks_dropped': self.factory.tasks_dropped,
+            'handler_pool': self.factory.executor.handler_pool.stats(),
+            'connections': self.connections,
+            'requests': self.requests,
+        }
+
+
+def plain(result):
+    """ Robots themselves are not JSON, a method returning one (add_robot) or a list of them (create_robots) answers with names. """
+
+    if isinstance(result, Robot):
+        return result.name
+    if isinstance(result, list) and result and isinstance(result[0], Robot):
+        return [robot.name for robot in result]
+    return result
+
+
+def error_info(e):
+    """ JSON friendly description of an exception, see client.FactoryClient for the other end. """
+
+    message = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+    return {'type': e.__class__.__name__, 'message': str(message)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the robot factory over the network (JSON lines).')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on (default: %(default)s)')
+    parser.add_argument('--save-path', default='robot_save', help='base name of the save files (default: %(default)s)')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='multiplier on task durations (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    factory = RobotFactory(args.save_path)
+    factory.executor.time_scale = args.time_scale
+    factory.open()
+
+    # Ctrl+C and a plain kill both stop the server the same way, saving the robots on the way out
+    stopped = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stopped.set())
+
+    # A kill -HUP reloads tasks.json, the same as the reload_tasks method
+    reload_requested = threading.Event()
+    if hasattr(signal, 'SIGHUP'): # <- Not on Windows
+        signal.signal(signal.SIGHUP, lambda *args: reload_requested.set())
+
+    server = FactoryServer(factory, args.host, args.port).start()
+    print('Robot factory listening on {0}:{1}, press Ctrl+C to stop'.format(args.host, server.port))
+    try:
+        while not stopped.wait(1):
+            if reload_requested.is_set():
+                reload_requested.clear()
+                try:
+                    print('Task definitions reloaded, now at version {0}'.format(factory.reload_tasks()))
+                except (IOError, ValueError) as e:
+                    print('Task definitions could not be reloaded, keeping the current ones: {0}'.format(e))
+    finally:
+        server.stop()
+        factory.close()
+        print('\n*** Your robots have been saved, goodbye! ***\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Sharded robot factory, robots are partitioned by a hash of their name across worker processes.
+
+Each worker process runs its own RobotFactory (robots, leaderboard, executor and save files) for its shard of
+the robots, so bookkeeping for a huge fleet is spread across cores instead of being capped at one by the GIL.
+The ShardedFactory front end routes per-robot calls to the owning shard and merges factory-wide results.
+"""
+
+import heapq
+import multiprocessing
+import threading
+import zlib
+
+
+# RobotFactory methods a shard worker will run on behalf of the front end
+SHARD_METHODS = (
+    'add_robot',
+    'remove_robot',
+    'retire_robots',
+    'queue_task',
+    'robot_info',
+    'submit',
+    'capable_robot_count',
+    'top_robots',
+    'robot_names',
+    'robot_count',
+)
+
+
+def shard_of(robot_name, num_shards):
+    """ Shard owning a robot, crc32 is used (not hash()) so every process and every run agrees. """
+    return zlib.crc32(robot_name.encode('utf-8')) % num_shards
+
+
+def _run_shard(save_path, time_scale, conn):
+    """ Worker process main loop, owns one RobotFactory and answers (method, args) requests until told to close. """
+
+    # Imported here so the spawned process loads the factory (and its class-level robots) fresh
+    from robot_factory import RobotFactory
+
+    factory = RobotFactory(save_path)
+    factory.executor.time_scale = time_scale
+    factory.open()
+
+    while True:
+        method, args = conn.recv()
+        if method == 'close':
+            factory.close()
+            conn.send(('ok', None))
+            break
+
+        try:
+            if method not in SHARD_METHODS:
+                raise AttributeError('Shards do not support {0}'.format(method))
+            conn.send(('ok', getattr(factory, method)(*args)))
+        except Exception as e:
+            conn.send(('error', e))
+
+    conn.close()
+
+
+class ShardedFactory(object):
+    """ Headless factory front end spreading robots over num_shards worker processes (save files are save_path.shardN). """
+
+    def __init__(self, num_shards=None, save_path='robot_save', time_scale=1.0):
+        self.num_shards = num_shards or multiprocessing.cpu_count()
+        self.save_path = save_path
+        self.time_scale = time_scale
+
+        self._processes = []
+        self._conns = []
+        self._locks = [] # <- One per shard, a request and its reply must not interleave with another thread's
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def open(self):
+        """ Starts one worker process per shard, each loads its own save. """
+
+        # spawn, not fork, so workers never inherit this process's class-level robots
+        context = multiprocessing.get_context('spawn')
+        for shard in range(self.num_shards):
+            parent_conn, child_conn = context.Pipe()
+            save_path = '{0}.shard{1}'.format(self.save_path, shard)
+            process = context.Process(target=_run_shard, args=(save_path, self.time_scale, child_conn),
+                                      name='robot-shard-{0}'.format(shard), daemon=True)
+            process.start()
+            self._processes.append(process)
+            self._conns.append(parent_conn)
+            self._locks.append(threading.Lock())
+        return self
+
+    def close(self):
+        """ Every shard stops its robots and saves, then the worker processes exit. """
+
+        self._broadcast('close')
+        for process in self._processes:
+            process.join()
+        self._processes, self._conns, self._locks = [], [], []
+
+    ### Talking to the shards
+
+    def _call(self, shard, method, *args):
+        with self._locks[shard]:
+            self._conns[shard].send((method, args))
+            return self._result(self._conns[shard].recv())
+
+    def _broadcast(self, method, *args):
+        """ Sends the same request to every shard at once and collects the replies in shard order. """
+
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            for conn in self._conns:
+                conn.send((method, args))
+            # Every reply is read before raising the first error, one left in a pipe would answer the next request
+            replies = [conn.recv() for conn in self._conns]
+            return [self._result(reply) for reply in replies]
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+    @staticmethod
+    def _result(reply):
+        status, value = reply
+        if status == 'error':
+            raise value
+        return value
+
+    def _owner(self, robot_name):
+        return shard_of(robot_name, self.num_shards)
+
+    ### Routed to the owning shard
+
+    def add_robot(self, robot_name, robot_type, num_tasks=5):
+        """ Creates a robot on the shard that owns its name, returns the shard number. """
+
+        shard = self._owner(robot_name)
+        self._call(shard, 'add_robot', robot_name, robot_type, num_tasks)
+        return shard
+
+    def remove_robot(self, robot_name):
+        self._call(self._owner(robot_name), 'remove_robot', robot_name)
+
+    def queue_task(self, robot_name, task, count=1, priority=0):
+        self._call(self._owner(robot_name), 'queue_task', robot_name, task, count, priority)
+
+    def robot_info(self, robot_name):
+        """ Same as RobotFactory.robot_info, the rank is within the robot's shard. """
+        return self._call(self._owner(robot_name), 'robot_info', robot_name)
+
+    ### Merged across shards
+
+    def submit(self, task_description, count=1, priority=0):
+        """ Splits the runs between shards in proportion to how many capable robots each has, then every shard
+        load-balances its part over its own robots. Returns a dict of robot name -> runs assigned. """
+
+        capable = self._broadcast('capable_robot_count', task_description)
+        total = sum(capable)
+        if not total:
+            raise ValueError('There are no robots that can {0}'.format(task_description))
+
+        # Largest remainder split so the shares add up to count exactly
+        shares = [count * n // total for n in capable]
+        remainders = sorted(range(self.num_shards), key=lambda shard: -(count * capable[shard] % total))
+        for shard in remainders[:count - sum(shares)]:
+            shares[shard] += 1
+
+        assigned = {}
+        for shard, share in enumerate(shares):
+            if share:
+                assigned.update(self._call(shard, 'submit', task_description, share, priority))
+        return assigned
+
+    def retire_robots(self, robot_type=None, max_completed=None, idle_for=None):
+        """ Every shard retires its own matching robots (see RobotFactory.retire_robots), returns all their names. """
+        return [name for names in self._broadcast('retire_robots', robot_type, max_completed, idle_for) for name in names]
+
+    def top_robots(self, k=10):
+        """ Merges the top k of every shard into the factory-wide top k. """
+
+        shard_tops = self._broadcast('top_robots', k)
+        return heapq.nlargest(k, (entry for top in shard_tops for entry in top), key=lambda entry: entry[1])
+
+    def robot_names(self):
+        return [name for names in self._broadcast('robot_names') for name in names]
+
+    def robot_count(self):
+        return sum(self._broadcast('robot_count'))
@@ -0,0 +1,295 @@
+"""
+Headless simulation of the robot factory, runs robots against a virtual clock instead of sleeping.
+
+Example (two days of work for 100 robots of every type):
+    python3 src/simulation.py --all 100 --duration 172800
+
+With --seed every robot draws its tasks from its own seeded stream (see robots.seed_tasks) so a run can be repeated
+exactly, --record writes its workload to an event log that replay.py can run again.
+"""
+
+from __future__ import print_function
+
+import argparse
+import heapq
+import json
+import random
+import time
+from collections import OrderedDict
+
+import upgrades
+from robots import ROBOT_TYPES, seed_tasks
+
+
+class VirtualClock(object):
+    """ Simulated clock, time only moves when the simulation jumps to the next task completion. """
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def advance_to(self, when):
+        """ Jumps forward in time, the clock never moves backwards. """
+
+        if when > self.now:
+            self.now = when
+        return self.now
+
+
+class Simulation(object):
+    """ Runs a scenario of robots headlessly, every robot works through its tasks_to_perform queue
+    and the clock jumps straight to the next task completion (a discrete event simulation). """
+
+    def __init__(self, scenario, tasks_per_robot=5, duration=86400, refill=True, clock=None, analytics=None,
+                 upgrade_every=None, upgrade_bays=None, event_log=None):
+        """ scenario maps a ROBOT_TYPES key to the number of robots of that type to create.
+        duration is in simulated seconds, refill gives robots a fresh todo list every time theirs runs out.
+        Every completion is recorded in analytics (an AnalyticsStore) if one is given, timed by the virtual clock (the
+        store can not hold completions past the clock's start, ValueError otherwise).
+        With upgrade_every the robots worth upgrading (see upgrades.plan_upgrades) are upgraded every upgrade_every
+        simulated seconds, at most upgrade_bays of them at a time.
+        Every task assigned and completed is written to event_log (a replay.EventLog) if one is given, timed by the virtual clock. """
+
+        unknown = [robot_type for robot_type in scenario if robot_type not in ROBOT_TYPES]
+        if unknown:
+            raise ValueError('Unknown robot type(s): {0}'.format(', '.join(unknown)))
+
+        self.scenario = scenario
+        self.tasks_per_robot = tasks_per_robot
+        self.duration = duration
+        self.refill = refill
+        self.clock = clock or VirtualClock()
+        if analytics is not None and analytics.last_end > self.clock.now:
+            raise ValueError('{0} already has completions up to {1}, past the start of the simulated clock '
+                             '({2})'.format(analytics.path, analytics.last_end, self.clock.now))
+        self.analytics = analytics
+        self.upgrade_every = upgrade_every
+        self.upgrade_bays = upgrade_bays
+        self.event_log = event_log
+
+        self.robots = OrderedDict()
+        self.completed = 0
+        self.upgraded = 0
+
+    def populate(self):
+        """ Creates the robots listed in the scenario, names are generated from the type (e.g. BIPEDAL-1). """
+
+        for robot_type, count in self.scenario.items():
+            names = ['{0}-{1}'.format(robot_type, n + 1) for n in range(count)]
+            for robot in ROBOT_TYPES[robot_type].create_many(names, self.tasks_per_robot):
+                self.robots[robot.name] = robot
+
+        return self.robots
+
+    def _next_task(self, robot):
+        """ Pops the next (task, eta, version, priority, deadline) of a robot, refilling its todo list if it ran out (and refill is on). """
+
+        if not robot.tasks_to_perform:
+            if not self.refill:
+                return None
+            robot.populate_todo_list(self.tasks_per_robot)
+        return robot.tasks_to_perform.pop_entry()
+
+    def _finish_time(self, robot, now, eta):
+        """ When a robot starting a task of eta seconds at now is done with it, after being upgraded first if it is due. """
+
+        if robot.retooling:
+            now += robot.retool_seconds
+            robot.finish_upgrade()
+        return now + robot.task_duration(eta)
+
+    def _upgrade_robots(self):
+        """ Upgrades the robots that gain the most until the next round of upgrades, they are retooled before their next task. """
+
+        plan = upgrades.plan_upgrades(self.robots.values(), self.upgrade_every, self.upgrade_bays, self.refill)
+        for _, robot in plan:
+            robot.request_upgrade()
+        self.upgraded += len(plan)
+
+    def run(self, top=10):
+        """ Runs the simulation until the duration is reached (or every queue is empty) and returns a report. """
+
+        if self.event_log is not None:
+            self.event_log.start(lambda: self.clock.now)
+        if not self.robots:
+            self.populate()
+
+        started = time.time()
+        end_time = self.clock.now + self.duration
+
+        # Heap of (finish time, tie breaker, robot, queue entry) for every robot's task in progress
+        events = []
+        for seq, robot in enumerate(self.robots.values()):
+            entry = self._next_task(robot)
+            if entry is not None:
+                events.append((self._finish_time(robot, self.clock.now, entry[1]), seq, robot, entry))
+        heapq.heapify(events)
+
+        next_upgrade = self.clock.now + self.upgrade_every if self.upgrade_every else None
+
+        while events and events[0][0] <= end_time:
+            finish, seq, robot, (task, eta, _, _, _) = events[0]
+            if next_upgrade is not None and finish >= next_upgrade:
+                self.clock.advance_to(next_upgrade)
+                self._upgrade_robots()
+                next_upgrade += self.upgrade_every
+
+            self.clock.advance_to(finish)
+            robot.save_finished_task(task)
+            self.completed += 1
+            if self.analytics is not None:
+                self.analytics.record(robot, task, finish - robot.task_duration(eta), finish, eta)
+
+            entry = self._next_task(robot)
+            if entry is None:
+                heapq.heappop(events)
+            else:
+                heapq.heapreplace(events, (self._finish_time(robot, finish, entry[1]), seq, robot, entry))
+
+        # Whatever is still in progress at the end goes back to the front of its robot's queue
+        for _, _, robot, (task, eta, version, priority, deadline) in events:
+            robot.tasks_to_perform.requeue(task, eta, priority, version, deadline)
+
+        if events:
+            self.clock.advance_to(end_time)
+        if self.event_log is not None:
+            self.event_log.stop()
+        return self.report(time.time() - started, top)
+
+    def report(self, wall_seconds=0.0, top=10):
+        """ Final leaderboard and throughput stats for the simulation. """
+
+        per_type = OrderedDict((robot_type, 0) for robot_type in self.scenario)
+        for robot in self.robots.values():
+            per_type[robot.robot_type.upper()] += len(robot.tasks_completed)
+
+        leaders = heapq.nlargest(top, self.robots.values(), key=lambda bot: len(bot.tasks_completed))
+        simulated = self.clock.now
+
+        return OrderedDict([
+            ('robots', len(self.robots)),
+            ('simulated_seconds', simulated),
+            ('wall_seconds', round(wall_seconds, 3)),
+            ('tasks_completed', self.completed),
+            ('tasks_per_simulated_hour', round(self.completed * 3600.0 / simulated, 2) if simulated else 0.0),
+            ('tasks_per_wall_second', round(self.completed / wall_seconds, 2) if wall_seconds else 0.0),
+            ('completed_per_type', per_type),
+            ('upgrades', self.upgraded),
+            ('leaderboard', [(bot.name, len(bot.tasks_completed)) for bot in leaders]),
+        ])
+
+
+def compare_upgrades(scenario, upgrade_every=3600, seed=None, top=10, analytics=None, event_log=None, **kwargs):
+    """ Runs the same scenario (same random tasks) without and with upgrades and reports the throughput gained.
+    kwargs are passed on to both Simulations, only the run with upgrades is recorded in analytics and event_log. """
+
+    seed = random.getrandbits(32) if seed is None else seed
+
+    seed_tasks(seed)
+    baseline = Simulation(scenario, **kwargs).run(top)
+    seed_tasks(seed)
+    report = Simulation(scenario, analytics=analytics, upgrade_every=upgrade_every, event_log=event_log, **kwargs).run(top)
+
+    report['seed'] = seed
+    report['baseline_tasks_completed'] = baseline['tasks_completed']
+    report['baseline_tasks_per_simulated_hour'] = baseline['tasks_per_simulated_hour']
+    report['throughput_gain_percent'] = round(
+        (report['tasks_completed'] - baseline['tasks_completed']) * 100.0 / baseline['tasks_completed'], 2) if baseline['tasks_completed'] else 0.0
+    return report
+
+
+def print_report(report):
+    """ Prints a simulation report in the same table-like style as the factory leaderboard. """
+
+    print("*** Simulated {0} seconds of work for {1} robots in {2} seconds ***\n".format(
+        report['simulated_seconds'], report['robots'], report['wall_seconds']))
+    print("Tasks completed:           {0}".format(report['tasks_completed']))
+    print("Tasks per simulated hour:  {0}".format(report['tasks_per_simulated_hour']))
+    print("Tasks per wall second:     {0}\n".format(report['tasks_per_wall_second']))
+
+    if 'throughput_gain_percent' in report:
+        print("Upgrades given:            {0}".format(report['upgrades']))
+        print("Without upgrades:          {0} tasks, {1} per simulated hour".format(
+            report['baseline_tasks_completed'], report['baseline_tasks_per_simulated_hour']))
+        print("Throughput gained:         {0}%\n".format(report['throughput_gain_percent']))
+    elif report.get('seed') is not None:
+        print("Seed:                      {0}\n".format(report['seed']))
+
+    for robot_type, completed in report['completed_per_type'].items():
+        print("{0:>12}: {1}".format(robot_type, completed))
+
+    print("\n*** Leaderboard for tasks completed by each robot ***\n")
+    print("   Tasks | Robot")
+    print("---------|----------")
+    for name, completed in report['leaderboard']:
+        print("{0:>8} | {1}".format(completed, name))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run a headless robot factory simulation on a virtual clock.')
+    parser.add_argument('robots', nargs='*', metavar='TYPE=COUNT',
+                        help='number of robots per type, e.g. BIPEDAL=10 ARACHNID=5')
+    parser.add_argument('--all', type=int, default=0, metavar='COUNT', help='number of robots of every type')
+    parser.add_argument('--tasks', type=int, default=5, help='tasks assigned to a robot each time its todo list runs out')
+    parser.add_argument('--duration', type=float, default=86400, help='simulated seconds to run for')
+    parser.add_argument('--no-refill', action='store_true', help='stop robots once their first todo list is done')
+    parser.add_argument('--top', type=int, default=10, help='number of robots to show on the leaderboard')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--analytics', metavar='PATH', help='record every completion in an analytics directory (needs NumPy)')
+    parser.add_argument('--upgrades', action='store_true', help='upgrade robots as they earn it and compare with a run without upgrades')
+    parser.add_argument('--upgrade-every', type=float, default=3600, help='simulated seconds between rounds of upgrades')
+    parser.add_argument('--bays', type=int, help='most robots upgraded in one round (default: no limit)')
+    parser.add_argument('--seed', type=int, help='random seed, the same seed gives the same simulation (default: a random one)')
+    parser.add_argument('--record', metavar='PATH', help='write every task assigned and completed to an event log (see replay.py)')
+    return parser.parse_args(argv)
+
+
+def build_scenario(args):
+    """ Turns the command line arguments into a scenario dict of robot type -> count. """
+
+    scenario = OrderedDict((robot_type, args.all) for robot_type in ROBOT_TYPES if args.all)
+    for item in args.robots:
+        robot_type, _, count = item.partition('=')
+        scenario[robot_type.upper()] = int(count or 1)
+    return scenario
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenario = build_scenario(args)
+    if not scenario:
+        raise SystemExit('Nothing to simulate, give robot counts (e.g. BIPEDAL=10) or --all COUNT')
+
+    analytics = None
+    if args.analytics:
+        from analytics import AnalyticsStore # <- Only needed (along with NumPy) when asked for
+        analytics = AnalyticsStore(args.analytics)
+        if len(analytics): # <- Simulated times start over at 0, they can not follow the completions already there
+            raise SystemExit('{0} already has completions, record every simulation in a directory of its own'.format(
+                args.analytics))
+
+    # Seeded either way so every run can be repeated, the seed is part of the report
+    seed = random.getrandbits(32) if args.seed is None else args.seed
+
+    options = dict(tasks_per_robot=args.tasks, duration=args.duration, refill=not args.no_refill, upgrade_bays=args.bays)
+    event_log = None
+    if args.record:
+        from replay import EventLog
+        event_log = EventLog(args.record, scenario=scenario, upgrade_every=args.upgrade_every if args.upgrades else None, **options)
+
+    if args.upgrades:
+        report = compare_upgrades(scenario, args.upgrade_every, seed, args.top, analytics, event_log, **options)
+    else:
+        seed_tasks(seed)
+        report = Simulation(scenario, analytics=analytics, event_log=event_log, **options).run(top=args.top)
+        report['seed'] = seed
+    if analytics is not None:
+        analytics.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+import os
+import pickle
+import struct
+import threading
+import time
+
+from utils import load_from_pickle
+
+
+# The snapshot file ends with the offset of its index, packed as an unsigned 64 bit int
+INDEX_OFFSET = struct.Struct('<Q')
+
+
+def capture_robots(robots):
+    """ (names, robots to pickle, index of robots unchanged since the snapshot) for a RobotRegistry or a plain dict. """
+
+    if hasattr(robots, 'capture'):
+        return robots.capture()
+    return list(robots.keys()), dict(robots), {}
+
+
+class RobotStore(object):
+    """ Append-only storage for robots. Every change (create, destroy, task completed) is written to a
+    write-ahead log, which is periodically compacted into a snapshot of all robots.
+
+    Both files start with a generation number, a log is only replayed on top of the snapshot with the same
+    generation, so a crash half way through a compaction can never apply the same events twice.
+
+    The snapshot holds every robot pickled on its own followed by an index (robot name -> type, offset, length and
+    completed task count), so loading only reads the index and robots are unpickled on demand (see RobotRegistry). """
+
+    def __init__(self, path='robot_save', fsync_interval=1.0, compact_after=50000):
+        self.wal_fn = path + '.wal'
+        self.snapshot_fn = path + '.snapshot'
+        self.legacy_fn = path + '.pkl' # <- Older saves, everything pickled into one file
+
+        self.fsync_interval = fsync_interval # <- Seconds of events that can be lost when crashing between saves
+        self.compact_after = compact_after # <- Number of logged events after which a save also writes a new snapshot
+
+        self.generation = 0
+        self.logged_events = 0 # <- Events in the log since the last snapshot
+
+        self.autoflush = True # <- Write due events from whichever thread records them, an Autosaver turns this off
+
+        self._pending = [] # <- Events recorded but not written to the log yet
+        self._lock = threading.Lock() # <- Guards self._pending, only ever held for a moment
+        self._io_lock = threading.RLock() # <- One writer of the save files at a time
+        self._last_sync = time.time()
+        self._needs_snapshot = False
+
+    ### Recording events
+
+    def record_create(self, robot):
+        self._record(('create', robot.name, robot.robot_type.upper()))
+
+    def record_create_many(self, robots):
+        """ A single record per robot type for a batch of new robots, instead of a create event each. """
+
+        by_type = {}
+        for robot in robots:
+            by_type.setdefault(robot.robot_type.upper(), []).append(robot.name)
+        self._record_many([('create_many', names, robot_type) for robot_type, names in by_type.items()])
+
+    def record_destroy(self, robot_name):
+        self._record(('destroy', robot_name))
+
+    def record_destroy_many(self, robot_names):
+        """ A single tombstone for many destroyed robots, instead of a destroy event each. """
+        self._record(('destroy_many', list(robot_names)))
+
+    def record_destroy_all(self):
+        """ Tombstone for every robot at once, the next save writes a new (near empty) snapshot to free the disk space. """
+
+        self._record(('destroy_all', None))
+        self._needs_snapshot = True
+
+    def record_queues(self, queues):
+        """ Logs (robot name, WorkQueue) pairs, e.g. on shutdown so queued and half done tasks survive a restart. """
+        self._record_many([('queue', name, queue) for name, queue in queues])
+
+    def record_upgrade(self, robot_name, level):
+        self._record(('upgrade', robot_name, level))
+
+    def record_task(self, robot, task):
+        """ Meant to be used as a Robot.task_listeners callable. """
+        self._record(('task', robot.name, task))
+
+    def _record(self, event):
+        self._record_many((event,))
+
+    def _record_many(self, events):
+        with self._lock:
+            self._pending.extend(events)
+            # Keep the amount of work that could be lost in a crash to the fsync window
+            due = self.autoflush and time.time() - self._last_sync >= self.fsync_interval
+
+        if due:
+            self.flush()
+
+    def _take_pending(self):
+        with self._lock:
+            events, self._pending = self._pending, []
+        return events
+
+    ### Saving
+
+    @property
+    def needs_compaction(self):
+        return self._needs_snapshot or self.logged_events >= self.compact_after
+
+    def flush(self):
+        """ Appends every pending event to the log and fsyncs it, costs only what happened since the last flush. """
+
+        with self._io_lock:
+            self._append_to_log(self._take_pending())
+
+    def save(self, robots):
+        """ Writes only the events since the last save, a new snapshot is written once the log has grown large enough. """
+
+        with self._io_lock:
+            self.flush()
+            if self.needs_compaction:
+                self.compact(robots)
+
+    def compact(self, robots, capture=None):
+        """ Writes a snapshot of all the given robots and starts a new, empty log.
+
+        Only taking a consistent copy of the robots happens through capture, a function that runs another function
+        where it can not race with working robots (e.g. TaskExecutor.call_sync). With a RobotRegistry that copy only
+        covers the robots that changed since the last snapshot, all the pickling and writing happens on the calling
+        thread, so a background compaction barely holds up robots at all. """
+
+        with self._io_lock:
+            def take_copy():
+                # Events up to this point are part of the copy, anything recorded afterwards goes into the new log
+                return self._take_pending(), capture_robots(robots)
+
+            events, (names, copies, index) = capture(take_copy) if capture else take_copy()
+
+            # Snapshot first, then the new log, a crash between the two leaves a stale log which load ignores
+            self._append_to_log(events)
+            new_index = self._write_snapshot(names, copies, index)
+            if hasattr(robots, 'moved_snapshot'):
+                robots.moved_snapshot(self.snapshot_fn, new_index)
+
+            self.generation += 1
+            self._start_log()
+            self._needs_snapshot = False
+
+            # Whatever was recorded while the snapshot was written
+            self.flush()
+
+    def _append_to_log(self, events):
+        """ Appends events to the log and fsyncs it, must be called with the io lock held. """
+
+        self._last_sync = time.time()
+        if not events:
+            return
+
+        if not os.path.exists(self.wal_fn):
+            self._start_log()
+
+        data = b''.join(pickle.dumps(event, protocol=2) for event in events)
+        with open(self.wal_fn, 'ab') as wal_file:
+            wal_file.write(data)
+            wal_file.flush()
+            os.fsync(wal_file.fileno())
+
+        self.logged_events += len(events)
+
+    def _start_log(self):
+        """ Atomically replaces the log with an empty one for the current generation. """
+
+        tmp_fn = self.wal_fn + '.tmp'
+        with open(tmp_fn, 'wb') as wal_file:
+            pickle.dump(('wal', self.generation), wal_file, protocol=2)
+            wal_file.flush()
+            os.fsync(wal_file.fileno())
+        os.replace(tmp_fn, self.wal_fn)
+        self.logged_events = 0
+
+    def _write_snapshot(self, names, copies, index):
+        """ Writes the next generation's snapshot, robots in copies are pickled and every other robot's bytes are
+        copied over from the current snapshot as is (using index), without unpickling them. Returns the new index. """
+
+        tmp_fn = self.snapshot_fn + '.tmp'
+        new_index = {}
+        old_file = open(self.snapshot_fn, 'rb') if index and os.path.exists(self.snapshot_fn) else None
+        try:
+            with open(tmp_fn, 'wb') as snapshot_file:
+                pickle.dump(('snapshot', self.generation + 1), snapshot_file, protocol=2)
+
+                for name in names:
+                    robot = copies.get(name)
+                    if robot is None:
+                        entry = index[name]
+                        old_file.seek(entry.offset)
+                        data = old_file.read(entry.length)
+                        robot_type, completed_count, queued_count = entry.robot_type, entry.completed_count, entry.queued_count
+                    else:
+                        data = pickle.dumps(robot, protocol=2)
+                        robot_type, completed_count, queued_count = robot.robot_type, len(robot.tasks_completed), len(robot.tasks_to_perform)
+
+                    new_index[name] = (robot_type, snapshot_file.tell(), len(data), completed_count, queued_count)
+                    snapshot_file.write(data)
+
+                index_offset = snapshot_file.tell()
+                pickle.dump(new_index, snapshot_file, protocol=2)
+                snapshot_file.write(INDEX_OFFSET.pack(index_offset))
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+        finally:
+            if old_file is not None:
+                old_file.close()
+
+        os.replace(tmp_fn, self.snapshot_fn)
+        return new_index
+
+    ### Loading
+
+    def load(self, registry, robot_types):
+        """ Fills a RobotRegistry from the snapshot index and the log, robots themselves are only loaded when accessed.
+        robot_types maps the upper case robot type to its class (see robots.ROBOT_TYPES). Raises IOError when there is no save. """
+
+        if os.path.exists(self.snapshot_fn):
+            self.generation, index = self._read_index()
+            registry.attach_snapshot(self.snapshot_fn, index)
+        elif os.path.exists(self.legacy_fn):
+            # Migrate an old style save, the first save afterwards writes the new snapshot
+            registry.update((bot.name, bot) for bot in load_from_pickle(self.legacy_fn))
+            self._needs_snapshot = True
+        elif not os.path.exists(self.wal_fn):
+            raise IOError('No save found at {0}'.format(self.snapshot_fn))
+
+        if os.path.exists(self.wal_fn):
+            self._replay_log(registry, robot_types)
+
+        return registry
+
+    def summary(self):
+        """ Dict of robot name -> [robot type (upper case), completed task count] of the saved robots, taken from the
+        snapshot index and the log alone. Nothing is written, no robot is unpickled and the robot classes are not even
+        imported (unless the save is an old style one), which is what makes `main.py status` quick. """
+
+        robots = {}
+        generation = 0
+        if os.path.exists(self.snapshot_fn):
+            generation, index = self._read_index()
+            robots = dict((name, [entry[0].upper(), entry[3]]) for name, entry in index.items())
+        elif os.path.exists(self.legacy_fn):
+            robots = dict((bot.name, [bot.robot_type.upper(), len(bot.tasks_completed)]) for bot in load_from_pickle(self.legacy_fn))
+
+        events = self._read_objects(self.wal_fn) if os.path.exists(self.wal_fn) else []
+        if not events or events[0] != ('wal', generation):
+            return robots # <- Only a stale log, already part of the snapshot
+
+        for event in events[1:]:
+            kind, name = event[0], event[1]
+            if kind == 'task':
+                if name in robots:
+                    robots[name][1] += 1
+            elif kind == 'create':
+                robots.setdefault(name, [event[2], 0])
+            elif kind == 'create_many':
+                for robot_name in name:
+                    robots.setdefault(robot_name, [event[2], 0])
+            elif kind == 'destroy':
+                robots.pop(name, None)
+            elif kind == 'destroy_many':
+                for robot_name in name:
+                    robots.pop(robot_name, None)
+            elif kind == 'destroy_all':
+                robots = {}
+
+        return robots
+
+    def _read_index(self):
+        """ Reads the generation and index of the snapshot without touching any of the pickled robots. """
+
+        with open(self.snapshot_fn, 'rb') as snapshot_file:
+            _, generation = pickle.load(snapshot_file) # <- ('snapshot', generation) header
+            snapshot_file.seek(-INDEX_OFFSET.size, os.SEEK_END)
+            index_offset, = INDEX_OFFSET.unpack(snapshot_file.read(INDEX_OFFSET.size))
+            snapshot_file.seek(index_offset)
+            index = pickle.load(snapshot_file)
+
+        return generation, index
+
+    def _replay_log(self, registry, robot_types):
+        events = self._read_objects(self.wal_fn, truncate_torn_tail=True)
+        if not events or events[0] != ('wal', self.generation):
+            # Left over from before the latest snapshot, everything in it is already in the snapshot
+            with self._lock:
+                self._start_log()
+            return
+
+        for event in events[1:]:
+            kind, name = event[0], event[1]
+            if kind == 'task':
+                if name in registry: # <- Robots can finish a task right as they are destroyed
+                    registry.add_finished_task(name, event[2])
+            elif kind == 'create':
+                if name not in registry: # <- Already in the snapshot if it was created while the snapshot was taken
+                    registry[name] = robot_types[event[2]](name, num_tasks=0)
+            elif kind == 'create_many':
+                robot_class = robot_types[event[2]]
+                registry.add_many([robot_class(robot_name, num_tasks=0) for robot_name in name if robot_name not in registry])
+            elif kind == 'destroy':
+                registry.pop(name, None)
+            elif kind == 'destroy_many':
+                registry.remove_many(name) # <- The names, see record_destroy_many
+            elif kind == 'destroy_all':
+                registry.clear()
+            elif kind == 'queue':
+                if name in registry:
+                    registry[name].tasks_to_perform = event[2]
+            elif kind == 'upgrade':
+                if name in registry: # <- Upgrades are rare, loading the robot to apply one is fine
+                    registry[name].upgrade_level = event[2]
+
+        self.logged_events = len(events) - 1
+
+    @staticmethod
+    def _read_objects(fn, truncate_torn_tail=False):
+        """ Reads every pickled object in a file, stopping at the first incomplete one (e.g. a write cut short by a crash). """
+
+        objs = []
+        with open(fn, 'rb') as pkl_file:
+            good_offset = 0
+            while True:
+                try:
+                    objs.append(pickle.load(pkl_file))
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, AttributeError, IndexError, TypeError):
+                    break # <- A torn write at the end of the file
+                good_offset = pkl_file.tell()
+
+        # New events must never be appended after garbage
+        if truncate_torn_tail and good_offset != os.path.getsize(fn):
+            with open(fn, 'r+b') as pkl_file:
+                pkl_file.truncate(good_offset)
+
+        return objs
+
+
+class Autosaver(threading.Thread):
+    """ Saves in the background: the log is flushed every fsync_interval and compacted into a new snapshot once it
+    has grown large enough, so a crash loses at most a second of work and robots never wait on a save. """
+
+    def __init__(self, store, robots, capture=None):
+        super(Autosaver, self).__init__(name='robot-autosave', daemon=True)
+        self.store = store
+        self.robots = robots
+        self.capture = capture # <- e.g. TaskExecutor.call_sync, see RobotStore.compact
+
+        self._stopped = threading.Event()
+
+    def run(self):
+        self.store.autoflush = False # <- From now on only this thread writes the log
+        while not self._stopped.wait(self.store.fsync_interval):
+            self.checkpoint()
+
+    def checkpoint(self):
+        self.store.flush()
+        if self.store.needs_compaction:
+            self.store.compact(self.robots, self.capture)
+
+    def stop(self):
+        """ Stops the thread, the log is flushed one last time (compacting is left to the final save). """
+
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+        self.store.autoflush = True
+        self.store.flush()
@@ -1,93 +1,156 @@
-# Ideally this would be manually reformatted to reduce the extra formatting but left as is for now
-base_tasks_orig = [
-  {
-    'description': 'do the dishes',
-    'eta': 1000,
-  },{
-    'description': 'sweep the house',
-    'eta': 3000,
-  },{
-    'description': 'do the laundry',
-    'eta': 10000,
-  },{
-    'description': 'take out the recycling',
-    'eta': 4000,
-  },{
-    'description': 'make a sammich',
-    'eta': 7000,
-  },{
-    'description': 'mow the lawn',
-    'eta': 20000,
-  },{
-    'description': 'rake the leaves',
-    'eta': 18000,
-  },{
-    'description': 'give the dog a bath',
-    'eta': 14500,
-  },{
-    'description': 'bake some cookies',
-    'eta': 8000,
-  },{
-    'description': 'wash the car',
-    'eta': 20000,
-  },
-]
-
-# Reogranize the above tasks for simpler use in the program
-reformatted_tasks = {i['description']:i['eta'] for i in base_tasks_orig}
-
-### Easily add new tasks to either the base list or specific types by modifying the corresponding dictionaries
-
-### Base tasks (see also reformatted_tasks above)
-base_tasks = {
-  'practice beep-boxing': 8000
-}
-base_tasks.update(reformatted_tasks)
-
-
-### UNIPEDAL specific tasks
-unipedal_tasks = {
-    'show off with a balancing act': 9000,
-    'act like a unicycle': 5000,
-    }
-unipedal_tasks.update(base_tasks)
-
-
-### BIPEDAL specific tasks
-bipedal_tasks = {
-    'do some squats': 9000,
-    'kick a soccer ball': 2000,
-    }
-bipedal_tasks.update(base_tasks)
-
-
-### QUADRUPEDAL specific tasks
-quadrupedal_tasks = {
-    'run around like a cheetah': 9000,
-    'kick two soccer balls at once': 2000,
-    }
-quadrupedal_tasks.update(base_tasks)
-
-
-### ARACHNID specific tasks
-arachnid_tasks = {
-    'walk around creepily': 22000,
-    'kick four soccer balls at once': 2000,
-    }
-arachnid_tasks.update(base_tasks)
-
-
-### RADIAL specific tasks
-radial_tasks = {
-    'spin really fast': 12000,
-    'do an interesting "dance"?': 19000,
-    }
-radial_tasks.update(base_tasks)
-
-
-### AERONAUTICAL specific tasks
-aeronautical_tasks = {
-    'fly around and do barrel rolls': 17000,
-    'partake in a synchronized flying routine': 25000,
-    }
-aeronautical_tasks.update(base_tasks)
\ No newline at end of file
+"""
+Task definitions, loaded from tasks.json (descriptions mapped to etas in milliseconds).
+
+Every robot type can perform the base tasks plus its own, edit tasks.json and bump its version to change them,
+running factories pick the changes up with RobotFactory.reload_tasks (no restart needed). The loaded definitions
+are a TaskTable, indexed by task, by robot type and by eta, which is cached already built (see load).
+"""
+
+import os
+import pickle
+from bisect import bisect_left, bisect_right
+
+
+TASKS_FN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tasks.json')
+CACHE_FN = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'tasks.table.pickle')
+CACHE_FORMAT = 1 # <- Bump whenever TaskTable changes, older caches are then ignored
+
+ROBOT_TYPE_NAMES = ('UNIPEDAL', 'BIPEDAL', 'QUADRUPEDAL', 'ARACHNID', 'RADIAL', 'AERONAUTICAL')
+
+
+class TaskTable(object):
+    """ One version of the task definitions, never changed once built (a reload builds a new table). """
+
+    def __init__(self, version, base_tasks, type_tasks):
+        self.version = version
+        self.base_tasks = dict(base_tasks)
+
+        # Type specific tasks first, then the base tasks, the order they are listed in menus
+        self._by_type = {}
+        for robot_type in ROBOT_TYPE_NAMES:
+            table = dict(type_tasks.get(robot_type, {}))
+            table.update(self.base_tasks)
+            self._by_type[robot_type] = table
+
+        self._by_task = {} # <- Task description mapped to {robot type: eta} of every type that can perform it
+        for robot_type, table in self._by_type.items():
+            for task, eta in table.items():
+                self._by_task.setdefault(task, {})[robot_type] = eta
+
+        # (eta in ms, task, robot type) sorted by eta, with the etas alone alongside for binary searches
+        self._by_eta = sorted((eta, task, robot_type) for robot_type, table in self._by_type.items() for task, eta in table.items())
+        self._etas = [entry[0] for entry in self._by_eta]
+
+    def __contains__(self, task):
+        return task in self._by_task
+
+    @property
+    def all_tasks(self):
+        """ Sorted list of every task any robot type can perform. """
+        return sorted(self._by_task)
+
+    def tasks_of(self, robot_type):
+        """ Dict of task -> eta (ms) of every task a robot type (ROBOT_TYPES key) can perform. """
+        return dict(self._by_type[robot_type.upper()])
+
+    def types_for(self, task):
+        """ Dict of robot type -> eta (ms) of every robot type that can perform a task. """
+        return dict(self._by_task.get(task, {}))
+
+    def tasks_between(self, min_eta=0, max_eta=None, robot_type=None):
+        """ List of (eta in ms, task, robot type) for every task taking min_eta to max_eta ms (both included). """
+
+        start = bisect_left(self._etas, min_eta)
+        end = len(self._etas) if max_eta is None else bisect_right(self._etas, max_eta)
+        entries = self._by_eta[start:end]
+        if robot_type is not None:
+            entries = [entry for entry in entries if entry[2] == robot_type.upper()]
+        return entries
+
+
+def _check_tasks(tasks, where):
+    if not isinstance(tasks, dict):
+        raise ValueError('{0} must map task descriptions to etas'.format(where))
+    for task, eta in tasks.items():
+        if not task or not isinstance(eta, int) or isinstance(eta, bool) or eta <= 0:
+            raise ValueError('{0}: "{1}" needs a positive whole number of milliseconds, not {2!r}'.format(where, task, eta))
+
+
+def load(fn=TASKS_FN, cache_fn=CACHE_FN):
+    """ Reads and validates a tasks file into a new TaskTable, raises ValueError (or IOError) if it can not be used.
+
+    The built table is pickled to cache_fn (None for no cache) and loaded from there for as long as the file keeps
+    the same size and modification time, so most starts skip parsing (and importing json) and indexing entirely. """
+
+    stat = os.stat(fn)
+    key = (CACHE_FORMAT, os.path.abspath(fn), stat.st_size, stat.st_mtime_ns)
+
+    table = _read_cache(cache_fn, key) if cache_fn else None
+    if table is None:
+        table = _parse(fn)
+        if cache_fn:
+            _write_cache(cache_fn, key, table)
+    return table
+
+
+def _parse(fn):
+    import json # <- Only needed when the cache is out of date
+
+    with open(fn) as tasks_file:
+        data = json.load(tasks_file)
+
+    if not isinstance(data, dict):
+        raise ValueError('{0} must hold an object with a version, base tasks and types'.format(fn))
+    version = data.get('version')
+    if not isinstance(version, int):
+        raise ValueError('{0} needs a whole number version'.format(fn))
+
+    _check_tasks(data.get('base', {}), 'base')
+    types = data.get('types', {})
+    if not isinstance(types, dict):
+        raise ValueError('types must map robot types to their tasks')
+    unknown = [robot_type for robot_type in types if robot_type not in ROBOT_TYPE_NAMES]
+    if unknown:
+        raise ValueError('Unknown robot type(s): {0}'.format(', '.join(unknown)))
+    for robot_type, tasks in types.items():
+        _check_tasks(tasks, robot_type)
+
+    return TaskTable(version, data.get('base', {}), types)
+
+
+def _read_cache(cache_fn, key):
+    try:
+        with open(cache_fn, 'rb') as cache_file:
+            cached_key, table = pickle.load(cache_file)
+    except Exception:
+        return None # <- Missing, half written or from an incompatible version, the tasks file is parsed instead
+    return table if cached_key == key else None
+
+
+def _write_cache(cache_fn, key, table):
+    tmp_fn = '{0}.{1}.tmp'.format(cache_fn, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_fn), exist_ok=True)
+        with open(tmp_fn, 'wb') as cache_file:
+            pickle.dump((key, table), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_fn, cache_fn)
+    except OSError:
+        pass # <- e.g. a read-only install, the tasks file is simply parsed every time
+
+
+def use(table):
+    """ Makes a table the current one (TABLE and the module level dicts below), see RobotFactory.reload_tasks. """
+
+    global TABLE, base_tasks, unipedal_tasks, bipedal_tasks, quadrupedal_tasks, arachnid_tasks, radial_tasks, aeronautical_tasks
+
+    TABLE = table
+    base_tasks = table.base_tasks
+    unipedal_tasks = table.tasks_of('UNIPEDAL')
+    bipedal_tasks = table.tasks_of('BIPEDAL')
+    quadrupedal_tasks = table.tasks_of('QUADRUPEDAL')
+    arachnid_tasks = table.tasks_of('ARACHNID')
+    radial_tasks = table.tasks_of('RADIAL')
+    aeronautical_tasks = table.tasks_of('AERONAUTICAL')
+
+
+use(load())
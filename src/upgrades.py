@@ -0,0 +1,96 @@
+"""
+Robot speed upgrades and the scheduler that decides which robots are worth upgrading.
+
+Robots earn an upgrade point for every TASKS_PER_POINT tasks they complete and spend them on their own upgrades, the
+next level costs one point more than the last. Every level multiplies a robot's task durations by
+Robot.upgrade_speedup, but the robot stops working for Robot.retool_seconds while it is upgraded. Whether that pays
+off depends on how much work it has lined up and how long its tasks are, which is what plan_upgrades weighs.
+
+Example (how much faster a day of work gets done with upgrades, see simulation.py):
+    python3 src/simulation.py --all 100 --duration 86400 --upgrades
+"""
+
+import heapq
+
+
+TASKS_PER_POINT = 10 # <- Completed tasks needed to earn one upgrade point
+
+
+def upgrade_cost(level):
+    """ Points needed to go from level to level + 1. """
+    return level + 1
+
+
+def target_level(robot):
+    """ Level the robot is at once any upgrade it was given is done. """
+    return robot.upgrade_level + robot.retooling
+
+
+def points(robot):
+    """ Upgrade points a robot has left, earned with its completed tasks minus what its upgrades cost so far. """
+
+    level = target_level(robot)
+    return len(robot.tasks_completed) // TASKS_PER_POINT - level * (level + 1) // 2
+
+
+def can_upgrade(robot):
+    level = target_level(robot)
+    return level < robot.max_upgrade_level and points(robot) >= upgrade_cost(level)
+
+
+def mean_task_eta(robot):
+    """ Average eta (seconds, before upgrades) of the robot's queued tasks, or of every task it can do when nothing is queued. """
+
+    queue = robot.tasks_to_perform
+    if queue:
+        return queue.total_eta / float(len(queue))
+    return sum(robot.task_etas.values()) / float(len(robot.task_etas))
+
+
+def upgrade_gain(robot, horizon=3600, refill=False):
+    """ Extra tasks the robot would complete within the next horizon seconds if it were upgraded one level right now.
+
+    The robot works through its queue at its current speed, or through the same work faster after retool_seconds
+    of downtime. With refill the queue is assumed to never run dry (as in a simulation that keeps handing out work),
+    otherwise a robot that gets through its queue within the horizon either way gains nothing. Can be negative. """
+
+    eta = mean_task_eta(robot)
+    if not eta:
+        return 0.0
+
+    level = target_level(robot)
+    work = None if refill else robot.tasks_to_perform.total_eta # <- Seconds of work queued, before upgrades
+
+    def tasks_done(level, downtime):
+        factor = robot.upgrade_speedup ** level
+        seconds = max(horizon - downtime, 0)
+        if work is not None:
+            seconds = min(seconds, work * factor)
+        return seconds / (eta * factor)
+
+    return tasks_done(level + 1, robot.retool_seconds) - tasks_done(level, 0)
+
+
+def plan_upgrades(robots, horizon=3600, bays=None, refill=False):
+    """ List of (gain, robot) for the robots worth upgrading, the largest gain in tasks over the horizon first.
+
+    Only robots with enough points whose upgrade pays off within the horizon are considered, bays caps the number
+    of robots upgraded at once (None for no limit). Summing the gains over the horizon gives the extra fleet
+    throughput in tasks per second (see throughput_gain). """
+
+    candidates = []
+    for robot in robots:
+        if can_upgrade(robot):
+            gain = upgrade_gain(robot, horizon, refill)
+            if gain > 0:
+                candidates.append((gain, robot))
+
+    key = lambda candidate: candidate[0]
+    if bays is None:
+        return sorted(candidates, key=key, reverse=True)
+    return heapq.nlargest(bays, candidates, key=key)
+
+
+def throughput_gain(plan, horizon=3600):
+    """ Extra tasks per second the whole fleet completes over the horizon with a plan from plan_upgrades. """
+    return sum(gain for gain, _ in plan) / float(horizon)
@@ -1,14 +1,30 @@
 from __future__ import print_function
 from builtins import input
 
-import os
+import gc
 import pickle
+from contextlib import contextmanager
+
+from display import clear_screen
 
 
 def clear_console():
-    """ Simply runs the clear/cls command on the console to make it easier to read what is going on. """
+    """ Clears the console to make it easier to read what is going on, with an ANSI sequence rather than a clear/cls shell. """
+
+    clear_screen()
+
 
-    os.system('cls' if os.name == 'nt' else 'clear')
+@contextmanager
+def gc_paused():
+    """ Pauses garbage collection, creating millions of objects would otherwise trigger collection after collection. """
+
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
 
 
 def press_enter_to_continue():
@@ -43,6 +59,38 @@ def get_user_choice(choices_dict, message="Please choose from the list of optiio
             return choice, choices_dict[choice]
 
 
+def get_paged_choice(find, message, per_page=20):
+    """ Like get_user_choice for lists too long to print at once: shows a page at a time and lets the user search.
+    find(search, page, per_page) returns (items on the page, total number of matching items), search being the text
+    the user typed after a / ('' for everything). Returns the chosen item or None if the user chose to leave. """
+
+    search, page = '', 0
+    while True:
+        items, total = find(search, page, per_page)
+        num_pages = max((total + per_page - 1) // per_page, 1)
+
+        print(message)
+        print('(page {0} of {1}, {2} {3})'.format(page + 1, num_pages, total, 'matching "{0}"'.format(search) if search else 'in total'))
+        for n, item in enumerate(items): print('{0} : {1}'.format(n + 1, item))
+        print('0 : Leave')
+
+        choice = input('Your choice (N or P to flip pages, /text to search, / to show everything): ')
+        if choice == '0':
+            return None
+        if choice.isdigit() and 0 < int(choice) <= len(items):
+            return items[int(choice) - 1]
+
+        clear_console()
+        if choice.upper() == 'N':
+            page = min(page + 1, num_pages - 1)
+        elif choice.upper() == 'P':
+            page = max(page - 1, 0)
+        elif choice.startswith('/'):
+            search, page = choice[1:], 0
+        else:
+            print('*** Not a valid option! ***\n')
+
+
 def load_from_pickle(fn='robot_save.pkl'):
     """ Loads objects from pickle file and stores them in a list to send back. """
 
@@ -0,0 +1,148 @@
+import heapq
+
+
+class WorkQueue(object):
+    """ Per-robot queue of tasks waiting to be performed, a binary heap so queueing and taking the next task are O(log n).
+
+    Higher priority tasks always come first, tasks with the same priority are ordered by the queue's policy:
+    FIFO (in the order they were queued) or SHORTEST_FIRST (shortest eta first). """
+
+    __slots__ = ('policy', 'total_eta', '_heap', '_seq')
+
+    FIFO = 'fifo'
+    SHORTEST_FIRST = 'shortest'
+    POLICIES = (FIFO, SHORTEST_FIRST)
+
+    def __init__(self, policy=FIFO):
+        if policy not in self.POLICIES:
+            raise ValueError('Unknown queue policy: {0}'.format(policy))
+
+        self.policy = policy
+        self.total_eta = 0 # <- Sum of the etas of every queued task
+
+        self._heap = [] # <- Entries of [-priority, resumed flag, policy key, sequence number, task, eta, task table version, deadline]
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __bool__(self):
+        return bool(self._heap)
+
+    __nonzero__ = __bool__ # Python 2
+
+    def __iter__(self):
+        """ Queued tasks in the order they will be performed (sorts a copy, the queue is left untouched). """
+        return (entry[4] for entry in sorted(self._heap))
+
+    def __repr__(self):
+        return 'WorkQueue({0}, {1} tasks)'.format(self.policy, len(self))
+
+    def _entry(self, task, eta, priority, version, deadline, resumed=False):
+        self._seq += 1
+        key = self._seq if self.policy == self.FIFO else eta
+        return [-priority, 0 if resumed else 1, key, self._seq, task, eta, version, deadline]
+
+    def push(self, task, eta, priority=0, version=None, deadline=None):
+        heapq.heappush(self._heap, self._entry(task, eta, priority, version, deadline))
+        self.total_eta += eta
+
+    def extend(self, tasks, priority=0, version=None, deadline=None):
+        """ Queues many (task, eta) pairs at once, re-heapifying in one go when the batch is large.
+        version is the task table version (see tasks.TaskTable) the etas were taken from and deadline the time
+        (time.time()) by which the tasks must be done, they are dropped once they can not make it. """
+
+        # Same entries as self._entry would make, built inline since this is the hot path when creating robots
+        seq, fifo = self._seq, self.policy == self.FIFO
+        entries = [[-priority, 1, seq + n if fifo else eta, seq + n, task, eta, version, deadline] for n, (task, eta) in enumerate(tasks, 1)]
+        self._seq = seq + len(entries)
+
+        if not self._heap and fifo:
+            self._heap = entries # <- Sequence numbers only go up, so the batch already is a heap
+        elif len(entries) > len(self._heap):
+            self._heap.extend(entries)
+            heapq.heapify(self._heap)
+        else:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+        self.total_eta += sum([entry[5] for entry in entries]) # <- A list comprehension beats a generator on batches this small
+
+    @classmethod
+    def many(cls, task_lists, priority=0, version=None):
+        """ Yields a new FIFO queue of every list of (task, eta) pairs, built without the per queue overhead of
+        __init__ and extend (the same entries extend would make), for creating robots in bulk. """
+
+        new = cls.__new__
+        for tasks in task_lists:
+            queue = new(cls)
+            queue.policy = cls.FIFO
+            queue._heap = heap = [[-priority, 1, n, n, task, eta, version, None] for n, (task, eta) in enumerate(tasks, 1)]
+            queue._seq = len(heap) # <- Sequence numbers only go up, so the entries already are a heap
+            queue.total_eta = sum([entry[5] for entry in heap])
+            yield queue
+
+    def requeue(self, task, eta, priority=0, version=None, deadline=None):
+        """ Puts a task that was already started back in the queue, ahead of everything else with the same priority. """
+
+        heapq.heappush(self._heap, self._entry(task, eta, priority, version, deadline, resumed=True))
+        self.total_eta += eta
+
+    def pop(self):
+        """ Removes and returns the next task to perform, raises IndexError if the queue is empty. """
+
+        entry = heapq.heappop(self._heap)
+        self.total_eta -= entry[5]
+        return entry[4]
+
+    def pop_entry(self):
+        """ Like pop but returns (task, eta, task table version, priority, deadline), the eta being the one the task
+        was queued with. """
+
+        entry = heapq.heappop(self._heap)
+        self.total_eta -= entry[5]
+        return entry[4], entry[5], entry[6], -entry[0], entry[7]
+
+    def count(self, tasks):
+        """ Number of queued entries whose task is in tasks (any container), in queue order or not. """
+        return sum(1 for entry in self._heap if entry[4] in tasks)
+
+    def peek(self):
+        """ The next task to perform without removing it, None if the queue is empty. """
+        return self._heap[0][4] if self._heap else None
+
+    def peek_priority(self):
+        """ Priority of the next task to perform, None if the queue is empty. """
+        return -self._heap[0][0] if self._heap else None
+
+    def set_policy(self, policy):
+        """ Switches between FIFO and SHORTEST_FIRST, queued tasks are reordered to match. """
+
+        if policy not in self.POLICIES:
+            raise ValueError('Unknown queue policy: {0}'.format(policy))
+
+        self.policy = policy
+        for entry in self._heap:
+            entry[2] = entry[3] if policy == self.FIFO else entry[5]
+        heapq.heapify(self._heap)
+
+    def copy(self):
+        """ Independent copy holding the same tasks in the same order. """
+
+        other = WorkQueue.__new__(WorkQueue)
+        other.__setstate__(self.__getstate__())
+        other._heap = [list(entry) for entry in self._heap] # <- Entries are mutated in place by set_policy
+        return other
+
+    def __getstate__(self):
+        return {'policy': self.policy, 'total_eta': self.total_eta, '_heap': self._heap, '_seq': self._seq}
+
+    def __setstate__(self, state):
+        for attr in self.__slots__:
+            setattr(self, attr, state[attr])
+        for entry in self._heap:
+            if len(entry) < 8: # <- Queued before entries recorded the task table version and deadline
+                entry.extend([None] * (8 - len(entry)))
+
+    def clear(self):
+        self._heap = []
+        self.total_eta = 0
@@ -0,0 +1,49 @@
+import pytest
+
+numpy = pytest.importorskip('numpy') # <- Analytics are only recorded when NumPy is installed
+
+from analytics import AnalyticsStore
+from robots import Bipedal, Radial
+from simulation import Simulation
+
+
+def record_hours(store, robot, hours, start=0.0):
+    for n in range(hours):
+        end = start + (n + 1) * 3600
+        store.record(robot, 'do the dishes', end - 60, end, 60)
+
+
+def test_session_starting_over_is_refused_and_times_are_kept(tmp_path):
+    path = str(tmp_path / 'analytics')
+    store = AnalyticsStore(path)
+    record_hours(store, Bipedal('a', num_tasks=0), 3) # <- Ends at 3600, 7200 and 10800
+    store.close()
+
+    # A second simulation into the same directory, its clock starts at 0 again
+    store = AnalyticsStore(path)
+    assert store.last_end == 10800
+    with pytest.raises(ValueError):
+        record_hours(store, Radial('b', num_tasks=0), 2)
+    with pytest.raises(ValueError):
+        Simulation({'RADIAL': 1}, analytics=store)
+    store.close()
+
+    store = AnalyticsStore(path)
+    end = store.column('end')
+    assert list(end) == [3600, 7200, 10800]
+    assert list(store.column('start')) == list(end - 60)
+    assert store.completions_by_type(since=7200) == {'Bipedal': 2}
+
+
+def test_ends_are_stored_as_given(tmp_path):
+    store = AnalyticsStore(str(tmp_path / 'analytics'))
+    robot = Bipedal('a', num_tasks=0)
+    store.record(robot, 'do the dishes', 90.0, 100.0, 10)
+    with pytest.raises(ValueError):
+        store.record(robot, 'do the dishes', 89.0, 99.5, 10) # <- Behind the previous end, not moved up to it
+    store.record(robot, 'do the dishes', 100.0, 100.0, 10)
+    store.record(robot, 'do the dishes', 100.0, None, 10) # <- Ends now
+
+    end = store.column('end')
+    assert list(end[:2]) == [100.0, 100.0] and end[2] > 1e9
+    assert store.completions_by_task(since=100.0) == {'do the dishes': 3}
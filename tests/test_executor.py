@@ -0,0 +1,63 @@
+from executor import TaskExecutor
+from robots import Bipedal
+
+
+def run_on_loop(executor, fn):
+    """ Runs fn on the loop thread, so everything it schedules is handled before any robot gets to work. """
+    executor.start()
+    executor.call_sync(fn)
+    executor.call_sync(lambda: None)
+    executor.wait_idle(5)
+
+
+def test_robot_recreated_under_a_cancelled_name_is_worked():
+    executor = TaskExecutor(time_scale=0)
+    robot = Bipedal('X')
+
+    def remove_and_recreate():
+        executor.schedule(Bipedal('X'))
+        executor.cancel('X') # <- Its worker is still winding down when the next robot named X is scheduled
+        executor.schedule(robot)
+
+    try:
+        run_on_loop(executor, remove_and_recreate)
+        assert len(robot.tasks_completed) == 5
+        assert not robot.tasks_to_perform
+        assert executor.busy_robots == []
+        assert executor.idle_since('X') is not None
+    finally:
+        executor.stop()
+
+
+def test_robots_recreated_after_cancel_all_are_worked():
+    executor = TaskExecutor(time_scale=0)
+    robots = [Bipedal('X'), Bipedal('Y')]
+
+    def remove_all_and_recreate():
+        executor.schedule_many([Bipedal('X'), Bipedal('Y')])
+        executor.cancel_all()
+        executor.schedule_many(robots)
+
+    try:
+        run_on_loop(executor, remove_all_and_recreate)
+        assert [len(robot.tasks_completed) for robot in robots] == [5, 5]
+        assert executor.busy_robots == []
+    finally:
+        executor.stop()
+
+
+def test_task_queued_as_a_worker_finishes_is_worked():
+    executor = TaskExecutor(time_scale=0)
+    robot = Bipedal('X', num_tasks=0)
+
+    def enqueue_after_the_worker_returns():
+        executor.enqueue(robot, 'do the dishes', 0) # <- A worker with nothing to do, it returns on its first step
+        executor.call(executor.enqueue, robot, 'do the dishes') # <- Runs after that step, before the worker's done callback
+
+    try:
+        run_on_loop(executor, enqueue_after_the_worker_returns)
+        assert len(robot.tasks_completed) == 1
+        assert not robot.tasks_to_perform
+        assert executor.busy_robots == []
+    finally:
+        executor.stop()
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+import handlers
+from executor import TaskExecutor
+from handlers import HandlerPool, PoolFull
+from leaderboard import Leaderboard
+from registry import RobotRegistry
+from robot_factory import RobotFactory
+from robots import Bipedal
+
+TASK = 'do the dishes'
+
+
+@pytest.fixture
+def gate():
+    """ Registers a handler for TASK that holds on until the gate is set, counting its calls. """
+
+    gate = threading.Event()
+    gate.calls = 0
+
+    def handler(robot_name, task, seconds):
+        gate.calls += 1
+        gate.wait(10)
+
+    handlers.register(TASK, handler)
+    yield gate
+    gate.set()
+    handlers.unregister(TASK)
+
+
+def wait_for(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end, 'timed out'
+        time.sleep(0.01)
+
+
+def open_factory(save_path, pool):
+    factory = RobotFactory(save_path)
+    factory.robots, factory.leaderboard = RobotRegistry(), Leaderboard()
+    factory.executor = TaskExecutor(time_scale=1000, handler_pool=pool)
+    return factory.open(autosave=False, analytics=False)
+
+
+def backlog(factory):
+    """ (backlog, handler tasks the robots really have queued or in progress), the two always match. """
+
+    pool = factory.executor.handler_pool
+    robots = [factory.robots.peek(name) for name in factory.robots.keys()]
+    return factory.executor.call_sync(lambda: (pool.backlog, sum(pool.handler_tasks(robot) for robot in robots)))
+
+
+def test_queued_handler_work_is_bounded(tmp_path, gate):
+    factory = open_factory(str(tmp_path / 'robot_save'), HandlerPool(max_waiting=3, max_backlog=10))
+    pool = factory.executor.handler_pool
+    try:
+        factory.create_robots('BIPEDAL', ['a', 'b', 'c'], tasks_per_robot=0, start=False)
+
+        with pytest.raises(PoolFull):
+            factory.queue_task('a', TASK, 200000)
+        assert backlog(factory) == (0, 0)
+
+        factory.submit(TASK, 8)
+        wait_for(lambda: pool.running == 3) # <- Each robot took its first task off its queue and is stuck on it
+        assert backlog(factory) == (8, 8)
+        with pytest.raises(PoolFull):
+            factory.queue_task('a', TASK, 3)
+        factory.queue_task('a', TASK, 2)
+        with pytest.raises(PoolFull):
+            factory.submit(TASK, 1)
+        assert backlog(factory) == (10, 10)
+
+        factory.cancel_task('b', clear_queue=True) # <- Its task in progress is only given up once its handler returns
+        count, real = backlog(factory)
+        assert count == real < 10
+
+        factory.remove_robot('c')
+        count, real = backlog(factory)
+        assert count == real
+
+        gate.set()
+        factory.executor.wait_idle(5)
+        assert backlog(factory) == (0, 0)
+    finally:
+        gate.set()
+        factory.close()
+
+
+def test_starting_and_saved_tasks_count_towards_the_backlog(tmp_path, gate):
+    save_path = str(tmp_path / 'robot_save')
+    factory = open_factory(save_path, HandlerPool(max_backlog=1000))
+    try:
+        factory.create_robots('BIPEDAL', 20, tasks_per_robot=13) # <- Every task a bipedal robot can do, TASK included
+        factory.add_robot('robot-x', 'BIPEDAL', 13)
+        count, real = backlog(factory)
+        assert count == real == 21
+
+        factory.queue_task('robot-x', TASK, 10)
+        assert backlog(factory) == (count + 10, real + 10)
+    finally:
+        factory.close() # <- Every robot puts back what it was in the middle of
+
+    factory = open_factory(save_path, HandlerPool(max_backlog=1000))
+    try:
+        assert backlog(factory) == (31, 31)
+        factory.remove_all_robots()
+        assert backlog(factory) == (0, 0)
+    finally:
+        gate.set()
+        factory.close()
+
+
+def test_shutdown_drops_lined_up_handlers(gate):
+    executor = TaskExecutor(handler_pool=HandlerPool(max_workers=1, max_queued=2))
+    pool = executor.handler_pool
+    try:
+        for name in ['a', 'b', 'c']:
+            executor.enqueue(Bipedal(name, num_tasks=0), TASK)
+        wait_for(lambda: gate.calls == 1 and pool.running == 3) # <- One handler running, two lined up behind it
+
+        pool.shutdown()
+        gate.set()
+        wait_for(lambda: pool.running == 0)
+        assert gate.calls == 1
+    finally:
+        executor.stop()
@@ -0,0 +1,88 @@
+import random
+
+from leaderboard import Leaderboard
+
+
+def check(board, counts):
+    """ Compares the leaderboard to a plain dict of robot name -> completed count. """
+
+    ranked = board.page(0, len(counts) + 1)
+    assert sorted(ranked) == sorted(counts.items())
+    assert [count for _, count in ranked] == sorted(counts.values(), reverse=True)
+    for name, count in counts.items():
+        assert board.count(name) == count
+        assert board.rank(name) == 1 + sum(1 for other in counts.values() if other > count)
+
+
+def test_increments_keep_the_order():
+    board = Leaderboard()
+    board.add_many(['a', 'b', 'c'])
+    for name in ['b', 'c', 'b', 'b', 'c']:
+        board.increment(name)
+    board.increment('gone') # <- Unknown names are ignored
+
+    assert board.top(2) == [('b', 3), ('c', 2)]
+    assert board.rank('a') == 3
+    check(board, {'a': 0, 'b': 3, 'c': 2})
+
+
+def test_ties_share_a_rank():
+    board = Leaderboard()
+    board.rebuild([('a', 2), ('b', 5), ('c', 2)])
+    assert board.rank('b') == 1
+    assert board.rank('a') == board.rank('c') == 2
+    assert board.names_at_most(2) in (['a', 'c'], ['c', 'a'])
+    assert board.names_at_most(1) == []
+
+
+def test_pages():
+    board = Leaderboard()
+    board.rebuild([(str(n), n) for n in range(45)])
+    assert board.num_pages(20) == 3
+    assert [name for name, _ in board.page(2, 20)] == [str(n) for n in range(4, -1, -1)]
+
+
+def test_random_updates_match_a_plain_dict():
+    rng = random.Random(5)
+    board, counts = Leaderboard(), {}
+
+    for step in range(3000):
+        action = rng.random()
+        name = 'bot-{0}'.format(rng.randrange(200))
+        if action < 0.1:
+            board.add(name, 3)
+            counts.setdefault(name, 3)
+        elif action < 0.15:
+            board.remove(name)
+            counts.pop(name, None)
+        else:
+            board.increment(name)
+            if name in counts:
+                counts[name] += 1
+    check(board, counts)
+
+
+def test_remove_many():
+    rng = random.Random(7)
+    ranked = [('bot-{0}'.format(n), rng.randrange(30)) for n in range(500)]
+
+    def board_and_counts():
+        board = Leaderboard()
+        board.rebuild(ranked)
+        return board, dict(ranked)
+
+    # The robots with the fewest tasks (cut off the end), a couple of robots (sunk) and many robots (rebuilt)
+    for pick in (lambda board: board.names_at_most(5), lambda board: ['bot-3', 'bot-400'],
+                 lambda board: [name for name, _ in ranked[::2]] + ['unknown']):
+        board, counts = board_and_counts()
+        gone = pick(board)
+        board.remove_many(gone)
+        for name in gone:
+            counts.pop(name, None)
+        check(board, counts)
+        assert len(board) == len(counts)
+
+        board.add('late', 0)
+        board.increment('late')
+        counts['late'] = 1
+        check(board, counts)
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from name_index import NameIndex, SortedNames
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(SortedNames, 'LOAD', 4) # <- Many blocks out of few names, so splits and empty blocks happen
+
+
+def check(sorted_names, expected):
+    """ Compares the sorted names to a plain sorted list. """
+
+    expected = sorted(expected)
+    assert len(sorted_names) == len(expected)
+    assert list(sorted_names) == expected
+    for start in range(len(expected) + 1):
+        assert list(sorted_names.islice(start, start + 3)) == expected[start:start + 3]
+    for prefix in ['', 'a', 'b1', 'c', 'z']:
+        start, end = sorted_names.prefix_range(prefix)
+        assert expected[start:end] == [name for name in expected if name.startswith(prefix)]
+
+
+def test_random_adds_and_removes(small_blocks):
+    rng = random.Random(3)
+    sorted_names, expected = SortedNames(), set()
+    for _ in range(600):
+        name = rng.choice('abc') + str(rng.randrange(40))
+        if name in expected and rng.random() < 0.6:
+            sorted_names.remove(name)
+            expected.discard(name)
+        elif name not in expected:
+            sorted_names.add(name)
+            expected.add(name)
+        if rng.random() < 0.1:
+            check(sorted_names, expected)
+    check(sorted_names, expected)
+
+    sorted_names.remove('nonsense') # <- Unknown names are ignored
+    check(sorted_names, expected)
+
+
+def test_remove_many(small_blocks):
+    names = ['r{0:03}'.format(n) for n in range(100)]
+    sorted_names = SortedNames(names)
+
+    sorted_names.remove_many({'r005', 'r050'}) # <- One at a time
+    check(sorted_names, set(names) - {'r005', 'r050'})
+
+    gone = set(names[::2])
+    sorted_names.remove_many(gone) # <- Filtered in one pass
+    check(sorted_names, set(names) - gone - {'r005', 'r050'})
+
+    sorted_names.remove_many(set(names))
+    check(sorted_names, [])
+    sorted_names.add('r001')
+    check(sorted_names, ['r001'])
+
+
+def test_iterating_is_not_disturbed_by_changes(small_blocks):
+    sorted_names = SortedNames('abcdefghij')
+    names = iter(sorted_names)
+    sorted_names.remove('b')
+    sorted_names.add('bb')
+    sorted_names.remove_many(set('fghij'))
+    assert list(sorted_names) == ['a', 'bb', 'c', 'd', 'e']
+    assert list(names) == list('abcdefghij')
+
+
+def test_name_index_pages():
+    index = NameIndex()
+    for n in range(50):
+        index.add('bot{0:02}'.format(n), 'bipedal' if n % 2 else 'radial')
+    index.remove('bot03', 'bipedal')
+
+    assert index.count() == 49
+    assert index.count('BIPEDAL', prefix='bot1') == 5
+    assert index.page(1, 3, 'radial') == (['bot06', 'bot08', 'bot10'], 25)
+    assert index.page(0, 2, prefix='bot0', contains='7') == (['bot07'], 1)
+    assert list(index.names('bipedal'))[:3] == ['bot01', 'bot05', 'bot07']
+    assert list(index.names('aeronautical')) == []
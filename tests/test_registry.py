@@ -0,0 +1,82 @@
+import threading
+
+from leaderboard import Leaderboard
+from registry import RobotRegistry
+from robot_factory import RobotFactory
+from robots import Bipedal, Radial
+
+
+def changed(registry):
+    """ Names of the robots the next snapshot would pickle again (capture also starts over with none). """
+    return sorted(registry.capture()[1])
+
+
+def test_only_lookups_that_may_change_a_robot_flag_it():
+    registry = RobotRegistry()
+    registry['a'] = Bipedal('a', num_tasks=0)
+    registry['b'] = Bipedal('b', num_tasks=0)
+    assert changed(registry) == ['a', 'b']
+
+    assert registry.peek('a').name == 'a'
+    assert changed(registry) == []
+
+    registry['b'].queue_task('do the dishes')
+    assert changed(registry) == ['b']
+
+
+def test_robots_added_in_a_batch_are_indexed_and_saved():
+    registry = RobotRegistry()
+    registry['a'] = Bipedal('a', num_tasks=0)
+    changed(registry)
+    registry.add_many([Radial('a', num_tasks=0), Bipedal('b', num_tasks=0), Radial('c', num_tasks=0),
+                       Bipedal('c', num_tasks=0)])
+
+    assert sorted(registry) == ['a', 'b', 'c']
+    assert registry.peek('c').robot_type == 'Bipedal'
+    assert list(registry.names.names('radial')) == ['a']
+    assert list(registry.names.names('bipedal')) == ['b', 'c']
+    assert changed(registry) == ['a', 'b', 'c']
+
+
+def test_read_only_factory_calls_leave_robots_unchanged(tmp_path):
+    factory = RobotFactory(str(tmp_path / 'robot_save'))
+    factory.robots, factory.leaderboard = RobotRegistry(), Leaderboard()
+    factory.open(autosave=False, analytics=False)
+    try:
+        factory.executor.time_scale = 1000 # <- Nothing finishes while the test looks
+        factory.create_robots('BIPEDAL', ['a', 'b', 'c'], tasks_per_robot=0, start=False)
+        factory.store.compact(factory.robots)
+
+        factory.robot_info('a')
+        factory.robots['b'] # <- Loads it, as the submit below will, without it counting as a change
+        factory.robots.capture()
+        assert changed(factory.robots) == []
+
+        assigned = factory.submit('do the dishes', 1)
+        factory.executor.call_sync(lambda: None)
+        assert changed(factory.robots) == sorted(assigned)
+    finally:
+        factory.close()
+        factory.executor.time_scale = 1.0
+
+
+def test_capture_never_sees_a_robot_half_added():
+    registry = RobotRegistry()
+    robots = [Bipedal('robot-{0}'.format(n), num_tasks=0) for n in range(20000)]
+    done = threading.Event()
+
+    def add():
+        for robot in robots:
+            registry[robot.name] = robot
+        done.set()
+
+    written = set() # <- Robots an earlier snapshot would have written, the index would point at them from then on
+    thread = threading.Thread(target=add)
+    thread.start()
+    try:
+        while not done.is_set():
+            names, copies, index = registry.capture()
+            assert [name for name in names if name not in copies and name not in index and name not in written] == []
+            written.update(copies)
+    finally:
+        thread.join()
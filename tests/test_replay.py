@@ -0,0 +1,28 @@
+import threading
+
+from replay import EventLog, SessionLog
+from robots import Bipedal
+
+
+def test_event_log_takes_writes_from_many_threads(tmp_path):
+    path = str(tmp_path / 'session.log')
+    robots = [Bipedal('robot-{0}'.format(n), num_tasks=0) for n in range(8)]
+    log = EventLog(path).start()
+
+    def work(robot):
+        for _ in range(2000):
+            log.assigned(robot, ['do the dishes'], 0)
+            log.completed(robot, 'do the dishes')
+
+    threads = [threading.Thread(target=work, args=(robot,)) for robot in robots]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.stop()
+    log.completed(robots[0], 'do the dishes') # <- Ignored once stopped
+
+    session = SessionLog.read(path)
+    assert log.events == 32000
+    assert session.completed == len(session.assignments) == 16000
+    assert session.scenario() == {'BIPEDAL': 8}
@@ -0,0 +1,15 @@
+import pytest
+
+from sharding import ShardedFactory
+
+
+def test_error_from_a_broadcast_leaves_no_stale_replies(tmp_path):
+    with ShardedFactory(num_shards=2, save_path=str(tmp_path / 'robot_save'), time_scale=0) as factory:
+        for name in ('a', 'b', 'c', 'd'):
+            factory.add_robot(name, 'BIPEDAL')
+
+        with pytest.raises(KeyError):
+            factory.retire_robots('nonsense') # <- Every shard replies with an error
+
+        assert factory.robot_count() == 4
+        assert len(factory.top_robots(10)) == 4
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from benchmark import SRC_DIR, STARTUP_TARGET_MS, import_times
+
+# Modules the factory only needs once robots actually start working (or never, for a plain console session)
+DEFERRED = ('asyncio', 'concurrent.futures', 'multiprocessing', 'numpy', 'analytics', 'sharding', 'server', 'client')
+
+
+@pytest.fixture(scope='module')
+def interpreter_modules():
+    return import_times(['-c', 'pass'])
+
+
+def import_ms(args, interpreter_modules, runs=3):
+    """ Fastest of a few runs of the milliseconds spent importing modules beyond what the interpreter imports. """
+    return min(sum(import_times(args, interpreter_modules).values()) for _ in range(runs))
+
+
+def test_importing_the_factory_defers_heavy_modules():
+    imported = import_times(['-c', 'import robot_factory'], nested=True)
+    assert [module for module in DEFERRED if module in imported] == []
+
+
+def test_status_imports_stay_under_target(tmp_path, interpreter_modules):
+    status = [os.path.join(SRC_DIR, 'main.py'), 'status', '--save', str(tmp_path / 'robot_save')]
+    assert import_ms(status, interpreter_modules) <= STARTUP_TARGET_MS
+
+
+def test_factory_imports_stay_under_target(interpreter_modules):
+    assert import_ms(['-c', 'import robot_factory'], interpreter_modules) <= STARTUP_TARGET_MS
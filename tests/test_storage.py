@@ -0,0 +1,152 @@
+import os
+import pickle
+
+from registry import RobotRegistry
+from robots import Bipedal, Radial, ROBOT_TYPES
+from storage import RobotStore
+
+
+def create_robots(store, registry, count):
+    for n in range(count):
+        robot = Bipedal('bot-{0}'.format(n), num_tasks=0)
+        registry[robot.name] = robot
+        store.record_create(robot)
+
+
+def finish_task(store, registry, name, task='do the dishes'):
+    robot = registry[name]
+    robot.tasks_completed.append(task)
+    store.record_task(robot, task)
+
+
+def load(path):
+    store = RobotStore(path)
+    return store, store.load(RobotRegistry(), ROBOT_TYPES)
+
+
+def test_log_alone_is_replayed(tmp_path):
+    path = str(tmp_path / 'robot_save')
+    store, registry = RobotStore(path), RobotRegistry()
+    create_robots(store, registry, 3)
+    finish_task(store, registry, 'bot-1')
+    store.record_destroy('bot-2')
+    store.flush()
+
+    _, loaded = load(path)
+    assert sorted(loaded) == ['bot-0', 'bot-1']
+    assert loaded.completed_count('bot-1') == 1
+    assert list(loaded['bot-1'].tasks_completed) == ['do the dishes']
+
+
+def test_snapshot_and_log_are_combined(tmp_path):
+    path = str(tmp_path / 'robot_save')
+    store, registry = RobotStore(path), RobotRegistry()
+    create_robots(store, registry, 4)
+    finish_task(store, registry, 'bot-0')
+    store.compact(registry)
+    finish_task(store, registry, 'bot-0', 'wash the car')
+    store.record_destroy_many(['bot-1', 'bot-2'])
+    store.flush()
+
+    _, loaded = load(path)
+    assert sorted(loaded) == ['bot-0', 'bot-3']
+    assert not loaded.is_loaded('bot-0') # <- Only the index is read until a robot is looked up
+    assert loaded.completed_count('bot-0') == 2
+    assert list(loaded['bot-0'].tasks_completed) == ['do the dishes', 'wash the car']
+    assert RobotStore(path).summary() == {'bot-0': ['BIPEDAL', 2], 'bot-3': ['BIPEDAL', 0]}
+
+
+def test_batch_of_new_robots_is_replayed(tmp_path):
+    path = str(tmp_path / 'robot_save')
+    store, registry = RobotStore(path), RobotRegistry()
+    create_robots(store, registry, 2)
+    store.compact(registry)
+    robots = [Bipedal('bot-1', num_tasks=0), Bipedal('bot-2', num_tasks=0), Radial('bot-3', num_tasks=0)]
+    registry.add_many(robots)
+    store.record_create_many(robots)
+    finish_task(store, registry, 'bot-3')
+    store.flush()
+
+    assert RobotStore(path).summary() == {'bot-0': ['BIPEDAL', 0], 'bot-1': ['BIPEDAL', 0],
+                                          'bot-2': ['BIPEDAL', 0], 'bot-3': ['RADIAL', 1]}
+    _, loaded = load(path)
+    assert sorted(loaded) == ['bot-0', 'bot-1', 'bot-2', 'bot-3']
+    assert list(loaded.names.names('radial')) == ['bot-3']
+    assert list(loaded['bot-3'].tasks_completed) == ['do the dishes']
+
+
+def test_destroy_all_is_replayed(tmp_path):
+    path = str(tmp_path / 'robot_save')
+    store, registry = RobotStore(path), RobotRegistry()
+    create_robots(store, registry, 3)
+    store.compact(registry)
+    store.record_destroy_all()
+    registry.clear()
+    create_robots(store, registry, 1)
+    store.flush()
+
+    _, loaded = load(path)
+    assert list(loaded) == ['bot-0']
+    assert loaded.completed_count('bot-0') == 0
+
+
+def test_torn_log_tail_is_dropped_and_truncated(tmp_path):
+    path = str(tmp_path / 'robot_save')
+    store, registry = RobotStore(path), RobotRegistry()
+    create_robots(store, registry, 2)
+    finish_task(store, registry, 'bot-0')
+    store.flush()
+    good_size = os.path.getsize(store.wal_fn)
+
+    # A crash in the middle of appending the next event
+    with open(store.wal_fn, 'ab') as wal_file:
+        wal_file.write(pickle.dumps(('task', 'bot-1', 'do the dishes'), protocol=2)[:-3])
+
+    store, loaded = load(path)
+    assert loaded.completed_count('bot-0') == 1
+    assert loaded.completed_count('bot-1') == 0
+    assert os.path.getsize(store.wal_fn) == good_size
+
+    # Events logged after recovering are read back, not lost behind the garbage
+    finish_task(store, loaded, 'bot-1')
+    store.flush()
+    _, reloaded = load(path)
+    assert reloaded.completed_count('bot-1') == 1
+
+
+def test_stale_log_from_before_the_snapshot_is_ignored(tmp_path):
+    path = str(tmp_path / 'robot_save')
+    store, registry = RobotStore(path), RobotRegistry()
+    create_robots(store, registry, 2)
+    finish_task(store, registry, 'bot-0')
+    store.flush()
+    with open(store.wal_fn, 'rb') as wal_file:
+        old_log = wal_file.read()
+
+    store.compact(registry)
+    # A crash after the new snapshot was written but before the log was replaced
+    with open(store.wal_fn, 'wb') as wal_file:
+        wal_file.write(old_log)
+
+    store, loaded = load(path)
+    assert loaded.completed_count('bot-0') == 1 # <- Not applied a second time
+    assert RobotStore(path).summary()['bot-0'] == ['BIPEDAL', 1]
+
+    # The stale log was replaced by an empty one of the snapshot's generation
+    assert RobotStore._read_objects(store.wal_fn) == [('wal', store.generation)]
+
+
+def test_unfinished_snapshot_leaves_the_previous_save_intact(tmp_path):
+    path = str(tmp_path / 'robot_save')
+    store, registry = RobotStore(path), RobotRegistry()
+    create_robots(store, registry, 2)
+    finish_task(store, registry, 'bot-1')
+    store.compact(registry)
+
+    # A crash while the next snapshot was being written leaves only its temporary file behind
+    with open(store.snapshot_fn + '.tmp', 'wb') as tmp_file:
+        tmp_file.write(b'partial snapshot')
+
+    _, loaded = load(path)
+    assert sorted(loaded) == ['bot-0', 'bot-1']
+    assert loaded.completed_count('bot-1') == 1
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+import tasks
+
+
+def write(tmp_path, data):
+    fn = str(tmp_path / 'tasks.json')
+    with open(fn, 'w') as tasks_file:
+        tasks_file.write(data if isinstance(data, str) else json.dumps(data))
+    return fn
+
+
+@pytest.mark.parametrize('data', [
+    [1],
+    '"tasks"',
+    '{"version": 2, "base": {"do the dishes"',
+    {'base': {'do the dishes': 1000}},
+    {'version': 2, 'base': ['do the dishes']},
+    {'version': 2, 'types': [['BIPEDAL', {}]]},
+    {'version': 2, 'types': {'BIPEDAL': ['kick a soccer ball']}},
+    {'version': 2, 'types': {'WHEELED': {'roll': 1000}}},
+    {'version': 2, 'base': {'do the dishes': -5}},
+])
+def test_bad_files_raise_value_error(tmp_path, data):
+    with pytest.raises(ValueError):
+        tasks.load(write(tmp_path, data), cache_fn=None)
+
+
+def test_good_file_is_cached(tmp_path):
+    fn = write(tmp_path, {'version': 3, 'base': {'do the dishes': 1000}, 'types': {'BIPEDAL': {'kick a soccer ball': 2000}}})
+    cache_fn = str(tmp_path / 'cache' / 'tasks.pickle')
+
+    table = tasks.load(fn, cache_fn)
+    assert table.version == 3
+    assert table.tasks_of('BIPEDAL') == {'do the dishes': 1000, 'kick a soccer ball': 2000}
+
+    cached = tasks.load(fn, cache_fn)
+    assert cached.version == 3 and cached.tasks_of('BIPEDAL') == table.tasks_of('BIPEDAL')
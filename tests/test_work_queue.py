@@ -0,0 +1,80 @@
+import pickle
+
+import pytest
+
+from work_queue import WorkQueue
+
+
+def drain(queue):
+    return [queue.pop() for _ in range(len(queue))]
+
+
+def test_fifo_within_a_priority():
+    queue = WorkQueue()
+    queue.extend([('a', 5), ('b', 1)])
+    queue.push('c', 3)
+    assert drain(queue) == ['a', 'b', 'c']
+
+
+def test_higher_priority_first():
+    queue = WorkQueue()
+    queue.extend([('a', 5), ('b', 1)])
+    queue.push('urgent', 9, priority=2)
+    queue.extend([('soon', 1), ('sooner', 1)], priority=1)
+    assert drain(queue) == ['urgent', 'soon', 'sooner', 'a', 'b']
+
+
+def test_shortest_first_policy():
+    queue = WorkQueue(WorkQueue.SHORTEST_FIRST)
+    queue.extend([('long', 30), ('short', 1), ('medium', 10)])
+    assert list(queue) == ['short', 'medium', 'long']
+    assert drain(queue) == ['short', 'medium', 'long']
+
+
+def test_set_policy_reorders_queued_tasks():
+    queue = WorkQueue()
+    queue.extend([('long', 30), ('short', 1), ('medium', 10)])
+    queue.set_policy(WorkQueue.SHORTEST_FIRST)
+    assert list(queue) == ['short', 'medium', 'long']
+    queue.set_policy(WorkQueue.FIFO)
+    assert list(queue) == ['long', 'short', 'medium']
+
+
+def test_requeued_task_goes_ahead_of_its_priority():
+    queue = WorkQueue()
+    queue.extend([('a', 5), ('b', 1)])
+    queue.requeue('resumed', 2)
+    queue.push('urgent', 1, priority=1)
+    assert drain(queue) == ['urgent', 'resumed', 'a', 'b']
+
+
+def test_total_eta_and_entries():
+    queue = WorkQueue()
+    queue.extend([('a', 5), ('b', 1)], priority=3, version=2, deadline=100.0)
+    assert queue.total_eta == 6
+    assert queue.peek() == 'a' and queue.peek_priority() == 3
+    assert queue.pop_entry() == ('a', 5, 2, 3, 100.0)
+    assert queue.total_eta == 1
+
+    queue.pop()
+    assert queue.peek() is None and not queue
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_copies_and_pickles_are_independent():
+    queue = WorkQueue()
+    queue.extend([('a', 5), ('b', 1)])
+    copy = queue.copy()
+    copy.set_policy(WorkQueue.SHORTEST_FIRST)
+    copy.push('c', 0)
+    assert list(queue) == ['a', 'b']
+
+    restored = pickle.loads(pickle.dumps(queue, protocol=2))
+    restored.push('c', 0)
+    assert drain(restored) == ['a', 'b', 'c']
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        WorkQueue('random')